@@ -18,6 +18,13 @@ from wsdmcup.tasks.data_tasks import (
     conference_series_to_hdf5,
     fields_of_study_to_hdf5,
     h_index_to_hdf5,
+    author_statistics_to_hdf5,
+    author_h_index_log_to_hdf5,
+    pagerank_to_hdf5,
+    paper_author_affiliations_to_hdf5,
+    papers_and_venues_to_hdf5,
+    sparse_matrices_to_mmap,
+    relation_files_to_edge_cache,
 )
 from wsdmcup.tasks.ranking_tasks import (
     rank,
@@ -25,6 +32,9 @@ from wsdmcup.tasks.ranking_tasks import (
 from wsdmcup.tasks.other_tasks import (
     upload_results,
 )
+from wsdmcup.tasks.benchmark_tasks import (
+    storage_policies_benchmark,
+)
 
 __author__ = 'damirah'
 __email__ = 'damirah@live.com'
@@ -90,9 +100,18 @@ menu_actions = {
     '7': conference_series_to_hdf5,
     '8': fields_of_study_to_hdf5,
     '9': h_index_to_hdf5,
+    'b': paper_author_affiliations_to_hdf5,
+    'c': papers_and_venues_to_hdf5,
+    'e': sparse_matrices_to_mmap,
+    'f': relation_files_to_edge_cache,
+    'g': author_statistics_to_hdf5,
+    'h': author_h_index_log_to_hdf5,
+    'i': pagerank_to_hdf5,
     # =====================================
     'a': rank,
     # =====================================
+    'd': storage_policies_benchmark,
+    # =====================================
     'w': exit_app,
     'x': menu,
     'y': upload_results,
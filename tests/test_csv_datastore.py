@@ -0,0 +1,228 @@
+"""
+Tests of parsing MAG TSV blocks and building relation matrices in
+wsdmcup.data.csv_datastore
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import numpy
+from scipy import sparse
+
+from wsdmcup.data.csv_datastore import CsvDatastore, CsrBuilder, \
+    Relation, split_columns
+from wsdmcup.data.edge_cache import EdgeCache, ID_COLUMN, NUMBER_COLUMN
+
+__author__ = 'damirah'
+__email__ = 'damirah@live.com'
+
+
+def split_lines(block, usecols):
+    """
+    :param block: bytes with MAG TSV lines
+    :param usecols: list of indexes of columns
+    :return: dictionary {column index: list of byte strings}
+    """
+    rows = [line.split(b'\t') for line in block.split(b'\n') if line]
+    return {col: [row[col] for row in rows] for col in usecols}
+
+
+class SplitColumnsTest(unittest.TestCase):
+
+    def assertSplit(self, block, usecols):
+        columns = split_columns(block, usecols)
+        expected = split_lines(block, usecols)
+        for col in usecols:
+            self.assertEqual(columns[col].tolist(), expected[col])
+
+    def test_columns(self):
+        self.assertSplit(b'p1\tA\t123\np2\tB\t456\n', [0, 1, 2])
+
+    def test_short_last_field(self):
+        self.assertSplit(b'p1\tA\t123\np2\tB\t1\n', [0, 1, 2])
+
+    def test_short_field_near_block_end(self):
+        self.assertSplit(b'a\tXXXXXXXX\nb\tc\n', [0, 1])
+
+    def test_empty_last_field(self):
+        self.assertSplit(b'a\tXXXXXXXX\nb\t\n', [0, 1])
+
+    def test_random_fields(self):
+        rng = random.Random(0)
+        for _ in range(200):
+            lines = []
+            for _ in range(rng.randint(1, 6)):
+                fields = [b'x' * rng.randint(0, 10) for _ in range(3)]
+                lines.append(b'\t'.join(fields))
+            self.assertSplit(b'\n'.join(lines) + b'\n', [0, 1, 2])
+
+
+def write_relation_file(fpath, rng, num_lines):
+    """
+    Write file like PaperAuthorAffiliations.txt with random relations of
+    papers, authors and affiliations (with repeated relations and empty
+    affiliations)
+    :param fpath: path to the file
+    :param rng: random.Random
+    :param num_lines: number of lines
+    :return: tuple of dictionaries {id: index} of papers, authors and
+             affiliations
+    """
+    ids = [{'%08X' % (j * 1000 + i + 1): i for i in range(num)}
+           for j, num in enumerate((40, 30, 10))]
+    papers, authors, affiliations = [sorted(d) for d in ids]
+    with open(fpath, 'w') as f:
+        for _ in range(num_lines):
+            affiliation = rng.choice(affiliations) if rng.random() < 0.7 \
+                else ''
+            f.write('\t'.join([rng.choice(papers), rng.choice(authors),
+                               affiliation, 'affiliation name',
+                               str(rng.randint(1, 9))]) + '\n')
+    return tuple(ids)
+
+
+class MatrixTestCase(unittest.TestCase):
+
+    def assertSameMatrix(self, expected, matrix):
+        self.assertEqual(expected.shape, matrix.shape)
+        for par in ('indptr', 'indices', 'data'):
+            self.assertEqual(getattr(expected, par).dtype,
+                             getattr(matrix, par).dtype, par)
+            self.assertEqual(getattr(expected, par).tolist(),
+                             getattr(matrix, par).tolist(), par)
+
+
+class CsrBuilderTest(MatrixTestCase):
+
+    def test_blocks(self):
+        rng = numpy.random.RandomState(0)
+        shape = (50, 20)
+        rows = rng.randint(0, shape[0] - 5, 1000)
+        cols = rng.randint(0, shape[1], 1000)
+        data = rng.randint(1, 10, 1000)
+        expected = sparse.coo_matrix(
+            (data.astype(numpy.uint32), (rows, cols)), shape=shape).tocsr()
+        builder = CsrBuilder(shape)
+        blocks = [(rows[i:i + 77], cols[i:i + 77], data[i:i + 77])
+                  for i in range(0, len(rows), 77)]
+        for block in blocks:
+            builder.count(block[0])
+        builder.allocate()
+        # blocks can be filled in any order
+        for block in reversed(blocks):
+            builder.fill(*block)
+        self.assertSameMatrix(expected, builder.build())
+
+    def test_fill_all(self):
+        rows = numpy.array([3, 0, 3, 3, 1])
+        cols = numpy.array([2, 1, 0, 2, 1])
+        data = numpy.array([1, 2, 3, 4, 5])
+        expected = sparse.coo_matrix(
+            (data.astype(numpy.uint32), (rows, cols)), shape=(5, 3)).tocsr()
+        builder = CsrBuilder((5, 3))
+        builder.fill_all(rows, cols, data)
+        self.assertSameMatrix(expected, builder.build())
+
+    def test_empty(self):
+        expected = sparse.csr_matrix((4, 3), dtype=numpy.uint32)
+        self.assertSameMatrix(expected, CsrBuilder((4, 3)).build())
+
+
+class RelationMatrixTest(MatrixTestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.fpath = os.path.join(self.tmp_dir, 'relations.txt')
+        self.papers, self.authors, self.affiliations = write_relation_file(
+            self.fpath, random.Random(0), 500)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def build(self, *args, **kwargs):
+        """
+        :return: scipy.sparse.csr_matrix built by csv_to_relation_matrix of
+                 the test file with the given arguments
+        """
+        return CsvDatastore().csv_to_relation_matrix(self.fpath, *args,
+                                                     **kwargs)
+
+    def assertSameBuilds(self, *args, **kwargs):
+        """
+        Matrices built with chunk sizes cutting the file anywhere (also in
+        the middle of fields) have to be the same as the row by row one
+        """
+        expected = self.build(*args)
+        self.assertGreater(expected.nnz, 0)
+        for chunk_size in (1, 7, 100, 1024 * 1024):
+            self.assertSameMatrix(expected, self.build(
+                *args, chunk_size=chunk_size, **kwargs))
+        return expected
+
+    def test_chunked(self):
+        self.assertSameBuilds(0, self.papers, 1, self.authors)
+
+    def test_chunked_empty_ids(self):
+        self.assertSameBuilds(0, self.papers, 2, self.affiliations)
+
+    def test_chunked_data(self):
+        self.assertSameBuilds(0, self.papers, 1, self.authors, 4)
+
+    def test_chunked_mapped_data(self):
+        self.assertSameBuilds(0, self.papers, 1, self.authors, 2,
+                              self.affiliations)
+
+    def test_parallel(self):
+        # byte ranges parsed by several processes, the result is the same as
+        # from a single process
+        for args in ((0, self.papers, 1, self.authors),
+                     (0, self.papers, 1, self.authors, 2,
+                      self.affiliations)):
+            expected = self.build(*args, chunk_size=100)
+            for workers in (2, 3):
+                self.assertSameMatrix(expected, self.build(
+                    *args, chunk_size=100, workers=workers))
+
+    def test_parallel_relations(self):
+        relations = {
+            'authorship': Relation(0, self.papers, 1, self.authors),
+            'sequence': Relation(0, self.papers, 1, self.authors, 4),
+        }
+        datastore = CsvDatastore()
+        expected = datastore.csv_to_relation_matrices(self.fpath, relations,
+                                                      100)
+        matrices = datastore.csv_to_relation_matrices(self.fpath, relations,
+                                                      100, workers=2)
+        for name in relations:
+            self.assertSameMatrix(expected[name], matrices[name])
+
+    def test_cached(self):
+        cache = EdgeCache(os.path.join(self.tmp_dir, 'edge_cache'), {
+            'relations.txt': {0: ID_COLUMN, 1: ID_COLUMN, 2: ID_COLUMN,
+                              4: NUMBER_COLUMN}})
+        relations = {
+            'authorship': Relation(0, self.papers, 1, self.authors),
+            'affiliation': Relation(0, self.papers, 1, self.authors, 2,
+                                    self.affiliations),
+            'sequence': Relation(0, self.papers, 1, self.authors, 4),
+        }
+        datastore = CsvDatastore()
+        expected = datastore.csv_to_relation_matrices(self.fpath, relations,
+                                                      100)
+        # the first build caches the file, the second reads the cache only
+        for _ in range(2):
+            matrices = datastore.csv_to_relation_matrices(
+                self.fpath, relations, 100, cache=cache)
+            self.assertTrue(cache.is_cached(self.fpath, [0, 1, 2, 4]))
+            for name in relations:
+                self.assertSameMatrix(expected[name], matrices[name])
+        self.assertSameMatrix(expected['authorship'], self.build(
+            0, self.papers, 1, self.authors, chunk_size=100, workers=2,
+            cache=cache))
+
+
+if __name__ == '__main__':
+    unittest.main()
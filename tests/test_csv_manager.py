@@ -0,0 +1,86 @@
+"""
+Tests of building matrices of test_data in wsdmcup.data.csv_manager
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from wsdmcup.config import Config
+from wsdmcup.data.csv_manager import CsvManager
+from tests.test_edge_cache import TEST_DATA_DIR, read_ids
+
+__author__ = 'damirah'
+__email__ = 'damirah@live.com'
+
+
+class PaperAuthorAffiliationMatricesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.config = (Config.APP_ROOT, Config.USE_EDGE_CACHE,
+                       Config.CSV_WORKERS)
+        self.app_root = tempfile.mkdtemp()
+        Config.APP_ROOT = self.app_root
+        Config.USE_EDGE_CACHE = False
+        Config.CSV_WORKERS = 1
+        shutil.copytree(TEST_DATA_DIR, os.path.join(self.app_root,
+                                                    Config.MAG_DIR))
+        self.papers, self.authors, self.affiliations = [
+            read_ids(Config.get_path_to_data_file(name + '.txt'))
+            for name in ('Papers', 'Authors', 'Affiliations')]
+
+    def tearDown(self):
+        Config.APP_ROOT, Config.USE_EDGE_CACHE, Config.CSV_WORKERS = \
+            self.config
+        shutil.rmtree(self.app_root)
+
+    def get_separate_matrices(self):
+        """
+        :return: dictionary of {name: scipy.sparse.csr_matrix} built one by
+                 one, row by row
+        """
+        csv_manager = CsvManager()
+        p, au, af = self.papers, self.authors, self.affiliations
+        return {
+            'authorship_matrix': csv_manager.load_authorship_matrix(
+                p, au, chunk_size=None),
+            'affiliation_matrix': csv_manager.load_affiliation_matrix(
+                p, au, af, chunk_size=None),
+            'paper_affiliation_matrix':
+                csv_manager.load_paper_affiliation_matrix(
+                    p, af, chunk_size=None),
+            'author_sequence_matrix':
+                csv_manager.load_author_sequence_matrix(
+                    p, au, chunk_size=None),
+        }
+
+    def assertSameMatrices(self, expected, matrices):
+        self.assertEqual(sorted(expected), sorted(matrices))
+        for name, matrix in expected.items():
+            self.assertGreater(matrix.nnz, 0, name)
+            self.assertEqual(matrix.shape, matrices[name].shape, name)
+            for par in ('indptr', 'indices', 'data'):
+                self.assertEqual(getattr(matrix, par).tolist(),
+                                 getattr(matrices[name], par).tolist(),
+                                 '%s %s' % (name, par))
+
+    def test_single_pass(self):
+        expected = self.get_separate_matrices()
+        for chunk_size in (64, Config.CSV_CHUNK_SIZE):
+            matrices = CsvManager().load_paper_author_affiliation_matrices(
+                self.papers, self.authors, self.affiliations,
+                chunk_size=chunk_size)
+            self.assertSameMatrices(expected, matrices)
+
+    def test_selected_matrices(self):
+        expected = self.get_separate_matrices()
+        names = ['paper_affiliation_matrix', 'author_sequence_matrix']
+        matrices = CsvManager().load_paper_author_affiliation_matrices(
+            self.papers, self.authors, self.affiliations, names)
+        self.assertSameMatrices({name: expected[name] for name in names},
+                                matrices)
+
+
+if __name__ == '__main__':
+    unittest.main()
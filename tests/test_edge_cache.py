@@ -0,0 +1,130 @@
+"""
+Tests of building relation matrices of test_data through the edge cache
+(wsdmcup.data.edge_cache), the matrices have to be the same as the ones
+built by parsing the files
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from wsdmcup.config import Config
+from wsdmcup.data.csv_manager import CsvManager
+
+__author__ = 'damirah'
+__email__ = 'damirah@live.com'
+
+
+TEST_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'test_data')
+
+
+def read_ids(fpath):
+    """
+    :param fpath: path to MAG file with IDs in the first column
+    :return: dictionary of {id: index}
+    """
+    with open(fpath) as f:
+        return {line.split('\t')[0]: i
+                for i, line in enumerate(l for l in f if l.strip())}
+
+
+def pack_test_data(src_dir, dst_dir):
+    """
+    Copy test_data replacing its IDs (8 alphanumeric characters, which are
+    not all MAG hex IDs) with upper case hex IDs, so that they can be packed
+    :param src_dir: directory with test_data
+    :param dst_dir: directory to write the files to
+    :return: None
+    """
+    hex_ids = {}
+    for fname in os.listdir(src_dir):
+        with open(os.path.join(src_dir, fname)) as src, \
+                open(os.path.join(dst_dir, fname), 'w') as dst:
+            for line in src:
+                fields = line.rstrip('\n').split('\t')
+                fields = [hex_ids.setdefault(f, '%08X' % (len(hex_ids) + 1))
+                          if len(f) == 8 and f.isalnum() else f
+                          for f in fields]
+                dst.write('\t'.join(fields) + '\n')
+
+
+class EdgeCacheMatricesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.config = (Config.APP_ROOT, Config.USE_EDGE_CACHE,
+                       Config.CSV_WORKERS)
+        self.app_root = tempfile.mkdtemp()
+        Config.APP_ROOT = self.app_root
+        Config.CSV_WORKERS = 1
+        self.mag_dir = os.path.join(self.app_root, Config.MAG_DIR)
+        os.makedirs(self.mag_dir)
+
+    def tearDown(self):
+        Config.APP_ROOT, Config.USE_EDGE_CACHE, Config.CSV_WORKERS = \
+            self.config
+        shutil.rmtree(self.app_root)
+
+    def build_matrices(self, use_cache):
+        """
+        :param use_cache: value of Config.USE_EDGE_CACHE
+        :return: dictionary of {name: scipy.sparse.csr_matrix}
+        """
+        Config.USE_EDGE_CACHE = use_cache
+        ids = {name: read_ids(Config.get_path_to_data_file(name + '.txt'))
+               for name in ('Papers', 'Authors', 'Affiliations')}
+        papers, authors, affiliations = \
+            ids['Papers'], ids['Authors'], ids['Affiliations']
+        csv_manager = CsvManager()
+        matrices = csv_manager.load_paper_author_affiliation_matrices(
+            papers, authors, affiliations)
+        matrices.update({
+            'citation': csv_manager.load_citation_matrix(papers),
+            'authorship': csv_manager.load_authorship_matrix(papers,
+                                                             authors),
+            'affiliation': csv_manager.load_affiliation_matrix(
+                papers, authors, affiliations),
+            'paper_affiliation': csv_manager.load_paper_affiliation_matrix(
+                papers, affiliations),
+            'author_sequence': csv_manager.load_author_sequence_matrix(
+                papers, authors),
+        })
+        return matrices
+
+    def assertSameMatrices(self, expected, matrices):
+        self.assertEqual(sorted(expected), sorted(matrices))
+        for name, matrix in expected.items():
+            self.assertEqual(matrix.shape, matrices[name].shape, name)
+            self.assertEqual((matrix != matrices[name]).nnz, 0, name)
+
+    def test_test_data(self):
+        # IDs of test_data are not MAG hex IDs, the files are parsed
+        for fname in os.listdir(TEST_DATA_DIR):
+            shutil.copy(os.path.join(TEST_DATA_DIR, fname), self.mag_dir)
+        parsed = self.build_matrices(False)
+        self.assertSameMatrices(parsed, self.build_matrices(True))
+        # the second build knows that the files can not be cached
+        self.assertSameMatrices(parsed, self.build_matrices(True))
+
+    def test_packed_test_data(self):
+        pack_test_data(TEST_DATA_DIR, self.mag_dir)
+        parsed = self.build_matrices(False)
+        self.assertSameMatrices(parsed, self.build_matrices(True))
+        self.assertTrue(CsvManager().edge_cache.is_cached(
+            Config.get_path_to_data_file('PaperReferences.txt'), [0, 1]))
+        # matrices read from the cache
+        self.assertSameMatrices(parsed, self.build_matrices(True))
+
+    def test_cache_relation_files(self):
+        # test_data has no PaperKeywords.txt, the file is skipped
+        pack_test_data(TEST_DATA_DIR, self.mag_dir)
+        Config.USE_EDGE_CACHE = True
+        csv_manager = CsvManager()
+        csv_manager.cache_relation_files()
+        self.assertTrue(csv_manager.edge_cache.is_cached(
+            Config.get_path_to_data_file('PaperReferences.txt'), [0, 1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+"""
+Tests of wsdmcup.model.h_index against h-index counted paper by paper
+"""
+
+import unittest
+
+import numpy as np
+from scipy import sparse
+
+from wsdmcup.model.h_index import h_index, h_index_segments
+
+__author__ = 'damirah'
+__email__ = 'damirah@live.com'
+
+
+def brute_force_h_index(values):
+    """
+    :param values: list of values (e.g. citations of papers of an author)
+    :return: the highest h such that h values are >= h
+    """
+    values = sorted(values, reverse=True)
+    h = 0
+    while h < len(values) and values[h] >= h + 1:
+        h += 1
+    return h
+
+
+def random_matrix(rng, shape, density):
+    """
+    :param rng: numpy.random.RandomState
+    :param shape: shape of the matrix
+    :param density: share of non-zero values
+    :return: binary scipy.sparse.csr_matrix, rows are papers and columns
+             groups
+    """
+    matrix = sparse.random(shape[0], shape[1], density, format='csr',
+                           random_state=rng)
+    matrix.data[:] = 1
+    return matrix
+
+
+class HIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = np.random.RandomState(0)
+
+    def assertBruteForce(self, matrix, values, result):
+        csc = matrix.tocsc()
+        expected = [brute_force_h_index(values[csc.indices[start:end]])
+                    for start, end in zip(csc.indptr[:-1], csc.indptr[1:])]
+        self.assertGreater(max(expected), 1)
+        self.assertEqual(result.tolist(), expected)
+
+    def test_segments(self):
+        indptr = np.array([3, 3, 4, 10, 10, 15])
+        values = self.rng.randint(0, 8, 15)
+        expected = [brute_force_h_index(values[start:end])
+                    for start, end in zip(indptr[:-1], indptr[1:])]
+        self.assertEqual(h_index_segments(values[3:], indptr).tolist(),
+                         expected)
+        self.assertEqual(h_index_segments(values[:0], [0, 0, 0]).tolist(),
+                         [0, 0])
+
+    def test_values(self):
+        matrix = random_matrix(self.rng, (300, 40), 0.1)
+        values = self.rng.randint(0, 30, 300)
+        self.assertBruteForce(matrix, values, h_index(matrix, values))
+
+    def test_float_values(self):
+        matrix = random_matrix(self.rng, (300, 40), 0.1)
+        values = self.rng.uniform(-1, 30, 300)
+        values[:10] = np.nan
+        self.assertBruteForce(matrix, np.floor(np.nan_to_num(values)),
+                              h_index(matrix, values))
+
+    def test_matrix_values(self):
+        matrix = random_matrix(self.rng, (300, 40), 0.1)
+        matrix.data = self.rng.randint(0, 30, matrix.nnz)
+        csc = matrix.tocsc()
+        expected = [brute_force_h_index(csc.data[start:end])
+                    for start, end in zip(csc.indptr[:-1], csc.indptr[1:])]
+        self.assertEqual(h_index(csc).tolist(), expected)
+
+    def test_blocks(self):
+        matrix = random_matrix(self.rng, (300, 40), 0.1)
+        values = self.rng.randint(0, 30, 300)
+        for workers in (1, 2):
+            self.assertBruteForce(matrix, values, h_index(
+                matrix, values, workers=workers, block_size=50))
+
+
+if __name__ == '__main__':
+    unittest.main()
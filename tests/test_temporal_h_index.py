@@ -0,0 +1,115 @@
+"""
+Tests of h-index over years in wsdmcup.model.temporal_h_index
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from scipy import sparse
+
+from wsdmcup.config import Config
+from wsdmcup.data.hdf5_manager import Hdf5Manager
+from wsdmcup.model.temporal_h_index import HIndexLog, temporal_h_index
+from tests.test_h_index import brute_force_h_index, random_matrix
+
+__author__ = 'damirah'
+__email__ = 'damirah@live.com'
+
+
+def brute_force_h_index_in_year(matrix, edges, years, year):
+    """
+    :param matrix: scipy.sparse.csr_matrix, rows are papers and columns
+                   groups
+    :param edges: scipy.sparse.csr_matrix, rows cite columns
+    :param years: numpy.array with publish year of each paper, <= 0 for
+                  missing years
+    :param year: year as of which to count the h-index
+    :return: list with h-index of each group counted from citations made
+             up to the year (between papers with years up to the year)
+    """
+    edges = edges.tocoo()
+    citations = np.zeros(edges.shape[1], dtype=np.int64)
+    for citing, cited in zip(edges.row, edges.col):
+        if 0 < years[citing] <= year and 0 < years[cited] <= year:
+            citations[cited] += 1
+    csc = matrix.tocsc()
+    return [brute_force_h_index(citations[csc.indices[start:end]])
+            for start, end in zip(csc.indptr[:-1], csc.indptr[1:])]
+
+
+class TemporalHIndexTest(unittest.TestCase):
+
+    def test_years(self):
+        rng = np.random.RandomState(0)
+        matrix = random_matrix(rng, (200, 30), 0.1)
+        edges = random_matrix(rng, (200, 200), 0.1)
+        years = rng.randint(1990, 2000, 200)
+        years[:10] = 0
+        log = temporal_h_index(matrix, edges, years)
+        self.assertEqual(log.num_groups, 30)
+        self.assertGreater(log.get_h_index(2010).max(), 3)
+        for year in range(1989, 2001):
+            self.assertEqual(
+                log.get_h_index(year).tolist(),
+                brute_force_h_index_in_year(matrix, edges, years, year))
+        # the log has a change only when the h-index grows
+        for group in range(30):
+            changes = log.values[log.groups == group]
+            self.assertTrue(np.all(np.diff(changes) > 0))
+
+    def test_no_citations(self):
+        matrix = sparse.csr_matrix(np.ones((3, 2)))
+        log = temporal_h_index(matrix, sparse.csr_matrix((3, 3)),
+                               np.array([2000, 2001, 2002]))
+        self.assertEqual(len(log), 0)
+        self.assertEqual(log.get_h_index(2002).tolist(), [0, 0])
+
+    def test_lookup(self):
+        log = HIndexLog([0, 0, 2], [1999, 2004, 2001], [1, 2, 1], 4)
+        self.assertEqual(log.lookup(0, 1998), 0)
+        self.assertEqual(log.lookup(0, 2003), 1)
+        self.assertEqual(log.lookup(np.array([0, 1, 2, 3]), 2004).tolist(),
+                         [2, 0, 1, 0])
+
+
+class HIndexLogStorageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.config = (Config.APP_ROOT, Config.PACKED_IDS,
+                       Config.DATASTORE_BACKEND)
+        self.app_root = tempfile.mkdtemp()
+        Config.APP_ROOT = self.app_root
+        os.makedirs(Config.get_path_to_hdf5_file(''))
+
+    def tearDown(self):
+        Config.APP_ROOT, Config.PACKED_IDS, Config.DATASTORE_BACKEND = \
+            self.config
+        shutil.rmtree(self.app_root)
+
+    def assertStored(self, backend, packed_ids):
+        Config.DATASTORE_BACKEND = backend
+        Config.PACKED_IDS = packed_ids
+        log = HIndexLog([0, 0, 2, 3], [1999, 2004, 2001, 2001],
+                        [1, 2, 1, 3], 5)
+        Hdf5Manager().store_author_h_index_log(log)
+        loaded = Hdf5Manager().load_author_h_index_log(5)
+        self.assertEqual(loaded.num_groups, 5)
+        np.testing.assert_array_equal(loaded.groups, log.groups)
+        np.testing.assert_array_equal(loaded.years, log.years)
+        np.testing.assert_array_equal(loaded.values, log.values)
+
+    def test_hdf5(self):
+        self.assertStored('hdf5', False)
+
+    def test_hdf5_packed_ids(self):
+        self.assertStored('hdf5', True)
+
+    def test_npy_packed_ids(self):
+        self.assertStored('npy', True)
+
+
+if __name__ == '__main__':
+    unittest.main()
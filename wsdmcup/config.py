@@ -18,17 +18,71 @@ class Config(object):
     OUT_DIR = 'out/'
     LOG_DIR = 'log/'
     RESULTS_DIR = 'results/'
+    EDGE_CACHE_DIR = 'edge_cache/'
 
     OPCIT_ROOT = '/data/opcit/'
 
     DATASTORE_FNAME = 'data.h5'
+    # directory (in HDF5_DIR) of the 'npy' data store backend
+    NPY_DATASTORE_DIRNAME = 'data_npy'
     RESULTS_FNAME_PATTERN = 'results_s%03d.tsv'
     RESULTS_UPLOAD_FNAME = 'results.tsv'
 
+    # number of bytes parsed at once when building matrices from MAG files
+    CSV_CHUNK_SIZE = 64 * 1024 * 1024
+    # number of processes parsing MAG files when building matrices,
+    # with 1 the file is parsed in the main process (e.g. os.cpu_count() to
+    # use all cores)
+    CSV_WORKERS = 1
+    # build relation matrices from binary copies of ID columns of MAG files
+    # (in EDGE_CACHE_DIR) made on the first build, so that the files are
+    # parsed only once, see wsdmcup.data.edge_cache; the copies take disk
+    # space of the same order as the ID columns of the files
+    USE_EDGE_CACHE = False
+    # number of processes counting h-index, see wsdmcup.model.h_index
+    H_INDEX_WORKERS = 1
+    # PageRank of papers, see wsdmcup.model.pagerank: probability of
+    # following a citation, L1 residual at which the power iteration stops
+    # and maximum number of iterations
+    PAGERANK_DAMPING = 0.85
+    PAGERANK_TOLERANCE = 1e-6
+    PAGERANK_MAX_ITERATIONS = 100
+    # weight of stored PageRank in rank(), 0 to keep the column out of the
+    # ranking
+    PAGERANK_RANK_WEIGHT = 0.0
+    # number of threads loading data in wsdmcup.data.hdf5_prefetcher
+    PREFETCH_WORKERS = 4
+    # store MAG IDs in HDF5 tables as uint32 numbers instead of 8 byte
+    # strings, IDs are formatted back to hex only when writing results
+    PACKED_IDS = False
+    # storage policies of HDF5 nodes, {node name or kind of node: policy
+    # name}, see wsdmcup.data.hdf5_policies (e.g. {'indices': 'zlib'})
+    HDF5_NODE_POLICIES = {}
+    # store sparse matrices as uncompressed .npy files next to the HDF5 file,
+    # such matrices are memory-mapped when loaded
+    MMAP_SPARSE_MATRICES = False
+    # store CSC copy next to each sparse matrix, so that column-wise
+    # computations do not have to convert matrices when running
+    CSC_SPARSE_MATRICES = False
+    # store only indices, indptr and shape of sparse matrices with all values
+    # equal to one, the values are not read when loading such matrices;
+    # matrices stored this way have no data node (or data.npy file), so only
+    # this version of the data stores can load them, switch it on only after
+    # updating every reader of the data store
+    PATTERN_SPARSE_MATRICES = False
+    # 'hdf5' to keep all data in one HDF5 file (DATASTORE_FNAME), 'npy' to
+    # keep each node in its own file in NPY_DATASTORE_DIRNAME, so that
+    # different nodes can be stored by several processes at the same time
+    DATASTORE_BACKEND = 'hdf5'
+
     @staticmethod
     def get_path_to_data_file(file_name):
         return os.path.join(Config.APP_ROOT, Config.MAG_DIR, file_name)
 
+    @staticmethod
+    def get_path_to_edge_cache():
+        return os.path.join(Config.APP_ROOT, Config.EDGE_CACHE_DIR)
+
     @staticmethod
     def get_path_to_results_file(file_name):
         return os.path.join(Config.APP_ROOT, Config.RESULTS_DIR, file_name)
@@ -2,20 +2,31 @@
 Class for reading and writing CSV files in MAG format.
 """
 
+import os
 import csv
+import array
 from csv import QUOTE_NONE
 import logging
+import multiprocessing
 
 import numpy
 import pandas
 from scipy import sparse
 
 import wsdmcup.logging as wsdmlog
+from wsdmcup.data.id_lookup import IdLookup, EMPTY, MISSING_ID
 
 __author__ = 'damirah'
 __email__ = 'damirah@live.com'
 
 
+# approximate number of bytes of lines read at once by CsvDatastore.read_csv
+LINES_BLOCK_SIZE = 1024 * 1024
+
+# number of values put into CSR matrix at once by CsrBuilder.fill_all
+CSR_BLOCK_SIZE = 16 * 1024 * 1024
+
+
 class Mag(object):
     """
     CSV dialect class with settings for reading and writing
@@ -35,6 +46,445 @@ class Mag(object):
     quoting = QUOTE_NONE
 
 
+def split_columns(block, usecols):
+    """
+    Split block of MAG TSV lines into columns without creating a Python
+    object per value. Positions of tabs and newlines are found with numpy,
+    the requested fields are then gathered into fixed-width byte string
+    arrays (missing values are empty byte strings).
+    :param block: bytes, complete lines (ending with a newline)
+    :param usecols: sorted list of indexes of columns to be extracted
+    :return: dictionary {column index: numpy.array of byte strings}
+    """
+    buf = numpy.frombuffer(block, dtype=numpy.uint8)
+    line_ends = numpy.flatnonzero(buf == ord(Mag.lineterminator))
+    line_starts = numpy.empty_like(line_ends)
+    line_starts[:1] = 0
+    line_starts[1:] = line_ends[:-1] + 1
+    # files written on Windows end lines with \r\n
+    has_cr = line_ends > line_starts
+    has_cr[has_cr] = buf[line_ends[has_cr] - 1] == ord('\r')
+    line_ends = line_ends - has_cr
+    # skip blank lines
+    non_empty = line_ends > line_starts
+    line_starts = line_starts[non_empty]
+    line_ends = line_ends[non_empty]
+
+    tabs = numpy.flatnonzero(buf == ord(Mag.delimiter))
+    num_lines = len(line_starts)
+    tabs_per_line = len(tabs) // num_lines if num_lines else 0
+    line_tabs = None
+    if num_lines and tabs_per_line * num_lines == len(tabs):
+        # usual case: all lines have the same number of columns
+        line_tabs = tabs.reshape(num_lines, tabs_per_line)
+        if tabs_per_line and not (
+                (line_tabs[:, 0] > line_starts).all() and
+                (line_tabs[:, -1] < line_ends).all()):
+            line_tabs = None
+    if line_tabs is None:
+        first_tab = numpy.searchsorted(tabs, line_starts)
+        num_tabs = numpy.searchsorted(tabs, line_ends) - first_tab
+    else:
+        num_tabs = numpy.full(num_lines, tabs_per_line, dtype=numpy.int64)
+    if num_lines and num_tabs.min() < max(usecols):
+        raise IndexError('Found line with less than %s columns'
+                         % (max(usecols) + 1))
+
+    columns = {}
+    for col in usecols:
+        if col == 0:
+            starts = line_starts
+        elif line_tabs is not None:
+            starts = line_tabs[:, col - 1] + 1
+        else:
+            starts = tabs[first_tab + col - 1] + 1
+        if line_tabs is not None:
+            ends = line_tabs[:, col] if col < tabs_per_line else line_ends
+        else:
+            ends = line_ends.copy()
+            has_next = num_tabs > col
+            ends[has_next] = tabs[first_tab[has_next] + col]
+        columns[col] = gather_strings(block, starts, ends)
+    return columns
+
+
+def gather_strings(block, starts, ends):
+    """
+    Copy byte ranges [start, end) of 'block' into array of byte strings
+    :param block: bytes
+    :param starts: numpy.array with start offsets
+    :param ends: numpy.array with end offsets
+    :return: numpy.array of byte strings
+    """
+    lengths = ends - starts
+    width = int(lengths.max()) if len(lengths) else 0
+    if width == 0:
+        return numpy.zeros(len(starts), dtype='S1')
+    dtype = 'S%d' % width
+    # view of the block where item i holds bytes [i, i + width), fields
+    # starting less than 'width' bytes before the end of the block are
+    # taken from a copy of the tail of the block padded with zeros
+    tail_start = len(block) - width + 1
+    windows = numpy.ndarray(shape=(tail_start,), dtype=dtype, buffer=block,
+                            strides=(1,))
+    inside = starts < tail_start
+    if inside.all():
+        strings = windows[starts]
+    else:
+        strings = numpy.empty(len(starts), dtype=dtype)
+        strings[inside] = windows[starts[inside]]
+        tail = bytes(block[tail_start:]) + b'\0' * width
+        tail_windows = numpy.ndarray(shape=(len(tail) - width + 1,),
+                                     dtype=dtype, buffer=tail, strides=(1,))
+        strings[~inside] = tail_windows[starts[~inside] - tail_start]
+    if lengths.min() < width:
+        chars = strings.view(numpy.uint8).reshape(len(strings), width)
+        chars[numpy.arange(width) >= lengths[:, None]] = 0
+    return strings
+
+
+def split_file(fpath, range_size):
+    """
+    Split file into byte ranges of about 'range_size' bytes, each range
+    starts at the beginning of a line and ends right after a newline (or at
+    the end of the file)
+    :param fpath: path to the file
+    :param range_size: approximate number of bytes per range
+    :return: list of (start, end) byte offsets
+    """
+    file_size = os.stat(fpath).st_size
+    ranges = []
+    with open(fpath, 'rb') as f:
+        start = 0
+        while start < file_size:
+            f.seek(min(start + range_size, file_size))
+            # move to the beginning of the next line
+            f.readline()
+            end = min(f.tell(), file_size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def read_range(fpath, start, end):
+    """
+    Read lines in the byte range [start, end) of the file
+    :param fpath: path to the file
+    :param start: byte offset of the beginning of a line
+    :param end: byte offset of the end of a line (or of the file)
+    :return: bytes ending with a newline
+    """
+    terminator = Mag.lineterminator.encode()
+    with open(fpath, 'rb') as f:
+        f.seek(start)
+        block = f.read(end - start)
+    if block and not block.endswith(terminator):
+        block += terminator
+    return block
+
+
+def missing_values(column):
+    """
+    :param column: numpy.array of byte strings (as returned by
+                   split_columns), of packed IDs (uint32) or of numbers
+                   (int64) as read from wsdmcup.data.edge_cache
+    :return: numpy.array of bools, True for empty values
+    """
+    if column.dtype.kind == 'S':
+        return column == b''
+    if column.dtype.kind == 'u':
+        return column == MISSING_ID
+    return column < 0
+
+
+def relation_indices(chunk, relations, lookups, rows_only=False):
+    """
+    Map ID columns of a parsed block to row and column indices (and data
+    values) of relation matrices. Rows with an empty value in any of the
+    relation's columns are skipped.
+    :param chunk: dictionary of {column index: numpy.array} as returned by
+                  split_columns or read from wsdmcup.data.edge_cache
+    :param relations: dictionary of {name: Relation}
+    :param lookups: dictionary of {id(dictionary): IdLookup} for every
+                    dictionary used by the relations
+    :param rows_only: True to map only the row IDs (e.g. for counting values
+                      in rows), column indices and data are then None
+    :return: dictionary of {name: (row indices, col indices, data)}
+    :raises KeyError: when an ID is not in the relation's dictionary
+    """
+    mapped = {}
+    result = {}
+    for name, relation in relations.items():
+        valid = numpy.ones(len(chunk[relation.row_id_csv_col]), dtype=bool)
+        for csv_col in relation.get_csv_columns():
+            valid &= ~missing_values(chunk[csv_col])
+        mapped_columns = relation.get_mapped_columns()
+        if rows_only:
+            mapped_columns = mapped_columns[:1]
+        indices = []
+        for csv_col, id_map in mapped_columns:
+            key = (csv_col, id(id_map))
+            if key not in mapped:
+                mapped[key] = lookups[id(id_map)].find(chunk[csv_col])
+            valid_indices = mapped[key][valid]
+            if (valid_indices == EMPTY).any():
+                raise KeyError(chunk[csv_col][valid][
+                    valid_indices == EMPTY][0])
+            indices.append(valid_indices)
+        if rows_only:
+            result[name] = (indices[0], None, None)
+            continue
+        if relation.data_map:
+            data = indices[2].astype(numpy.uint32)
+        elif relation.data_csv_col is not None:
+            data = chunk[relation.data_csv_col][valid].astype(numpy.uint32)
+        else:
+            data = numpy.ones(len(indices[0]), dtype=numpy.uint32)
+        result[name] = (indices[0], indices[1], data)
+    return result
+
+
+# relations and ID lookups of the worker processes started by
+# CsvDatastore._read_relations_parallel
+_worker_relations = None
+_worker_lookups = None
+
+
+def _init_worker(relations):
+    """
+    :param relations: dictionary of {name: Relation}, with IdLookup objects
+                      in place of the {id: index} dictionaries
+    :return: None
+    """
+    global _worker_relations, _worker_lookups
+    _worker_relations = relations
+    _worker_lookups = {}
+    for relation in relations.values():
+        for _, lookup in relation.get_mapped_columns():
+            _worker_lookups[id(lookup)] = lookup
+
+
+def _parse_range(task):
+    """
+    Parse byte range of a MAG file in a worker process
+    :param task: tuple (path to file, start, end, sorted list of columns)
+    :return: tuple (number of lines, {name: (row indices, col indices, data)})
+    """
+    fpath, start, end, usecols = task
+    chunk = split_columns(read_range(fpath, start, end), usecols)
+    return (len(chunk[usecols[0]]),
+            relation_indices(chunk, _worker_relations, _worker_lookups))
+
+
+class IndexBuffer(object):
+    """
+    Growable numpy buffer for collecting matrix indices in bulk. The buffer
+    is preallocated and doubled when full, so appending a block of values
+    costs one slice assignment instead of one Python object per value.
+    """
+
+    def __init__(self, dtype, capacity=1024):
+        self.buffer = numpy.empty(max(capacity, 1), dtype=dtype)
+        self.size = 0
+
+    def extend(self, values):
+        """
+        Append a block of values at the end of the buffer
+        :param values: numpy.array
+        :return: None
+        """
+        new_size = self.size + len(values)
+        if new_size > len(self.buffer):
+            capacity = max(new_size, 2 * len(self.buffer))
+            buffer = numpy.empty(capacity, dtype=self.buffer.dtype)
+            buffer[:self.size] = self.buffer[:self.size]
+            self.buffer = buffer
+        self.buffer[self.size:new_size] = values
+        self.size = new_size
+
+    def to_array(self):
+        """
+        :return: numpy.array with the appended values (a view of the buffer)
+        """
+        return self.buffer[:self.size]
+
+    def __len__(self):
+        return self.size
+
+
+class CsrBuilder(object):
+    """
+    Builds CSR matrix directly from blocks of row indices, column indices
+    and data values, without COO matrix and its conversion. In the first
+    pass values in each row are counted (count), then indices and data
+    arrays of exactly the size of the matrix are allocated (allocate) and
+    the blocks are put right to their rows in the second pass (fill).
+    Finally values of each row are sorted by column and duplicates are
+    summed in place (build), the same way scipy does it when converting
+    COO matrix, so the matrix is the same as
+    coo_matrix((data, (rows, cols))).tocsr().
+    Except for the blocks themselves memory is needed only for the matrix
+    and one counter per row.
+    """
+
+    def __init__(self, shape, dtype=numpy.uint32):
+        """
+        :param shape: shape of the matrix
+        :param dtype: dtype of the values
+        """
+        self.shape = shape
+        self.dtype = dtype
+        self.counts = numpy.zeros(shape[0], dtype=numpy.int64)
+        self.indptr = None
+        self.indices = None
+        self.data = None
+        self.positions = None
+
+    def count(self, rows):
+        """
+        First pass, count values in rows
+        :param rows: numpy.array with row indices of a block of values
+        :return: None
+        """
+        if len(rows):
+            counts = numpy.bincount(rows)
+            self.counts[:len(counts)] += counts
+
+    def compact(self, rows, cols, data):
+        """
+        :param rows: numpy.array with row indices
+        :param cols: numpy.array with column indices
+        :param data: numpy.array with values
+        :return: tuple (rows, cols, data) with the smallest dtypes the
+                 matrix allows, so that blocks kept between the passes take
+                 as little memory as possible
+        """
+        index_dtype = numpy.int32 if max(self.shape) <= \
+            numpy.iinfo(numpy.int32).max else numpy.int64
+        return (rows.astype(index_dtype, copy=False),
+                cols.astype(index_dtype, copy=False),
+                data.astype(self.dtype, copy=False))
+
+    def get_index_dtype(self):
+        """
+        :return: numpy.int32 when indices of the matrix fit into it (like
+                 scipy chooses), numpy.int64 otherwise
+        """
+        max_value = max(int(self.counts.sum()), max(self.shape))
+        if max_value <= numpy.iinfo(numpy.int32).max:
+            return numpy.int32
+        return numpy.int64
+
+    def allocate(self):
+        """
+        Allocate arrays of the matrix, called after the first pass
+        :return: None
+        """
+        index_dtype = self.get_index_dtype()
+        self.indptr = numpy.zeros(self.shape[0] + 1, dtype=index_dtype)
+        numpy.cumsum(self.counts, out=self.indptr[1:])
+        nnz = int(self.indptr[-1])
+        self.indices = numpy.empty(nnz, dtype=index_dtype)
+        self.data = numpy.empty(nnz, dtype=self.dtype)
+        # next free position in each row, the counts are not needed anymore
+        self.positions = self.counts
+        self.positions[:] = self.indptr[:-1]
+        self.counts = None
+
+    def fill(self, rows, cols, data):
+        """
+        Second pass, put block of values to their rows. All blocks counted
+        in the first pass have to be filled.
+        :param rows: numpy.array with row indices
+        :param cols: numpy.array with column indices
+        :param data: numpy.array with values
+        :return: None
+        """
+        if not len(rows):
+            return
+        # order of values within rows does not matter, rows are sorted by
+        # column in build
+        order = numpy.argsort(rows)
+        sorted_rows = rows[order]
+        # first value of each row in the block and number of values
+        starts = numpy.flatnonzero(numpy.diff(sorted_rows)) + 1
+        starts = numpy.concatenate(([0], starts))
+        sizes = numpy.diff(numpy.append(starts, len(rows)))
+        block_rows = sorted_rows[starts]
+        # position of each value is the next free position of its row plus
+        # the number of values of the row before it in the block
+        targets = numpy.arange(len(rows)) - numpy.repeat(starts, sizes)
+        targets += numpy.repeat(self.positions[block_rows], sizes)
+        self.indices[targets] = cols[order]
+        self.data[targets] = data[order]
+        self.positions[block_rows] += sizes
+
+    def fill_all(self, rows, cols, data):
+        """
+        Count and fill all values at once, in blocks of CSR_BLOCK_SIZE values
+        :param rows: numpy.array with row indices
+        :param cols: numpy.array with column indices
+        :param data: numpy.array with values
+        :return: None
+        """
+        self.count(rows)
+        self.allocate()
+        for start in range(0, len(rows), CSR_BLOCK_SIZE):
+            end = start + CSR_BLOCK_SIZE
+            self.fill(rows[start:end], cols[start:end], data[start:end])
+
+    def build(self):
+        """
+        :return: scipy.sparse.csr_matrix with sorted indices and without
+                 duplicates
+        """
+        if self.positions is None:
+            self.allocate()
+        matrix = sparse.csr_matrix((self.data, self.indices, self.indptr),
+                                   shape=self.shape, copy=False)
+        matrix.sum_duplicates()
+        self.indptr = self.indices = self.data = self.positions = None
+        return matrix
+
+
+class Relation(object):
+    """
+    Description of one relation matrix to be built from a MAG file, the
+    parameters have the same meaning as in
+    CsvDatastore.csv_to_relation_matrix
+    """
+
+    def __init__(self, row_id_csv_col, row_map, col_id_csv_col, col_map,
+                 data_csv_col=None, data_map=None):
+        self.row_id_csv_col = row_id_csv_col
+        self.row_map = row_map
+        self.col_id_csv_col = col_id_csv_col
+        self.col_map = col_map
+        self.data_csv_col = data_csv_col
+        self.data_map = data_map
+
+    def get_csv_columns(self):
+        """
+        :return: list of CSV columns which have to be non-empty for a line
+                 to be included in the matrix
+        """
+        columns = [self.row_id_csv_col, self.col_id_csv_col]
+        if self.data_csv_col is not None:
+            columns.append(self.data_csv_col)
+        return columns
+
+    def get_mapped_columns(self):
+        """
+        :return: list of (CSV column, {id: index} dictionary) pairs, in the
+                 order row, column, data
+        """
+        columns = [(self.row_id_csv_col, self.row_map),
+                   (self.col_id_csv_col, self.col_map)]
+        if self.data_csv_col is not None and self.data_map:
+            columns.append((self.data_csv_col, self.data_map))
+        return columns
+
+
 class CsvDatastore(object):
     """
     Class for reading MAG data files
@@ -45,15 +495,72 @@ class CsvDatastore(object):
 
     def read_csv(self, csv_path):
         """
-        Read CSV (TSV) using MAG dialect
+        Read CSV (TSV) using MAG dialect. Progress is reported based on
+        the position in the file.
         :param csv_path: path to CSV to be read
         :return: generator
         """
         self.logger.info('Reading file %s', csv_path)
+        progress = wsdmlog.FileProgress(csv_path, self.logger)
         with open(csv_path, 'r') as csv_file:
-            csv_reader = csv.reader(csv_file, dialect=Mag)
+            csv_reader = csv.reader(self._read_lines(csv_file, progress),
+                                    dialect=Mag)
             for csv_row in csv_reader:
                 yield csv_row
+        progress.finish()
+
+    def _read_lines(self, csv_file, progress):
+        """
+        Read lines of the file in blocks and update progress once per block
+        (rather than once per line)
+        :param csv_file: file opened in text mode
+        :param progress: wsdmcup.logging.FileProgress
+        :return: generator of lines
+        """
+        while True:
+            lines = csv_file.readlines(LINES_BLOCK_SIZE)
+            if not lines:
+                break
+            progress.update(csv_file.buffer.tell(), len(lines))
+            for line in lines:
+                yield line
+
+    def read_csv_chunks(self, csv_path, usecols, chunk_size):
+        """
+        Read CSV (TSV) using MAG dialect in blocks of 'chunk_size' bytes
+        (cut at line boundaries). Only columns listed in 'usecols' are
+        parsed, each one into numpy array of byte strings.
+        :param csv_path: path to CSV to be read
+        :param usecols: list of indexes of columns to be read
+        :param chunk_size: number of bytes per block
+        :return: generator of dictionaries {column index: numpy.array}
+        """
+        self.logger.info('Reading file %s in chunks of %s bytes',
+                         csv_path, chunk_size)
+        usecols = sorted(set(usecols))
+        progress = wsdmlog.FileProgress(csv_path, self.logger)
+        remainder = b''
+        with open(csv_path, 'rb') as csv_file:
+            while True:
+                block = csv_file.read(chunk_size)
+                if not block:
+                    break
+                block = remainder + block
+                last_line_end = block.rfind(Mag.lineterminator.encode())
+                if last_line_end < 0:
+                    remainder = block
+                    continue
+                remainder = block[last_line_end + 1:]
+                columns = split_columns(block[:last_line_end + 1], usecols)
+                progress.update(csv_file.tell() - len(remainder),
+                                len(columns[usecols[0]]))
+                yield columns
+        if remainder:
+            columns = split_columns(remainder + Mag.lineterminator.encode(),
+                                    usecols)
+            progress.update(progress.total_bytes, len(columns[usecols[0]]))
+            yield columns
+        progress.finish()
 
     def load_dataframe(self, fpath, index_cols):
         """
@@ -107,13 +614,6 @@ class CsvDatastore(object):
         self.logger.info('Loading data from %s', csv_path)
         self.logger.debug('Columns to be loaded: %s', load_cols)
 
-        # for printing progress
-        processed = 0
-        self.logger.debug('Checking the number of rows to be loaded')
-        total = wsdmlog.get_total(csv_path)
-        self.logger.debug('Total: %s', total)
-        how_often = wsdmlog.how_often(total)
-
         data = []
         self.logger.info('Processing CSV')
         for csv_row in self.read_csv(csv_path):
@@ -122,9 +622,6 @@ class CsvDatastore(object):
                             not csv_row[csv_mapping[col].value]
                          else csv_row[csv_mapping[col].value].encode()
                          for col in load_cols})
-            processed += 1
-            if processed % how_often == 0:
-                self.logger.debug(wsdmlog.get_progress(processed, total))
 
         self.logger.info('Converting to DataFrame')
         df = pandas.DataFrame(data)
@@ -138,35 +635,54 @@ class CsvDatastore(object):
 
     def csv_to_relation_matrix(self, fpath, row_id_csv_col, row_map,
                                col_id_csv_col, col_map,
-                               data_csv_col=None, data_map=None):
+                               data_csv_col=None, data_map=None,
+                               chunk_size=None, workers=1, cache=None):
         """
-        Build authorship matrix from list of edges in PaperReferences.txt file
+        Build relation matrix from a MAG file: each line with both IDs set
+        adds a value to the matrix, at the row of the row ID and the column of
+        the column ID. The value is taken from the data column (mapped with
+        data_map if given), or is 1 without a data column. Lines with an empty
+        ID (or data value) are skipped.
+        :param fpath: path to the MAG file
+        :param row_id_csv_col: index of the column with row IDs
+        :param row_map: IdLookup or dictionary of {id: row index}
+        :param col_id_csv_col: index of the column with column IDs
+        :param col_map: IdLookup or dictionary of {id: column index}
+        :param data_csv_col: index of the column with values, None for values
+                             equal to one
+        :param data_map: dictionary of {value: number}, None to parse the
+                         values as integers
+        :param chunk_size: when set, the file is parsed in blocks of this
+                           many bytes and IDs are mapped to indices in bulk
+                           (see csv_to_relation_matrices), otherwise the file
+                           is processed row by row; the matrix is the same
+        :param workers: number of processes parsing the blocks, used only
+                        together with chunk_size
+        :param cache: wsdmcup.data.edge_cache.EdgeCache to read the columns
+                      from instead of parsing the file (the file is cached on
+                      the first build), used only together with chunk_size
         :return: scipy.sparse.csr_matrix
         """
+        if chunk_size:
+            return self._csv_to_relation_matrix_chunked(
+                fpath, row_id_csv_col, row_map, col_id_csv_col, col_map,
+                data_csv_col, data_map, chunk_size, workers, cache)
+
         self.logger.info('Got list of %s row indices and %s column indices',
                          len(row_map), len(col_map))
 
-        # for updating progress
-        processed = 0
-        self.logger.debug('Checking the number of rows to be loaded')
-        total = wsdmlog.get_total(fpath)
-        self.logger.debug('Total: %s', total)
-        how_often = wsdmlog.how_often(total)
-
         append_data = data_csv_col is not None
 
-        row_indices = []
-        col_indices = []
-        data = []
+        # typed arrays take 8 (4) bytes per item instead of a Python object
+        row_indices = array.array('q')
+        col_indices = array.array('q')
+        data = array.array('I')
 
         self.logger.info('Loading data from %s', fpath)
         for line in self.read_csv(fpath):
             row_id = line[row_id_csv_col]
             col_id = line[col_id_csv_col]
             if not row_id or not col_id:
-                processed += 1
-                if processed % how_often == 0:
-                    self.logger.debug(wsdmlog.get_progress(processed, total))
                 continue
 
             # appending data ===================================================
@@ -174,15 +690,11 @@ class CsvDatastore(object):
             if append_data:
                 data_value = line[data_csv_col]
                 if not data_value:
-                    processed += 1
-                    if processed % how_often == 0:
-                        self.logger.debug(
-                            wsdmlog.get_progress(processed, total))
                     continue
                 if data_map:
                     data.append(data_map[data_value])
                 else:
-                    data.append(data_value)
+                    data.append(int(data_value))
 
             # not appending data ===============================================
 
@@ -193,21 +705,180 @@ class CsvDatastore(object):
 
             row_indices.append(row_map[row_id])
             col_indices.append(col_map[col_id])
-            processed += 1
-            if processed % how_often == 0:
-                self.logger.debug(wsdmlog.get_progress(processed, total))
 
         self.logger.info('Loaded {0}, {1} references'
                          .format(len(row_indices), len(col_indices)))
+        return self.build_relation_matrix(row_indices, col_indices, data,
+                                           (len(row_map), len(col_map)))
+
+    def _csv_to_relation_matrix_chunked(self, fpath, row_id_csv_col, row_map,
+                                        col_id_csv_col, col_map,
+                                        data_csv_col, data_map, chunk_size,
+                                        workers=1, cache=None):
+        """
+        Columnar version of csv_to_relation_matrix, see
+        csv_to_relation_matrices. The resulting matrix is identical to the row
+        by row version.
+        :return: scipy.sparse.csr_matrix
+        """
+        relation = Relation(row_id_csv_col, row_map, col_id_csv_col, col_map,
+                            data_csv_col, data_map)
+        return self.csv_to_relation_matrices(
+            fpath, {'matrix': relation}, chunk_size, workers,
+            cache)['matrix']
+
+    def csv_to_relation_matrices(self, fpath, relations, chunk_size,
+                                 workers=1, cache=None):
+        """
+        Build several relation matrices in a single pass over the file.
+        The file is read in blocks of 'chunk_size' bytes, ID columns of each
+        block are mapped to indices with one vectorized lookup (shared by all
+        relations using the same column and dictionary).
+        With more than one worker the blocks are parsed by a pool of
+        processes (see _read_relations_parallel), the result is the same.
+        The matrices are built by CsrBuilder, counts of values in rows are
+        collected while reading, the blocks are then put into the matrices.
+        With a cache the columns are read from the cache instead (the file is
+        parsed and cached first if it's not cached yet, files which can not
+        be cached are parsed as without the cache), the result is again
+        the same, but the columns are read twice, first to count values in
+        rows and then to fill the matrices, so the blocks do not have to be
+        kept in memory.
+        :param fpath: path to the MAG file
+        :param relations: dictionary of {name: Relation}
+        :param chunk_size: number of bytes parsed at once
+        :param workers: number of processes parsing the file
+        :param cache: wsdmcup.data.edge_cache.EdgeCache or None
+        :return: dictionary of {name: scipy.sparse.csr_matrix}
+        """
+        usecols = set()
+        lookups = {}
+        builders = {}
+        self.logger.debug('Building vectorized ID lookups')
+        for name, relation in relations.items():
+            self.logger.info('Matrix %s: got list of %s row indices and %s '
+                             'column indices', name, len(relation.row_map),
+                             len(relation.col_map))
+            for csv_col, id_map in relation.get_mapped_columns():
+                usecols.add(csv_col)
+                if isinstance(id_map, IdLookup):
+                    lookups[id(id_map)] = id_map
+                elif id(id_map) not in lookups:
+                    lookups[id(id_map)] = IdLookup.from_dict(id_map)
+            if relation.data_csv_col is not None:
+                usecols.add(relation.data_csv_col)
+            builders[name] = CsrBuilder((len(relation.row_map),
+                                         len(relation.col_map)))
+
+        self.logger.info('Loading data from %s', fpath)
+        if cache is not None and not cache.prepare(fpath, usecols,
+                                                   chunk_size, workers):
+            cache = None
+        if cache is not None:
+            # cached columns are cheap to read twice, values are counted in
+            # the first pass and put right into the matrices in the second
+            for chunk in cache.read_chunks(fpath, usecols, chunk_size,
+                                           workers):
+                part = relation_indices(chunk, relations, lookups,
+                                        rows_only=True)
+                for name, builder in builders.items():
+                    builder.count(part[name][0])
+            self._allocate_matrices(builders)
+            for chunk in cache.read_chunks(fpath, usecols, chunk_size):
+                part = relation_indices(chunk, relations, lookups)
+                for name, builder in builders.items():
+                    builder.fill(*part[name])
+        else:
+            if workers > 1:
+                parts = self._read_relations_parallel(
+                    fpath, usecols, relations, lookups, chunk_size, workers)
+            else:
+                parts = (relation_indices(chunk, relations, lookups)
+                         for chunk in self.read_csv_chunks(fpath, usecols,
+                                                           chunk_size))
+            # parsing the file twice would be too slow, so the blocks are
+            # kept (with the smallest dtypes) until all values are counted
+            blocks = {name: [] for name in relations}
+            for part in parts:
+                for name, builder in builders.items():
+                    builder.count(part[name][0])
+                    blocks[name].append(builder.compact(*part[name]))
+            self._allocate_matrices(builders)
+            for name, builder in builders.items():
+                # free each block as soon as it is in the matrix
+                blocks[name].reverse()
+                while blocks[name]:
+                    builder.fill(*blocks[name].pop())
+
+        return {name: builder.build() for name, builder in builders.items()}
+
+    def _allocate_matrices(self, builders):
+        """
+        :param builders: dictionary of {name: CsrBuilder} after the first
+                         pass
+        :return: None
+        """
+        for name, builder in builders.items():
+            builder.allocate()
+            self.logger.info('Matrix %s: loaded %s references', name,
+                             len(builder.indices))
+
+    def _read_relations_parallel(self, fpath, usecols, relations, lookups,
+                                 chunk_size, workers):
+        """
+        Split the file into byte ranges of about 'chunk_size' bytes aligned
+        to line boundaries and parse them in a pool of processes. Each worker
+        maps its range to partial row, column and data index arrays of the
+        relations, the partial arrays are yielded in file order, so the
+        resulting matrices are identical to the single process version.
+        The workers get copies of the relations with dictionaries replaced
+        by their lookups, so the (large) dictionaries never have to be sent
+        to other processes.
+        :param fpath: path to the MAG file
+        :param usecols: list of indexes of columns to be read
+        :param relations: dictionary of {name: Relation}
+        :param lookups: dictionary of {id(dictionary): IdLookup}
+        :param chunk_size: number of bytes per range
+        :param workers: number of processes
+        :return: generator of {name: (row indices, col indices, data)}
+        """
+        ranges = split_file(fpath, chunk_size)
+        self.logger.info('Parsing %s byte ranges of %s in %s processes',
+                         len(ranges), fpath, workers)
+        progress = wsdmlog.FileProgress(fpath, self.logger)
+        tasks = [(fpath, start, end, sorted(usecols))
+                 for start, end in ranges]
+        worker_relations = {}
+        for name, relation in relations.items():
+            data_map = relation.data_map
+            worker_relations[name] = Relation(
+                relation.row_id_csv_col, lookups[id(relation.row_map)],
+                relation.col_id_csv_col, lookups[id(relation.col_map)],
+                relation.data_csv_col,
+                lookups[id(data_map)] if data_map else None)
+        pool = multiprocessing.Pool(workers, initializer=_init_worker,
+                                    initargs=(worker_relations,))
+        try:
+            for (start, end), (num_rows, part) in zip(
+                    ranges, pool.imap(_parse_range, tasks)):
+                progress.update(end, num_rows)
+                yield part
+        finally:
+            pool.terminate()
+        progress.finish()
+
+    def build_relation_matrix(self, row_indices, col_indices, data, shape):
+        """
+        Build CSR relation matrix from lists (arrays) of row and column
+        indices and data values, see CsrBuilder
+        :return: scipy.sparse.csr_matrix
+        """
         self.logger.info('Constructing sparse matrix from the reference list')
-        rel_matrix = sparse.coo_matrix((data, (row_indices, col_indices)),
-                                       shape=(len(row_map), len(col_map)),
-                                       dtype=numpy.uint32)
-        self.logger.info('Relation matrix filled!')
-        self.logger.debug('Number of items %s', rel_matrix.nnz)
-        self.logger.info('Converting to CSR format')
-        csr_m = rel_matrix.tocsr()
-        # the previous line makes a copy, so for saving memory
-        del rel_matrix
-        self.logger.info('Done converting')
+        builder = CsrBuilder(shape)
+        builder.fill_all(numpy.asarray(row_indices),
+                         numpy.asarray(col_indices), numpy.asarray(data))
+        self.logger.debug('Number of items %s', len(builder.indices))
+        self.logger.info('Sorting rows and removing duplicates')
+        csr_m = builder.build()
+        self.logger.info('Done constructing')
         return csr_m
@@ -2,11 +2,13 @@
 Class providing methods for loading/storing specific data.
 """
 
+import os.path
 import logging
 
 from wsdmcup.config import Config
 
-from wsdmcup.data.csv_datastore import CsvDatastore
+from wsdmcup.data.csv_datastore import CsvDatastore, Relation
+from wsdmcup.data.edge_cache import EdgeCache, ID_COLUMN, NUMBER_COLUMN
 from wsdmcup.data.csv_mappings import (
     PaperAuthorAffiliations as PapAuthAff,
     PaperReferences as PapRef,
@@ -18,6 +20,32 @@ __author__ = 'damirah'
 __email__ = 'damirah@live.com'
 
 
+# columns of MAG files cached by the edge cache, {file name: {column index:
+# kind}}, all columns of a file used by any of the matrices are cached
+# together, so that the file is parsed only once
+EDGE_CACHE_COLUMNS = {
+    'PaperReferences.txt': {
+        PapRef.paper_id.value: ID_COLUMN,
+        PapRef.reference_id.value: ID_COLUMN,
+    },
+    'PaperAuthorAffiliations.txt': {
+        PapAuthAff.paper_id.value: ID_COLUMN,
+        PapAuthAff.author_id.value: ID_COLUMN,
+        PapAuthAff.affiliation_id.value: ID_COLUMN,
+        PapAuthAff.author_seq_number.value: NUMBER_COLUMN,
+    },
+    'PaperKeywords.txt': {
+        PaperKeywordsCsv.paper_id.value: ID_COLUMN,
+        PaperKeywordsCsv.field_id.value: ID_COLUMN,
+    },
+    'Papers.txt': {
+        PapersCsv.paper_id.value: ID_COLUMN,
+        PapersCsv.journal_id.value: ID_COLUMN,
+        PapersCsv.conference_series_id.value: ID_COLUMN,
+    },
+}
+
+
 class CsvManager(object):
     """
     Class for reading MAG data files
@@ -25,104 +53,191 @@ class CsvManager(object):
 
     def __init__(self):
         self.logger = logging.getLogger(__name__)
+        if Config.USE_EDGE_CACHE:
+            self.edge_cache = EdgeCache(Config.get_path_to_edge_cache(),
+                                        EDGE_CACHE_COLUMNS)
+        else:
+            self.edge_cache = None
 
-    def load_citation_matrix(self, papers):
+    def cache_relation_files(self):
+        """
+        Parse all relation files into the edge cache (again), normally this
+        is done by the first matrix built from each file. Missing files and
+        files whose IDs can not be cached are skipped.
+        :return: None
+        """
+        if self.edge_cache is None:
+            self.logger.info('Edge cache is disabled')
+            return
+        for fname in sorted(EDGE_CACHE_COLUMNS):
+            fpath = Config.get_path_to_data_file(fname)
+            if not os.path.exists(fpath):
+                self.logger.warning('Can not cache %s: no such file', fname)
+                continue
+            try:
+                self.edge_cache.build(fpath, workers=Config.CSV_WORKERS)
+            except ValueError as e:
+                self.logger.warning('Can not cache %s: %s', fname, e)
+
+    def load_citation_matrix(self, papers,
+                             chunk_size=Config.CSV_CHUNK_SIZE):
         """
         Build adjacency matrix from list of edges in PaperReferences.txt file
-        :param papers: dictionary of {id: index}
+        :param papers: IdLookup or dictionary of {id: index}
+        :param chunk_size: bytes parsed at once, None for row by row parsing
         :return: scipy.sparse.csr_matrix
         """
         fpath = Config.get_path_to_data_file('PaperReferences.txt')
-        return CsvDatastore().csv_to_relation_matrix(fpath,
-                                                     PapRef.paper_id.value,
-                                                     papers,
-                                                     PapRef.reference_id.value,
-                                                     papers)
+        return CsvDatastore().csv_to_relation_matrix(
+            fpath, PapRef.paper_id.value, papers,
+            PapRef.reference_id.value, papers, chunk_size=chunk_size,
+            workers=Config.CSV_WORKERS, cache=self.edge_cache)
 
-    def load_authorship_matrix(self, papers, authors):
+    def load_authorship_matrix(self, papers, authors,
+                               chunk_size=Config.CSV_CHUNK_SIZE):
         """
         Build authorship matrix from list of paper-author relations in
         PaperAuthorAffiliations.txt file
-        :param papers: dictionary of {id: index}
-        :param authors: dictionary of {id: index}
+        :param papers: IdLookup or dictionary of {id: index}
+        :param authors: IdLookup or dictionary of {id: index}
+        :param chunk_size: bytes parsed at once, None for row by row parsing
         :return: scipy.sparse.csr_matrix
         """
         fpath = Config.get_path_to_data_file('PaperAuthorAffiliations.txt')
-        return CsvDatastore().csv_to_relation_matrix(fpath,
-                                                     PapAuthAff.paper_id.value,
-                                                     papers,
-                                                     PapAuthAff.author_id.value,
-                                                     authors)
+        return CsvDatastore().csv_to_relation_matrix(
+            fpath, PapAuthAff.paper_id.value, papers,
+            PapAuthAff.author_id.value, authors, chunk_size=chunk_size,
+            workers=Config.CSV_WORKERS, cache=self.edge_cache)
 
-    def load_affiliation_matrix(self, papers, authors, affiliations):
+    def load_affiliation_matrix(self, papers, authors, affiliations,
+                                chunk_size=Config.CSV_CHUNK_SIZE):
         """
         Build matrix of papers, authors and affiliations from list of
         paper-author-affiliation relations in PaperAuthorAffiliations.txt file
-        :param papers: dictionary of {id: index}
-        :param authors: dictionary of {id: index}
-        :param affiliations: dictionary of {id: index}
+        :param papers: IdLookup or dictionary of {id: index}
+        :param authors: IdLookup or dictionary of {id: index}
+        :param affiliations: IdLookup or dictionary of {id: index}
+        :param chunk_size: bytes parsed at once, None for row by row parsing
         :return: scipy.sparse.csr_matrix
         """
         fpath = Config.get_path_to_data_file('PaperAuthorAffiliations.txt')
         return CsvDatastore().csv_to_relation_matrix(
             fpath, PapAuthAff.paper_id.value, papers,
             PapAuthAff.author_id.value, authors,
-            PapAuthAff.affiliation_id.value, affiliations)
+            PapAuthAff.affiliation_id.value, affiliations,
+            chunk_size=chunk_size, workers=Config.CSV_WORKERS,
+            cache=self.edge_cache)
 
-    def load_paper_affiliation_matrix(self, papers, affiliations):
+    def load_paper_affiliation_matrix(self, papers, affiliations,
+                                      chunk_size=Config.CSV_CHUNK_SIZE):
         """
         Build matrix of papers and affiliations from list of
         paper-affiliation relations in PaperAuthorAffiliations.txt file
-        :param papers: dictionary of {id: index}
-        :param affiliations: dictionary of {id: index}
+        :param papers: IdLookup or dictionary of {id: index}
+        :param affiliations: IdLookup or dictionary of {id: index}
+        :param chunk_size: bytes parsed at once, None for row by row parsing
         :return: scipy.sparse.csr_matrix
         """
         fpath = Config.get_path_to_data_file('PaperAuthorAffiliations.txt')
         return CsvDatastore().csv_to_relation_matrix(
             fpath, PapAuthAff.paper_id.value, papers,
-            PapAuthAff.affiliation_id.value, affiliations)
+            PapAuthAff.affiliation_id.value, affiliations,
+            chunk_size=chunk_size, workers=Config.CSV_WORKERS,
+            cache=self.edge_cache)
 
-    def load_author_sequence_matrix(self, papers, authors):
+    def load_author_sequence_matrix(self, papers, authors,
+                                    chunk_size=Config.CSV_CHUNK_SIZE):
         """
-        :param papers: dictionary of {id: index}
-        :param authors: dictionary of {id: index}
+        :param papers: IdLookup or dictionary of {id: index}
+        :param authors: IdLookup or dictionary of {id: index}
+        :param chunk_size: bytes parsed at once, None for row by row parsing
         :return:
         """
         fpath = Config.get_path_to_data_file('PaperAuthorAffiliations.txt')
         return CsvDatastore().csv_to_relation_matrix(
             fpath, PapAuthAff.paper_id.value, papers,
             PapAuthAff.author_id.value, authors,
-            PapAuthAff.author_seq_number.value)
+            PapAuthAff.author_seq_number.value, chunk_size=chunk_size,
+            workers=Config.CSV_WORKERS, cache=self.edge_cache)
+
+    def load_paper_author_affiliation_matrices(
+            self, papers, authors, affiliations, matrices=None,
+            chunk_size=Config.CSV_CHUNK_SIZE):
+        """
+        Build the authorship, affiliation, paper-affiliation and author
+        sequence number matrices in a single pass over
+        PaperAuthorAffiliations.txt file. The matrices are the same as the
+        ones returned by the corresponding load_*_matrix methods.
+        :param papers: IdLookup or dictionary of {id: index}
+        :param authors: IdLookup or dictionary of {id: index}
+        :param affiliations: IdLookup or dictionary of {id: index}
+        :param matrices: list of names of matrices to build (keys of the
+                         returned dictionary), by default all four
+        :param chunk_size: bytes parsed at once
+        :return: dictionary of {name: scipy.sparse.csr_matrix}
+        """
+        relations = {
+            'authorship_matrix': Relation(
+                PapAuthAff.paper_id.value, papers,
+                PapAuthAff.author_id.value, authors),
+            'affiliation_matrix': Relation(
+                PapAuthAff.paper_id.value, papers,
+                PapAuthAff.author_id.value, authors,
+                PapAuthAff.affiliation_id.value, affiliations),
+            'paper_affiliation_matrix': Relation(
+                PapAuthAff.paper_id.value, papers,
+                PapAuthAff.affiliation_id.value, affiliations),
+            'author_sequence_matrix': Relation(
+                PapAuthAff.paper_id.value, papers,
+                PapAuthAff.author_id.value, authors,
+                PapAuthAff.author_seq_number.value),
+        }
+        if matrices is not None:
+            relations = {name: relations[name] for name in matrices}
+        fpath = Config.get_path_to_data_file('PaperAuthorAffiliations.txt')
+        return CsvDatastore().csv_to_relation_matrices(
+            fpath, relations, chunk_size, workers=Config.CSV_WORKERS,
+            cache=self.edge_cache)
 
-    def load_paper_journal_matrix(self, papers, journals):
+    def load_paper_journal_matrix(self, papers, journals,
+                                  chunk_size=Config.CSV_CHUNK_SIZE):
         """
-        :param papers: dictionary of {id: index}
-        :param journals: dictionary of {id: index}
+        :param papers: IdLookup or dictionary of {id: index}
+        :param journals: IdLookup or dictionary of {id: index}
+        :param chunk_size: bytes parsed at once, None for row by row parsing
         :return:
         """
         fpath = Config.get_path_to_data_file('Papers.txt')
         return CsvDatastore().csv_to_relation_matrix(
             fpath, PapersCsv.paper_id.value, papers,
-            PapersCsv.journal_id.value, journals)
+            PapersCsv.journal_id.value, journals, chunk_size=chunk_size,
+            workers=Config.CSV_WORKERS, cache=self.edge_cache)
 
-    def load_paper_conf_series_matrix(self, papers, conf_series):
+    def load_paper_conf_series_matrix(self, papers, conf_series,
+                                      chunk_size=Config.CSV_CHUNK_SIZE):
         """
-        :param papers: dictionary of {id: index}
-        :param conf_series: dictionary of {id: index}
+        :param papers: IdLookup or dictionary of {id: index}
+        :param conf_series: IdLookup or dictionary of {id: index}
+        :param chunk_size: bytes parsed at once, None for row by row parsing
         :return:
         """
         fpath = Config.get_path_to_data_file('Papers.txt')
         return CsvDatastore().csv_to_relation_matrix(
             fpath, PapersCsv.paper_id.value, papers,
-            PapersCsv.conference_series_id.value, conf_series)
+            PapersCsv.conference_series_id.value, conf_series,
+            chunk_size=chunk_size, workers=Config.CSV_WORKERS,
+            cache=self.edge_cache)
 
-    def load_paper_field_of_study_matrix(self, papers, fos):
+    def load_paper_field_of_study_matrix(self, papers, fos,
+                                         chunk_size=Config.CSV_CHUNK_SIZE):
         """
-        :param papers: dictionary of {id: index}
-        :param fos: fields of study, dictionary of {id: index}
+        :param papers: IdLookup or dictionary of {id: index}
+        :param fos: fields of study, IdLookup or dictionary of {id: index}
+        :param chunk_size: bytes parsed at once, None for row by row parsing
         :return:
         """
         fpath = Config.get_path_to_data_file('PaperKeywords.txt')
         return CsvDatastore().csv_to_relation_matrix(
             fpath, PaperKeywordsCsv.paper_id.value, papers,
-            PaperKeywordsCsv.field_id.value, fos)
+            PaperKeywordsCsv.field_id.value, fos, chunk_size=chunk_size,
+            workers=Config.CSV_WORKERS, cache=self.edge_cache)
@@ -0,0 +1,320 @@
+"""
+Binary cache of ID columns of MAG relation files. Each relation file is
+parsed once into flat arrays of packed IDs (see id_lookup.hex_to_uint32),
+later builds of relation matrices read these arrays (memory-mapped) instead
+of parsing the text again, e.g. when ID dictionaries change and all matrices
+have to be rebuilt.
+"""
+
+import os
+import json
+import logging
+import multiprocessing
+
+import numpy
+
+import wsdmcup.logging as wsdmlog
+from wsdmcup.config import Config
+from wsdmcup.data.csv_datastore import (
+    CsvDatastore, split_columns, split_file, read_range
+)
+from wsdmcup.data.id_lookup import hex_to_uint32
+
+__author__ = 'damirah'
+__email__ = 'damirah@live.com'
+
+
+# kinds of cached columns, IDs are packed into uint32 numbers (empty IDs
+# into id_lookup.MISSING_ID), numbers are stored as int64 (empty values as
+# MISSING_NUMBER)
+ID_COLUMN = 'id'
+NUMBER_COLUMN = 'number'
+MISSING_NUMBER = -1
+
+# file with parameters of a cached MAG file, the columns are stored in
+# binary files next to it
+CACHE_META_FNAME = 'cache.json'
+
+
+def pack_columns(columns, kinds):
+    """
+    Convert parsed columns of byte strings to cached binary form
+    :param columns: dictionary of {column index: numpy.array of byte strings}
+                    as returned by csv_datastore.split_columns
+    :param kinds: dictionary of {column index: ID_COLUMN or NUMBER_COLUMN}
+    :return: dictionary of {column index: numpy.array}
+    :raises ValueError: when an ID column contains non-MAG IDs
+    """
+    packed = {}
+    for col, kind in kinds.items():
+        values = columns[col]
+        if kind == ID_COLUMN:
+            packed[col] = hex_to_uint32(values)
+        else:
+            numbers = numpy.full(len(values), MISSING_NUMBER,
+                                 dtype=numpy.int64)
+            present = values != b''
+            numbers[present] = values[present].astype(numpy.int64)
+            packed[col] = numbers
+    return packed
+
+
+def _pack_range(task):
+    """
+    Parse and pack byte range of a MAG file in a worker process
+    :param task: tuple (path to file, start, end, {column index: kind})
+    :return: dictionary of {column index: numpy.array}
+    """
+    fpath, start, end, kinds = task
+    chunk = split_columns(read_range(fpath, start, end), sorted(kinds))
+    return pack_columns(chunk, kinds)
+
+
+class EdgeCache(object):
+    """
+    Directory with one subdirectory per cached MAG file, holding a raw
+    binary file per cached column and parameters of the cache (number of
+    rows, dtypes of the columns and size and modification time of the MAG
+    file). A cached file is rebuilt when the MAG file changes or when
+    columns which are not cached are requested.
+    The chunks read from the cache have the same form as the ones of
+    CsvDatastore.read_csv_chunks, only with packed columns, so they can be
+    used by csv_datastore.relation_indices the same way.
+    """
+
+    def __init__(self, cache_dir, columns=None):
+        """
+        :param cache_dir: path to the cache directory
+        :param columns: dictionary of {MAG file name: {column index: kind}}
+                        of columns to be cached, all columns listed for a
+                        file are cached when the file is parsed, so that one
+                        pass over the file serves all matrices built from
+                        it; other requested columns are cached as IDs
+        """
+        self.logger = logging.getLogger(__name__)
+        self.cache_dir = cache_dir
+        self.columns = columns or {}
+
+    def get_path(self, fpath):
+        """
+        :param fpath: path to the MAG file
+        :return: path to the directory with the cached file
+        """
+        return os.path.join(self.cache_dir, os.path.basename(fpath))
+
+    def _get_meta(self, fpath):
+        """
+        :param fpath: path to the MAG file
+        :return: dictionary with parameters of the cached file, None when
+                 the file is not cached
+        """
+        meta_path = os.path.join(self.get_path(fpath), CACHE_META_FNAME)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path) as meta_file:
+            return json.load(meta_file)
+
+    @staticmethod
+    def _get_source(fpath):
+        """
+        :param fpath: path to the MAG file
+        :return: dictionary with size and modification time of the file
+        """
+        stat = os.stat(fpath)
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def _get_kinds(self, fpath, usecols):
+        """
+        :param fpath: path to the MAG file
+        :param usecols: list of indexes of requested columns
+        :return: dictionary of {column index: kind} of columns to be cached
+        """
+        kinds = dict(self.columns.get(os.path.basename(fpath), {}))
+        for col in usecols:
+            kinds.setdefault(col, ID_COLUMN)
+        return kinds
+
+    def is_cached(self, fpath, usecols):
+        """
+        :param fpath: path to the MAG file
+        :param usecols: list of indexes of columns
+        :return: True if the columns of the current version of the file are
+                 cached
+        """
+        meta = self._get_meta(fpath)
+        return (meta is not None and 'columns' in meta and
+                meta['source'] == self._get_source(fpath) and
+                all(str(col) in meta['columns'] for col in usecols))
+
+    def is_uncacheable(self, fpath):
+        """
+        :param fpath: path to the MAG file
+        :return: True if caching of the current version of the file failed
+                 before, e.g. because its IDs are not MAG hex IDs
+        """
+        meta = self._get_meta(fpath)
+        return (meta is not None and 'error' in meta and
+                meta['source'] == self._get_source(fpath))
+
+    def prepare(self, fpath, usecols, chunk_size=None, workers=1):
+        """
+        Cache the columns of the file if they are not cached yet
+        :param fpath: path to the MAG file
+        :param usecols: list of indexes of columns
+        :param chunk_size: number of bytes parsed at once
+        :param workers: number of processes parsing the file
+        :return: True if the columns can be read from the cache, False if
+                 the file can not be cached and has to be parsed
+        """
+        if self.is_cached(fpath, usecols):
+            return True
+        if self.is_uncacheable(fpath):
+            self.logger.info('%s can not be cached, parsing it', fpath)
+            return False
+        try:
+            self.build(fpath, usecols, chunk_size, workers)
+        except ValueError as e:
+            self.logger.warning('Can not cache %s (%s), parsing it', fpath, e)
+            return False
+        return True
+
+    def build(self, fpath, usecols=(), chunk_size=None, workers=1):
+        """
+        Parse the MAG file and store its columns in the cache
+        :param fpath: path to the MAG file
+        :param usecols: list of indexes of columns to be cached in addition
+                        to the columns listed for the file
+        :param chunk_size: number of bytes parsed at once
+        :param workers: number of processes parsing the file
+        :return: None
+        :raises ValueError: when the columns can not be packed (see
+                            pack_columns), the file is then marked as not
+                            cacheable
+        """
+        chunk_size = chunk_size or Config.CSV_CHUNK_SIZE
+        kinds = self._get_kinds(fpath, usecols)
+        path = self.get_path(fpath)
+        self.logger.info('Caching columns %s of %s in %s', sorted(kinds),
+                         fpath, path)
+        if not os.path.exists(path):
+            os.makedirs(path)
+        meta_path = os.path.join(path, CACHE_META_FNAME)
+        # remove the parameters first, so that half written cache is never
+        # used
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        source = self._get_source(fpath)
+
+        col_paths = {col: os.path.join(path, 'col%d.bin' % col)
+                     for col in kinds}
+        col_files = {col: open(col_path + '.tmp', 'wb')
+                     for col, col_path in col_paths.items()}
+        dtypes = {}
+        rows = 0
+        try:
+            for chunk in self._read_packed(fpath, kinds, chunk_size,
+                                           workers):
+                for col, values in chunk.items():
+                    dtypes[col] = values.dtype.str
+                    values.tofile(col_files[col])
+                rows += len(next(iter(chunk.values())))
+        except ValueError as e:
+            # e.g. IDs which can not be packed, the failure is remembered so
+            # that the file is not parsed for nothing again
+            for col, col_file in col_files.items():
+                col_file.close()
+                os.remove(col_paths[col] + '.tmp')
+            with open(meta_path, 'w') as meta_file:
+                json.dump({'source': source, 'error': str(e)}, meta_file)
+            raise
+        finally:
+            for col_file in col_files.values():
+                col_file.close()
+        for col, col_path in col_paths.items():
+            os.rename(col_path + '.tmp', col_path)
+
+        meta = {'source': source, 'rows': rows,
+                'columns': {str(col): {
+                    'kind': kind,
+                    'dtype': dtypes.get(col, numpy.dtype(
+                        numpy.uint32 if kind == ID_COLUMN
+                        else numpy.int64).str)}
+                    for col, kind in kinds.items()}}
+        with open(meta_path, 'w') as meta_file:
+            json.dump(meta, meta_file)
+        self.logger.info('Cached %s rows of %s', rows, fpath)
+
+    def _read_packed(self, fpath, kinds, chunk_size, workers):
+        """
+        :param fpath: path to the MAG file
+        :param kinds: dictionary of {column index: kind}
+        :param chunk_size: number of bytes parsed at once
+        :param workers: number of processes parsing the file
+        :return: generator of {column index: numpy.array} in file order
+        """
+        if workers <= 1:
+            for chunk in CsvDatastore().read_csv_chunks(fpath, list(kinds),
+                                                        chunk_size):
+                yield pack_columns(chunk, kinds)
+            return
+        ranges = split_file(fpath, chunk_size)
+        self.logger.info('Parsing %s byte ranges of %s in %s processes',
+                         len(ranges), fpath, workers)
+        progress = wsdmlog.FileProgress(fpath, self.logger)
+        tasks = [(fpath, start, end, kinds) for start, end in ranges]
+        pool = multiprocessing.Pool(workers)
+        try:
+            for (start, end), chunk in zip(ranges,
+                                           pool.imap(_pack_range, tasks)):
+                progress.update(end, len(next(iter(chunk.values()))))
+                yield chunk
+        finally:
+            pool.terminate()
+        progress.finish()
+
+    def load_columns(self, fpath, usecols):
+        """
+        Load cached columns, the arrays are memory-mapped (read-only)
+        :param fpath: path to the MAG file
+        :param usecols: list of indexes of columns
+        :return: dictionary of {column index: numpy.array}
+        :raises KeyError: when a column is not cached
+        """
+        meta = self._get_meta(fpath)
+        if meta is None:
+            raise KeyError('%s is not cached' % fpath)
+        columns = {}
+        for col in usecols:
+            dtype = numpy.dtype(meta['columns'][str(col)]['dtype'])
+            if not meta['rows']:
+                # empty files can not be memory-mapped
+                columns[col] = numpy.zeros(0, dtype=dtype)
+                continue
+            columns[col] = numpy.memmap(
+                os.path.join(self.get_path(fpath), 'col%d.bin' % col),
+                dtype=dtype, mode='r', shape=(meta['rows'],))
+        return columns
+
+    def read_chunks(self, fpath, usecols, chunk_size, workers=1):
+        """
+        Read columns of the MAG file from the cache in blocks of about
+        'chunk_size' bytes, the file is parsed and cached first if needed
+        :param fpath: path to the MAG file
+        :param usecols: list of indexes of columns to be read
+        :param chunk_size: number of bytes per block
+        :param workers: number of processes parsing the file when it has
+                        to be cached
+        :return: generator of dictionaries {column index: numpy.array}
+        """
+        usecols = sorted(set(usecols))
+        if not self.is_cached(fpath, usecols):
+            self.build(fpath, usecols, chunk_size, workers)
+        self.logger.info('Reading columns %s of %s from cache %s', usecols,
+                         fpath, self.get_path(fpath))
+        columns = self.load_columns(fpath, usecols)
+        rows = len(columns[usecols[0]])
+        row_size = sum(arr.dtype.itemsize for arr in columns.values())
+        block_rows = max(chunk_size // row_size, 1)
+        for start in range(0, rows, block_rows):
+            yield {col: arr[start:start + block_rows]
+                   for col, arr in columns.items()}
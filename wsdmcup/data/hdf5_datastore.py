@@ -3,7 +3,12 @@ Module offering methods for direct access to the HDF5 data file.
 This module provides universal load and store methods.
 """
 
+import os
+import shutil
 import logging
+import threading
+import contextlib
+from collections import OrderedDict
 
 import numpy
 import pandas
@@ -12,20 +17,115 @@ from scipy import sparse
 
 import wsdmcup.logging as wsdmlog
 from wsdmcup.config import Config
-from wsdmcup.data.csv_datastore import CsvDatastore
+from wsdmcup.data.csv_datastore import CsvDatastore, IndexBuffer
+from wsdmcup.data.id_lookup import IdEnumerator, IdLookup, hex_to_uint32
+from wsdmcup.data.hdf5_policies import DEFAULT_NODE_POLICIES, get_policy
+from wsdmcup.data.sparse_patterns import implicit_ones, is_binary
+from wsdmcup.data import npy_storage
 
 __author__ = 'damirah'
 __email__ = 'damirah@live.com'
 
+# HDF5 library is not thread-safe, all access to HDF5 files from threads of
+# one process (see wsdmcup.data.hdf5_prefetcher) goes through this lock
+HDF5_LOCK = threading.RLock()
+
 
 class Hdf5Datastore(object):
     """
     Class for storing and loading data to and from the HDF5 data file.
+    By default every method opens and closes the file. For many loads and
+    stores in a row open a session, the file then stays open (and nodes
+    found in it are cached) until the session is closed:
+
+        with Hdf5Datastore().open('r') as ds:
+            cit_m = ds.load_sparse_matrix('citation_matrix')
+            papers = ds.load_table('papers_table')
     """
 
-    def __init__(self, datastore_fname = Config.DATASTORE_FNAME):
+    def __init__(self, datastore_fname = Config.DATASTORE_FNAME,
+                 policies=None):
+        """
+        :param datastore_fname: name of the HDF5 file
+        :param policies: dictionary of {node name or kind of node:
+                         StoragePolicy or its name}, overrides
+                         Config.HDF5_NODE_POLICIES and the defaults in
+                         hdf5_policies.DEFAULT_NODE_POLICIES. Kinds of nodes
+                         are 'table', 'array' and parts of sparse matrices
+                         ('data', 'indices', 'indptr', 'shape').
+        """
         self.datastore_path = Config.get_path_to_hdf5_file(datastore_fname)
         self.logger = logging.getLogger(__name__)
+        self.policies = dict(Config.HDF5_NODE_POLICIES)
+        if policies:
+            self.policies.update(policies)
+        # file handle and {name: node} cache of an open session
+        self.session = None
+        self.nodes = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self, mode='a'):
+        """
+        Open a session, the file stays open until close is called (or the
+        with block using the datastore ends)
+        :param mode: 'r' for loading only, 'a' for loading and storing
+        :return: self
+        """
+        if self.session is not None:
+            raise ValueError('Session of %s is already open'
+                             % self.datastore_path)
+        self.logger.debug('Opening session of %s in mode %s',
+                          self.datastore_path, mode)
+        with HDF5_LOCK:
+            self.session = tables.open_file(self.datastore_path, mode)
+        self.nodes = {}
+        return self
+
+    def close(self):
+        """
+        Close session opened by open, does nothing if there is none
+        :return: None
+        """
+        if self.session is not None:
+            self.logger.debug('Closing session of %s', self.datastore_path)
+            with HDF5_LOCK:
+                self.session.close()
+        self.session = None
+        self.nodes = {}
+
+    @contextlib.contextmanager
+    def _open(self, mode='r'):
+        """
+        Get handle of the file, the session one if a session is open,
+        otherwise the file is opened just for the with block
+        :param mode: mode in which to open the file when there is no session
+        :return: tables.File
+        """
+        with HDF5_LOCK:
+            if self.session is not None:
+                yield self.session
+            else:
+                with tables.open_file(self.datastore_path, mode) as ds:
+                    yield ds
+
+    def _get_node(self, ds, name):
+        """
+        Get node from the root of the datastore, nodes are cached while
+        a session is open
+        :param ds: pointer to datastore
+        :param name: node name
+        :return: tables.Node
+        """
+        if ds is not self.session:
+            return getattr(ds.root, name)
+        if name not in self.nodes:
+            self.nodes[name] = getattr(ds.root, name)
+        return self.nodes[name]
 
     def get_datastore_path(self):
         """
@@ -41,6 +141,7 @@ class Hdf5Datastore(object):
         :param name: node name
         :return: None
         """
+        self.nodes.pop(name, None)
         try:
             self.logger.debug('Trying to remove node %s', name)
             ds.remove_node(ds.root, name=name)
@@ -48,6 +149,99 @@ class Hdf5Datastore(object):
         except tables.NoSuchNodeError:
             self.logger.debug('Node %s not found', name)
 
+    def get_id_lookup_path(self, name):
+        """
+        Get location of the ID lookup of a table, the lookups are stored in
+        directories next to the HDF5 file
+        :param name: table name
+        :return: absolute path as string
+        """
+        return '%s_%s_lookup' % (os.path.splitext(self.datastore_path)[0],
+                                 name)
+
+    def _remove_id_lookup(self, name):
+        """
+        Remove ID lookup of a table, called whenever the table is rewritten
+        :param name: table name
+        :return: None
+        """
+        path = self.get_id_lookup_path(name)
+        if os.path.exists(path):
+            self.logger.debug('Removing ID lookup %s', path)
+            shutil.rmtree(path)
+
+    def get_policy(self, name, kind):
+        """
+        Get storage policy of a node, policy set for the node name takes
+        precedence over the policy set for the kind of node
+        :param name: node name
+        :param kind: kind of node, see __init__
+        :return: hdf5_policies.StoragePolicy
+        """
+        for key in (name, kind):
+            if key in self.policies:
+                return get_policy(self.policies[key])
+        return DEFAULT_NODE_POLICIES[kind]
+
+    def _create_carray(self, ds, name, arr, kind):
+        """
+        Create array node for 'arr' using the storage policy of the node
+        :param ds: pointer to datastore
+        :param name: node name
+        :param arr: numpy.array to be stored
+        :param kind: kind of node, see __init__
+        :return: tables.CArray
+        """
+        policy = self.get_policy(name, kind)
+        atom = tables.Atom.from_dtype(arr.dtype)
+        ds_array = ds.create_carray(ds.root, name, atom, arr.shape,
+                                    filters=policy.get_filters(),
+                                    chunkshape=policy.get_chunkshape(
+                                        arr.shape))
+        self.logger.debug('Created array %s, %s', name, policy)
+        return ds_array
+
+    def _create_table(self, ds, name, description, expectedrows):
+        """
+        Create table using the storage policy of the node
+        :param ds: pointer to datastore
+        :param name: table name
+        :param description: instance of tables.IsDescription
+        :param expectedrows: estimated number of rows
+        :return: tables.Table
+        """
+        policy = self.get_policy(name, 'table')
+        table = ds.create_table(ds.root, name,
+                                description=description,
+                                expectedrows=expectedrows,
+                                filters=policy.get_filters(),
+                                chunkshape=policy.get_chunkshape(
+                                    (expectedrows,)))
+        self.logger.debug('Created table %s, %s', name, policy)
+        return table
+
+    def _is_packed_id(self, table, column):
+        """
+        :param table: tables.Table
+        :param column: column name
+        :return: True if the column holds MAG IDs packed into uint32 numbers
+        """
+        return (column.endswith('_id') and
+                table.coldtypes[column] == numpy.uint32)
+
+    def _column_values(self, table, column, values):
+        """
+        :param table: tables.Table
+        :param column: column name
+        :param values: values of the column, IDs for packed ID columns can be
+                       given as strings
+        :return: numpy.array which can be assigned to the column of records
+        """
+        values = numpy.asarray(values)
+        if self._is_packed_id(table, column) and values.dtype.kind in 'SUO':
+            values = hex_to_uint32(values)
+        return values
+
     def store_array(self, arr, name):
         """
         Store an array in hdf5
@@ -55,11 +249,9 @@ class Hdf5Datastore(object):
         :param name:
         :return:
         """
-        with tables.open_file(self.datastore_path, 'a') as ds:
+        with self._open('a') as ds:
             self._remove_node(ds, name)
-            atom = tables.Atom.from_dtype(arr.dtype)
-            ds_array = ds.create_carray(ds.root, name, atom, arr.shape)
-            self.logger.debug('Created array %s', name)
+            ds_array = self._create_carray(ds, name, arr, 'array')
             ds_array[:] = arr
 
     def load_array(self, name):
@@ -67,14 +259,47 @@ class Hdf5Datastore(object):
         :param name:
         :return:
         """
-        with tables.open_file(self.datastore_path) as ds:
-            arr = getattr(ds.root, name).read()
+        with self._open('r') as ds:
+            arr = self._get_node(ds, name).read()
         return arr
 
+    def has_array(self, name):
+        """
+        :param name: array name
+        :return: True if the array is stored
+        """
+        with self._open('r') as ds:
+            return '/%s' % name in ds
+
+    def get_sparse_matrix_mmap_path(self, name):
+        """
+        Get location of the memory-mapped copy of a sparse matrix, stored in
+        a directory next to the HDF5 file
+        :param name: matrix name
+        :return: absolute path as string
+        """
+        return '%s_%s_mmap' % (os.path.splitext(self.datastore_path)[0],
+                               name)
+
+    def _remove_sparse_matrix_mmap(self, name):
+        """
+        :param name: matrix name
+        :return: None
+        """
+        path = self.get_sparse_matrix_mmap_path(name)
+        if os.path.exists(path):
+            self.logger.debug('Removing memory-mapped matrix %s', path)
+            shutil.rmtree(path)
+
     def store_sparse_matrix(self, matrix, name):
         """
         Store sparse matrix in HDF5 datastore. Matrix has to be of type
-        scipy.sparse.csr_matrix.
+        scipy.sparse.csr_matrix. With Config.MMAP_SPARSE_MATRICES the matrix
+        is stored in the memory-mapped format instead (see
+        store_sparse_matrix_mmap). With Config.CSC_SPARSE_MATRICES a CSC copy
+        of the matrix is stored as well (see load_sparse_matrix_csc). With
+        Config.PATTERN_SPARSE_MATRICES values of binary matrices are not
+        stored, such matrices are loaded with implicit ones as values.
         :param matrix: the matrix to be stored
         :param name: name of the node in the HDF5 datastore under which to
                      store the matrix
@@ -82,62 +307,256 @@ class Hdf5Datastore(object):
         """
         msg = "The matrix has to be in CSR format"
         assert(sparse.isspmatrix_csr(matrix)), msg
-        with tables.open_file(self.datastore_path, 'a') as ds:
+        self._store_sparse_matrix(matrix, name)
+        csc_name = self.get_csc_name(name)
+        if Config.CSC_SPARSE_MATRICES:
+            self.logger.debug('Storing CSC copy of matrix %s', name)
+            # arrays of a CSC matrix are the arrays of CSR matrix of its
+            # transposition, transposing does not copy anything
+            self._store_sparse_matrix(matrix.tocsc().transpose(), csc_name)
+        else:
+            # an old copy would not match the new matrix
+            self.remove_sparse_matrix(csc_name)
+
+    def _store_sparse_matrix(self, matrix, name):
+        """
+        :param matrix: scipy.sparse.csr_matrix
+        :param name: matrix name
+        :return: None
+        """
+        if Config.MMAP_SPARSE_MATRICES:
+            self.store_sparse_matrix_mmap(matrix, name)
+            return
+        self._remove_sparse_matrix_mmap(name)
+        pattern = self._is_stored_as_pattern(matrix)
+        with self._open('a') as ds:
             for par in ('data', 'indices', 'indptr', 'shape'):
                 full_name = '%s_%s' % (name, par)
                 self._remove_node(ds, full_name)
+                if par == 'data' and pattern:
+                    self.logger.debug('Storing only pattern of matrix %s',
+                                      name)
+                    continue
                 arr = numpy.array(getattr(matrix, par))
-                atom = tables.Atom.from_dtype(arr.dtype)
-                ds_array = ds.create_carray(ds.root, full_name, atom, arr.shape)
-                self.logger.debug('Created array %s', full_name)
+                ds_array = self._create_carray(ds, full_name, arr, par)
                 ds_array[:] = arr
 
+    def _is_stored_as_pattern(self, matrix):
+        """
+        :param matrix: scipy.sparse.csr_matrix
+        :return: True if only indices, indptr and shape of the matrix are
+                 stored, see Config.PATTERN_SPARSE_MATRICES
+        """
+        return Config.PATTERN_SPARSE_MATRICES and is_binary(matrix)
+
+    def store_sparse_matrix_mmap(self, matrix, name):
+        """
+        Store sparse matrix in the memory-mapped format: data, indices,
+        indptr and shape arrays are stored as uncompressed .npy files in a
+        directory next to the HDF5 file (data only if the matrix is not
+        stored as pattern, see Config.PATTERN_SPARSE_MATRICES). The matrix is
+        removed from the HDF5 file, so there is always only one copy of it.
+        :param matrix: scipy.sparse.csr_matrix
+        :param name: matrix name
+        :return: None
+        """
+        msg = "The matrix has to be in CSR format"
+        assert(sparse.isspmatrix_csr(matrix)), msg
+        path = self.get_sparse_matrix_mmap_path(name)
+        self.logger.debug('Storing memory-mapped matrix %s', path)
+        pattern = self._is_stored_as_pattern(matrix)
+        if pattern:
+            self.logger.debug('Storing only pattern of matrix %s', name)
+        npy_storage.save_sparse_matrix(path, matrix, pattern)
+        with self._open('a') as ds:
+            for par in ('data', 'indices', 'indptr', 'shape'):
+                self._remove_node(ds, '%s_%s' % (name, par))
+
+    def load_sparse_matrix_mmap(self, name, mmap_mode='c'):
+        """
+        Load sparse matrix stored by store_sparse_matrix_mmap. The arrays of
+        the matrix are memory-mapped, so the matrix is backed directly by the
+        page cache (shared by all processes using it) and loading takes no
+        time.
+        :param name: matrix name
+        :param mmap_mode: passed to numpy.load, default 'c' (copy-on-write)
+                          allows in-place changes of the stored arrays
+                          without touching the files, 'r' makes them
+                          read-only
+        :return: scipy.sparse.csr_matrix, values of matrices stored without
+                 values are implicit ones, which are always read-only
+        """
+        path = self.get_sparse_matrix_mmap_path(name)
+        self.logger.debug('Memory-mapping matrix %s', path)
+        return npy_storage.load_sparse_matrix(path, mmap_mode)
+
+    def has_sparse_matrix_mmap(self, name):
+        """
+        :param name: matrix name
+        :return: True if the matrix is stored in the memory-mapped format
+        """
+        return npy_storage.has_sparse_matrix(
+            self.get_sparse_matrix_mmap_path(name))
+
+    def get_csc_name(self, name):
+        """
+        :param name: matrix name
+        :return: name under which CSC copy of the matrix is stored
+        """
+        return '%s_csc' % name
+
+    def has_sparse_matrix(self, name):
+        """
+        :param name: matrix name
+        :return: True if the matrix is stored (in either format)
+        """
+        if self.has_sparse_matrix_mmap(name):
+            return True
+        with self._open('r') as ds:
+            return '/%s_shape' % name in ds
+
+    def remove_sparse_matrix(self, name):
+        """
+        Remove sparse matrix, stored in either format, from datastore
+        :param name: matrix name
+        :return: None
+        """
+        self._remove_sparse_matrix_mmap(name)
+        with self._open('a') as ds:
+            for par in ('data', 'indices', 'indptr', 'shape'):
+                self._remove_node(ds, '%s_%s' % (name, par))
+
+    def load_sparse_matrix_csc(self, name):
+        """
+        Load sparse matrix in CSC format. If CSC copy of the matrix was stored
+        (see Config.CSC_SPARSE_MATRICES) it is loaded without any conversion,
+        otherwise the CSR matrix is loaded and converted. Values of the
+        copy of a binary matrix are read-only as in load_sparse_matrix.
+        :param name: matrix name
+        :return: scipy.sparse.csc_matrix
+        """
+        csc_name = self.get_csc_name(name)
+        if self.has_sparse_matrix(csc_name):
+            # the copy is stored as CSR matrix of the transposition
+            return self.load_sparse_matrix(csc_name).transpose()
+        self.logger.debug('No CSC copy of matrix %s, converting', name)
+        return self.load_sparse_matrix(name).tocsc()
+
     def load_sparse_matrix(self, name):
         """
-        Load sparse matrix from HDF5 datastore.
+        Load sparse matrix from HDF5 datastore, matrices stored in the
+        memory-mapped format are memory-mapped (see load_sparse_matrix_mmap).
+        Binary matrices stored without values (Config.PATTERN_SPARSE_MATRICES)
+        get read-only implicit ones as values, so in-place operations
+        changing values (e.g. eliminate_zeros) fail, they have to be done on
+        a copy of the matrix.
         :param name: node from which to load the matrix
         :return: scipy.sparse.csr_matrix
         """
-        with tables.open_file(self.datastore_path) as ds:
+        if self.has_sparse_matrix_mmap(name):
+            return self.load_sparse_matrix_mmap(name)
+        with self._open('r') as ds:
             pars = []
-            for par in ('data', 'indices', 'indptr', 'shape'):
-                pars.append(getattr(ds.root, '%s_%s' % (name, par)).read())
+            for par in ('indices', 'indptr', 'shape'):
+                pars.append(self._get_node(ds, '%s_%s' % (name, par)).read())
+            if '/%s_data' % name in ds:
+                data = self._get_node(ds, '%s_data' % name).read()
+            else:
+                # only pattern of the matrix is stored
+                data = implicit_ones(len(pars[0]))
         # it's necessary to tell scipy explicitly the datatype of the matrix
         # otherwise when summing rows/columns of the matrix the result might
         # overflow!! (because in the HDF5 store the matrix is stored
         # as numpy.int8 matrix)
-        matrix = sparse.csr_matrix(tuple(pars[:3]), shape=pars[3],
+        matrix = sparse.csr_matrix((data, pars[0], pars[1]), shape=pars[2],
                                    dtype=numpy.uint32)
         return matrix
 
-    def store_dataframe(self, df, name, description):
+    def load_sparse_matrix_rows(self, name, start=None, stop=None):
+        """
+        Load only rows [start, stop) of sparse matrix, only the matching part
+        of indices and data arrays is read from the datastore. The returned
+        block has stop - start rows and all columns of the matrix, its row i
+        is row start + i of the stored matrix. Blocks of rows can be processed
+        by different processes without loading the whole matrix.
+        :param name: matrix name
+        :param start: first row, None for the first row of the matrix
+        :param stop: row at which to stop (not included), None for the number
+                     of rows of the matrix
+        :return: scipy.sparse.csr_matrix, read-only values for binary
+                 matrices as in load_sparse_matrix
+        """
+        if self.has_sparse_matrix_mmap(name):
+            return npy_storage.row_block(self.load_sparse_matrix_mmap(name),
+                                         start, stop)
+        with self._open('r') as ds:
+            shape = self._get_node(ds, '%s_shape' % name).read()
+            start, stop, _ = slice(start, stop).indices(shape[0])
+            stop = max(start, stop)
+            indptr = self._get_node(
+                ds, '%s_indptr' % name).read(start, stop + 1)
+            indices = self._get_node(ds, '%s_indices' % name).read(
+                indptr[0], indptr[-1])
+            if '/%s_data' % name in ds:
+                data = self._get_node(ds, '%s_data' % name).read(
+                    indptr[0], indptr[-1])
+            else:
+                data = implicit_ones(len(indices))
+        self.logger.debug('Loaded rows %s-%s (%s values) of matrix %s',
+                          start, stop, len(data), name)
+        # row pointers of the block have to start at 0
+        indptr = indptr - indptr[0]
+        return sparse.csr_matrix((data, indices, indptr),
+                                 shape=(stop - start, shape[1]),
+                                 dtype=numpy.uint32)
+
+    def store_dataframe(self, df, name, description,
+                        chunk_size=Config.CSV_CHUNK_SIZE):
         """
-        :param df: pandas.DataFrame
+        Store DataFrame in HDF5 table. Columns of the DataFrame are copied
+        straight into structured arrays with the layout of the table, which
+        are written in chunks, values are never converted to Python objects.
+        :param df: pandas.DataFrame, columns are matched to the table columns
+                   by name, if some table column is missing in the DataFrame
+                   then by position (in order of the table columns)
         :param name: node in which to store the dataframe
+        :param description: instance of tables.IsDescription
+        :param chunk_size: number of bytes of table rows written at once
         :return: None
         """
-        self.logger.debug('Checking the number of rows to be stored')
         total = len(df)
-        self.logger.debug('Total: %s', total)
-        with tables.open_file(self.datastore_path, 'a') as ds:
+        self.logger.debug('Number of rows to be stored: %s', total)
+        with self._open('a') as ds:
             # first remove old node
             self._remove_node(ds, name)
+            self._remove_id_lookup(name)
             # then create again
-            table = ds.create_table(ds.root, name,
-                                    description=description,
-                                    expectedrows=total)
-            self.logger.debug('Created table %s', name)
+            table = self._create_table(ds, name, description, max(total, 1))
+            if all(column in df.columns for column in table.colnames):
+                columns = [df[column].values for column in table.colnames]
+            else:
+                self.logger.debug('Matching DataFrame columns by position')
+                columns = [df.iloc[:, i].values
+                           for i in range(len(table.colnames))]
+            chunk_rows = max(1, chunk_size // table.rowsize)
             self.logger.info('Storing dataframe in table')
-            self.logger.debug('Converting dataframe to list of tuples')
-            data = [tuple(x) for x in df.values]
-            self.logger.debug('Storing data in dataframe')
-            table.append(data)
+            for start in range(0, total, chunk_rows):
+                stop = min(start + chunk_rows, total)
+                records = numpy.empty(stop - start, dtype=table.dtype)
+                for column, values in zip(table.colnames, columns):
+                    records[column] = self._column_values(
+                        table, column, values[start:stop])
+                table.append(records)
+            table.flush()
             self.logger.info('Storing done')
         return
 
-    def store_table(self, name, description, csv_path, csv_mapping):
+    def store_table(self, name, description, csv_path, csv_mapping,
+                    chunk_size=Config.CSV_CHUNK_SIZE):
         """
-        Read CSV file line by line and store the data in HDF5 data store
+        Read CSV file and store the data in HDF5 data store. The file is
+        parsed in chunks, each chunk is converted to a structured array with
+        the layout of the table and appended at once.
         :param name: name of the table
         :param description: instance of tables.IsDescription, class describing
                             the columns of the table (number, data types, etc.)
@@ -146,54 +565,177 @@ class Hdf5Datastore(object):
                             table description columns to the CSV columns
                             (for each column in 'description' this should
                             contain index of the column in the input CSV)
+        :param chunk_size: number of bytes parsed at once
         :return: how many rows were stored in the datastore
         """
+        rows, _, _ = self.store_table_with_relations(
+            name, description, csv_path, csv_mapping, {}, chunk_size)
+        return rows
+
+    def _chunk_to_records(self, chunk, table, csv_mapping, row_index):
+        """
+        Convert chunk of CSV columns into numpy structured array with the
+        layout of the table (the same values store_table would write)
+        :param chunk: dictionary of {CSV column index: numpy.array}
+        :param table: tables.Table
+        :param csv_mapping: Enum, see store_table
+        :param row_index: index of the first row of the chunk
+        :return: numpy structured array
+        """
+        num_rows = len(next(iter(chunk.values())))
+        records = numpy.zeros(num_rows, dtype=table.dtype)
+        for column in table.colnames:
+            if hasattr(csv_mapping, column):
+                values = chunk[getattr(csv_mapping, column).value]
+                if self._is_packed_id(table, column):
+                    values = hex_to_uint32(values)
+                records[column] = values
+            elif column.endswith('_index'):
+                records[column] = numpy.arange(row_index, row_index + num_rows)
+        return records
+
+    def store_table_with_relations(self, name, description, csv_path,
+                                   csv_mapping, relations, chunk_size):
+        """
+        Read CSV file in chunks and store the data in HDF5 table (the same
+        table store_table creates). In the same pass build relation matrices
+        between the table rows and IDs found in other CSV columns, indices of
+        these IDs are assigned on the fly in order of their first appearance.
+        :param name: name of the table
+        :param description: instance of tables.IsDescription, see store_table
+        :param csv_path: path to the input CSV file
+        :param csv_mapping: Enum, see store_table
+        :param relations: dictionary of {matrix name: index of CSV column
+                          with IDs}, rows of each matrix are table rows
+        :param chunk_size: number of bytes parsed at once
+        :return: tuple (how many rows were stored in the datastore,
+                 dictionary of {matrix name: scipy.sparse.csr_matrix},
+                 dictionary of {matrix name: {id: index}})
+        """
         msg = ("The descriptor parameter has to be instance "
                "of tables.IsDescription class")
         assert(issubclass(description, tables.IsDescription)), msg
 
         msg = "No intersection between HDF5 description and CSV mapping"
-        assert(len(set([i.name for i in csv_mapping])
-                   .intersection(description.columns)) > 0), msg
+        table_columns = [getattr(csv_mapping, column).value
+                         for column in description.columns
+                         if hasattr(csv_mapping, column)]
+        assert(len(table_columns) > 0), msg
 
         row_index = 0
-        self.logger.debug('Checking the number of rows to be stored')
-        total = wsdmlog.get_total(csv_path)
-        self.logger.debug('Total: %s', total)
-        how_often = wsdmlog.how_often(total)
+        total = wsdmlog.estimate_total(csv_path)
+        self.logger.debug('Estimated number of rows to be stored: %s', total)
+
+        csv_datastore = CsvDatastore()
+        usecols = set(table_columns).union(relations.values())
+        enumerators = {matrix: IdEnumerator() for matrix in relations}
+        buffers = {matrix: (IndexBuffer(numpy.int64), IndexBuffer(numpy.int64))
+                   for matrix in relations}
+
+        with self._open('a') as ds:
+            # first remove old node
+            self._remove_node(ds, name)
+            self._remove_id_lookup(name)
+            # then create again
+            table = self._create_table(ds, name, description, total)
+            for chunk in csv_datastore.read_csv_chunks(csv_path, usecols,
+                                                       chunk_size):
+                records = self._chunk_to_records(chunk, table, csv_mapping,
+                                                 row_index)
+                table.append(records)
+                rows = numpy.arange(row_index, row_index + len(records))
+                for matrix, csv_col in relations.items():
+                    ids = chunk[csv_col]
+                    valid = ids != b''
+                    row_indices, col_indices = buffers[matrix]
+                    row_indices.extend(rows[valid])
+                    col_indices.extend(enumerators[matrix].enumerate(
+                        ids[valid]))
+                row_index += len(records)
+            table.flush()
+
+        matrices = {}
+        for matrix in relations:
+            row_indices, col_indices = buffers[matrix]
+            self.logger.info('Matrix %s: found %s relations to %s IDs',
+                             matrix, len(row_indices),
+                             len(enumerators[matrix]))
+            matrices[matrix] = csv_datastore.build_relation_matrix(
+                row_indices.to_array(), col_indices.to_array(),
+                numpy.ones(len(row_indices), dtype=numpy.uint32),
+                (row_index, len(enumerators[matrix])))
+        id_maps = {matrix: enumerators[matrix].get_dict()
+                   for matrix in relations}
+        return row_index, matrices, id_maps
 
-        with tables.open_file(self.datastore_path, 'a') as ds:
+    def store_columns(self, name, description, columns):
+        """
+        Store columns of data as HDF5 table
+        :param name: name of the table
+        :param description: instance of tables.IsDescription
+        :param columns: dictionary of {column name: numpy.array}, all
+                        columns of the description have to be present, IDs
+                        for packed ID columns can be given as strings
+        :return: None
+        """
+        with self._open('a') as ds:
             # first remove old node
             self._remove_node(ds, name)
+            self._remove_id_lookup(name)
             # then create again
-            table = ds.create_table(ds.root, name,
-                                    description=description,
-                                    expectedrows=total)
-            self.logger.debug('Created table %s', name)
-            hdf_row = table.row
-            # iterate over csv and write it in the table line by line
-            csv_datastore = CsvDatastore()
-            for csv_row in csv_datastore.read_csv(csv_path):
-                for column in description.columns:
-                    if hasattr(csv_mapping, column):
-                        csv_col_index = getattr(csv_mapping, column).value
-                        hdf_row[column] = str.encode(csv_row[csv_col_index])
-                    elif column.endswith('_index'):
-                        hdf_row[column] = row_index
-                hdf_row.append()
-                table.flush()
-                row_index += 1
-                if row_index % how_often == 0:
-                    self.logger.debug(wsdmlog.get_progress(row_index, total))
-
-        return row_index
-
-    def load_table(self, name):
-        """
-        Load specified table into pandas DataFrame
+            num_rows = len(next(iter(columns.values())))
+            table = self._create_table(ds, name, description, max(num_rows, 1))
+            records = numpy.zeros(num_rows, dtype=table.dtype)
+            for column in table.colnames:
+                records[column] = self._column_values(table, column,
+                                                      columns[column])
+            table.append(records)
+            table.flush()
+        return
+
+    def load_id_lookup(self, name, id_col, idx_col):
+        """
+        Load lookup of IDs in table to their indices. The lookup is built
+        from the table on first use and stored next to the HDF5 file, later
+        it is only memory-mapped.
+        :param name: table name
+        :param id_col: name of the ID column
+        :param idx_col: name of the index column
+        :return: wsdmcup.data.id_lookup.IdLookup
+        """
+        path = self.get_id_lookup_path(name)
+        if not IdLookup.exists(path):
+            self.logger.info('Building ID lookup of table %s', name)
+            with self._open('r') as ds:
+                table = self._get_node(ds, name)
+                lookup = IdLookup(table.col(id_col), table.col(idx_col))
+            self.logger.info('Storing ID lookup in %s', path)
+            lookup.save(path)
+        return IdLookup.load(path)
+
+    def load_table(self, name, columns=None, start=None, stop=None):
+        """
+        Load specified table (or only some of its columns and rows) into
+        pandas DataFrame. Only the selected columns are read from the file,
+        so leaving out wide columns (e.g. doi of papers) saves both memory
+        and I/O.
         :param name: table name
+        :param columns: list of column names to load, None for all columns
+        :param start: first row to load, None to start at the first row
+        :param stop: row at which to stop loading (not included), None to
+                     load until the last row
         :return: pandas.DataFrame with the table data
         """
-        with tables.open_file(self.datastore_path, 'r') as ds:
-            table = getattr(ds.root, name)
-            return pandas.DataFrame.from_records(table.read())
+        with self._open('r') as ds:
+            table = self._get_node(ds, name)
+            if columns is None:
+                return pandas.DataFrame.from_records(
+                    table.read(start, stop))
+            unknown = [col for col in columns if col not in table.colnames]
+            if unknown:
+                raise KeyError('Table %s has no columns %s' % (name, unknown))
+            # read column by column, rows of the other columns are never
+            # copied out of the file
+            return pandas.DataFrame(OrderedDict(
+                (col, table.read(start, stop, field=col)) for col in columns),
+                columns=columns)
@@ -5,6 +5,8 @@ This module provides methods for accessing specific data.
 
 import logging
 
+import numpy
+
 from wsdmcup.config import Config
 from wsdmcup.data.hdf5_mappings import (
     Papers as PapersHdf5,
@@ -13,7 +15,9 @@ from wsdmcup.data.hdf5_mappings import (
     Journals as JournalsHdf5,
     ConferenceSeries as ConferenceSeriesHdf5,
     AuthorStatistics as AuthorStatisticsHdf5,
+    AuthorHIndexLog as AuthorHIndexLogHdf5,
     FieldsOfStudy as FieldsOfStudyHdf5,
+    PACKED_ID_DESCRIPTIONS,
 )
 from wsdmcup.data.csv_mappings import (
     Papers as PapersCsv,
@@ -24,22 +28,85 @@ from wsdmcup.data.csv_mappings import (
     FieldsOfStudy as FieldsOfStudyCsv,
 )
 from wsdmcup.data.hdf5_datastore import Hdf5Datastore
+from wsdmcup.data.npy_datastore import NpyDatastore
+from wsdmcup.data.id_lookup import to_bytes
+from wsdmcup.model.temporal_h_index import HIndexLog
 
 __author__ = 'damirah'
 __email__ = 'damirah@live.com'
 
 
+# names of all sparse matrices in the data store
+SPARSE_MATRICES = [
+    'citation_matrix',
+    'authorship_matrix',
+    'affiliation_matrix',
+    'paper_affiliation_matrix',
+    'paper_journal_matrix',
+    'paper_conf_series_matrix',
+    'author_sequence_matrix',
+    'paper_field_of_study_matrix',
+]
+
+# data store classes, selected by Config.DATASTORE_BACKEND
+DATASTORE_BACKENDS = {
+    'hdf5': Hdf5Datastore,
+    'npy': NpyDatastore,
+}
+
+
 class Hdf5Manager(object):
+    """
+    Loads and stores specific data. Every method opens and closes the data
+    store on its own, unless a session is open:
+
+        with Hdf5Manager().open('r') as h5:
+            papers = h5.load_papers()
+            cit_m = h5.load_citation_matrix()
+    """
 
     def __init__(self):
         self.logger = logging.getLogger(__name__)
+        self.datastore = DATASTORE_BACKENDS[Config.DATASTORE_BACKEND]()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self, mode='a'):
+        """
+        Keep the data store open until close is called (or the with block
+        using the manager ends), see Hdf5Datastore.open
+        :param mode: 'r' for loading only, 'a' for loading and storing
+        :return: self
+        """
+        self.datastore.open(mode)
+        return self
+
+    def close(self):
+        """
+        :return: None
+        """
+        self.datastore.close()
+
+    def _description(self, description):
+        """
+        :param description: one of the table descriptions in hdf5_mappings
+        :return: the description, or its variant with packed IDs when
+                 Config.PACKED_IDS is switched on
+        """
+        if Config.PACKED_IDS:
+            return PACKED_ID_DESCRIPTIONS[description]
+        return description
 
     def store_citation_matrix(self, cit_matrix):
         """
         :param cit_matrix: scipy.sparse.csr_matrix
         :return: None
         """
-        ds = Hdf5Datastore()
+        ds = self.datastore
         self.logger.info('Storing citation matrix in %s',
                          ds.get_datastore_path())
         ds.store_sparse_matrix(cit_matrix, 'citation_matrix')
@@ -47,9 +114,10 @@ class Hdf5Manager(object):
 
     def load_citation_matrix(self):
         """
-        :return: scipy.sparse.csr_matrix
+        :return: scipy.sparse.csr_matrix, its values are read-only (binary
+                 matrix, see wsdmcup.data.sparse_patterns)
         """
-        ds = Hdf5Datastore()
+        ds = self.datastore
         self.logger.info('Loading citation matrix from %s',
                          ds.get_datastore_path())
         adj_matrix = ds.load_sparse_matrix('citation_matrix')
@@ -61,7 +129,7 @@ class Hdf5Manager(object):
         :param adj_matrix: scipy.sparse.csr_matrix
         :return: None
         """
-        ds = Hdf5Datastore()
+        ds = self.datastore
         self.logger.info('Storing authorship matrix in %s',
                          ds.get_datastore_path())
         ds.store_sparse_matrix(auth_matrix, 'authorship_matrix')
@@ -69,9 +137,10 @@ class Hdf5Manager(object):
 
     def load_authorship_matrix(self):
         """
-        :return: scipy.sparse.csr_matrix
+        :return: scipy.sparse.csr_matrix, its values are read-only (binary
+                 matrix, see wsdmcup.data.sparse_patterns)
         """
-        ds = Hdf5Datastore()
+        ds = self.datastore
         self.logger.info('Loading authorship matrix from %s',
                          ds.get_datastore_path())
         auth_matrix = ds.load_sparse_matrix('authorship_matrix')
@@ -83,7 +152,7 @@ class Hdf5Manager(object):
         :param auth_seq_m: scipy.sparse.csr_matrix
         :return: None
         """
-        ds = Hdf5Datastore()
+        ds = self.datastore
         self.logger.info('Storing paper-author-affiliation matrix in %s',
                          ds.get_datastore_path())
         ds.store_sparse_matrix(aff_matrix, 'affiliation_matrix')
@@ -93,7 +162,7 @@ class Hdf5Manager(object):
         """
         :return: scipy.sparse.csr_matrix
         """
-        ds = Hdf5Datastore()
+        ds = self.datastore
         self.logger.info('Loading paper-author-affiliation matrix from %s',
                          ds.get_datastore_path())
         aff_matrix = ds.load_sparse_matrix('affiliation_matrix')
@@ -105,7 +174,7 @@ class Hdf5Manager(object):
         :param auth_seq_m: scipy.sparse.csr_matrix
         :return: None
         """
-        ds = Hdf5Datastore()
+        ds = self.datastore
         self.logger.info('Storing paper-affiliation matrix in %s',
                          ds.get_datastore_path())
         ds.store_sparse_matrix(aff_matrix, 'paper_affiliation_matrix')
@@ -113,9 +182,10 @@ class Hdf5Manager(object):
 
     def load_paper_affiliation_matrix(self):
         """
-        :return: scipy.sparse.csr_matrix
+        :return: scipy.sparse.csr_matrix, its values are read-only (binary
+                 matrix, see wsdmcup.data.sparse_patterns)
         """
-        ds = Hdf5Datastore()
+        ds = self.datastore
         self.logger.info('Loading paper-affiliation matrix from %s',
                          ds.get_datastore_path())
         aff_matrix = ds.load_sparse_matrix('paper_affiliation_matrix')
@@ -127,7 +197,7 @@ class Hdf5Manager(object):
         :param journal_m: scipy.sparse.csr_matrix
         :return: None
         """
-        ds = Hdf5Datastore()
+        ds = self.datastore
         self.logger.info('Storing paper-journal matrix in %s',
                          ds.get_datastore_path())
         ds.store_sparse_matrix(journal_m, 'paper_journal_matrix')
@@ -135,9 +205,10 @@ class Hdf5Manager(object):
 
     def load_paper_journal_matrix(self):
         """
-        :return: scipy.sparse.csr_matrix
+        :return: scipy.sparse.csr_matrix, its values are read-only (binary
+                 matrix, see wsdmcup.data.sparse_patterns)
         """
-        ds = Hdf5Datastore()
+        ds = self.datastore
         self.logger.info('Loading paper-journal matrix from %s',
                          ds.get_datastore_path())
         journal_m = ds.load_sparse_matrix('paper_journal_matrix')
@@ -149,7 +220,7 @@ class Hdf5Manager(object):
         :param conf_series_m: scipy.sparse.csr_matrix
         :return: None
         """
-        ds = Hdf5Datastore()
+        ds = self.datastore
         self.logger.info('Storing paper-conference series matrix in %s',
                          ds.get_datastore_path())
         ds.store_sparse_matrix(conf_series_m, 'paper_conf_series_matrix')
@@ -157,9 +228,10 @@ class Hdf5Manager(object):
 
     def load_paper_conf_series_matrix(self):
         """
-        :return: scipy.sparse.csr_matrix
+        :return: scipy.sparse.csr_matrix, its values are read-only (binary
+                 matrix, see wsdmcup.data.sparse_patterns)
         """
-        ds = Hdf5Datastore()
+        ds = self.datastore
         self.logger.info('Loading paper-conference series matrix from %s',
                          ds.get_datastore_path())
         conf_series_m = ds.load_sparse_matrix('paper_conf_series_matrix')
@@ -171,7 +243,7 @@ class Hdf5Manager(object):
         :param auth_seq_m: scipy.sparse.csr_matrix
         :return: None
         """
-        ds = Hdf5Datastore()
+        ds = self.datastore
         self.logger.info('Storing author sequence number matrix in %s',
                          ds.get_datastore_path())
         ds.store_sparse_matrix(auth_seq_m, 'author_sequence_matrix')
@@ -181,7 +253,7 @@ class Hdf5Manager(object):
         """
         :return: scipy.sparse.csr_matrix
         """
-        ds = Hdf5Datastore()
+        ds = self.datastore
         self.logger.info('Loading author sequence number matrix from %s',
                          ds.get_datastore_path())
         auth_seq_m = ds.load_sparse_matrix('author_sequence_matrix')
@@ -193,7 +265,7 @@ class Hdf5Manager(object):
         :param fos_m: scipy.sparse.csr_matrix
         :return: None
         """
-        ds = Hdf5Datastore()
+        ds = self.datastore
         self.logger.info('Storing paper-field of study matrix in %s',
                          ds.get_datastore_path())
         ds.store_sparse_matrix(fos_m, 'paper_field_of_study_matrix')
@@ -202,15 +274,89 @@ class Hdf5Manager(object):
 
     def load_paper_field_of_study_matrix(self):
         """
-        :return: scipy.sparse.csr_matrix
+        :return: scipy.sparse.csr_matrix, its values are read-only (binary
+                 matrix, see wsdmcup.data.sparse_patterns)
         """
-        ds = Hdf5Datastore()
+        ds = self.datastore
         self.logger.info('Loading paper-field of study matrix from %s',
                          ds.get_datastore_path())
         fos_m = ds.load_sparse_matrix('paper_field_of_study_matrix')
         self.logger.info('Loading done!')
         return fos_m
 
+    def store_matrices(self, matrices):
+        """
+        Store several sparse matrices, each one under its own name
+        :param matrices: dictionary of {name: scipy.sparse.csr_matrix}
+        :return: None
+        """
+        ds = self.datastore
+        for name, matrix in sorted(matrices.items()):
+            self.logger.info('Storing %s in %s', name,
+                             ds.get_datastore_path())
+            ds.store_sparse_matrix(matrix, name)
+        self.logger.info('Storing done!')
+
+    def load_matrix_rows(self, name, start, stop):
+        """
+        Load a block of rows of sparse matrix, e.g. rows of the citation
+        matrix for one shard of papers
+        :param name: matrix name, one of SPARSE_MATRICES
+        :param start: first row
+        :param stop: row at which to stop (not included)
+        :return: scipy.sparse.csr_matrix with stop - start rows, values of
+                 binary matrices are read-only
+        """
+        ds = self.datastore
+        self.logger.info('Loading rows %s-%s of %s from %s', start, stop, name,
+                         ds.get_datastore_path())
+        matrix = ds.load_sparse_matrix_rows(name, start, stop)
+        self.logger.info('Loading done!')
+        return matrix
+
+    def load_matrix_csc(self, name):
+        """
+        Load CSC copy of sparse matrix, stored when the matrix was stored
+        with Config.CSC_SPARSE_MATRICES
+        :param name: matrix name, one of SPARSE_MATRICES
+        :return: scipy.sparse.csc_matrix, None if there is no CSC copy of the
+                 matrix (network classes then convert the CSR matrix when
+                 needed), values of binary matrices are read-only
+        """
+        ds = self.datastore
+        if not ds.has_sparse_matrix(ds.get_csc_name(name)):
+            self.logger.info('No CSC copy of %s in %s', name,
+                             ds.get_datastore_path())
+            return None
+        self.logger.info('Loading CSC copy of %s from %s', name,
+                         ds.get_datastore_path())
+        matrix = ds.load_sparse_matrix_csc(name)
+        self.logger.info('Loading done!')
+        return matrix
+
+    def sparse_matrices_to_mmap(self):
+        """
+        Move all sparse matrices (and their CSC copies) found in the HDF5
+        file to the memory-mapped format (see
+        Hdf5Datastore.store_sparse_matrix_mmap)
+        :return: None
+        """
+        ds = self.datastore
+        names = SPARSE_MATRICES + [ds.get_csc_name(name)
+                                   for name in SPARSE_MATRICES]
+        for name in names:
+            if not ds.has_sparse_matrix(name):
+                self.logger.info('Matrix %s not found', name)
+                continue
+            if ds.has_sparse_matrix_mmap(name):
+                self.logger.info('Matrix %s is already memory-mapped', name)
+                continue
+            matrix = ds.load_sparse_matrix(name)
+            self.logger.info('Storing %s in %s', name,
+                             ds.get_sparse_matrix_mmap_path(name))
+            ds.store_sparse_matrix_mmap(matrix, name)
+        self.logger.info('Storing done!')
+
     def store_papers(self):
         """
         :return: None
@@ -218,10 +364,59 @@ class Hdf5Manager(object):
         papers_file = 'Papers.txt'
         papers_path = Config.get_path_to_data_file(papers_file)
         self.logger.info('Reading papers from %s', papers_path)
-        rows = Hdf5Datastore().store_table('papers_table', PapersHdf5,
-                                           papers_path, PapersCsv)
+        rows = self.datastore.store_table('papers_table',
+                                          self._description(PapersHdf5),
+                                          papers_path, PapersCsv)
         self.logger.info('Rows exported: %s', rows)
 
+    def store_papers_and_venues(self):
+        """
+        Store papers table, paper-journal and paper-conference series
+        matrices in a single pass over Papers.txt. Journal and conference
+        series indices are assigned on the fly (in order of first appearance
+        in Papers.txt) and journals and conference series tables are
+        rewritten to match the matrices.
+        :return: None
+        """
+        papers_file = 'Papers.txt'
+        papers_path = Config.get_path_to_data_file(papers_file)
+        self.logger.info('Reading papers, journals and conference series '
+                         'from %s', papers_path)
+        rows, matrices, id_maps = self.datastore.store_table_with_relations(
+            'papers_table', self._description(PapersHdf5), papers_path,
+            PapersCsv,
+            {'paper_journal_matrix': PapersCsv.journal_id.value,
+             'paper_conf_series_matrix': PapersCsv.conference_series_id.value},
+            Config.CSV_CHUNK_SIZE)
+        self.logger.info('Rows exported: %s', rows)
+        self.store_matrices(matrices)
+        self._store_id_table('journals_table',
+                             self._description(JournalsHdf5), 'journal_id',
+                             'journal_index',
+                             id_maps['paper_journal_matrix'])
+        self._store_id_table('conference_series_table',
+                             self._description(ConferenceSeriesHdf5),
+                             'conference_series_id', 'conference_series_index',
+                             id_maps['paper_conf_series_matrix'])
+
+    def _store_id_table(self, name, description, id_col, idx_col, id_map):
+        """
+        :param name: name of the table
+        :param description: instance of tables.IsDescription with two columns
+        :param id_col: name of the ID column
+        :param idx_col: name of the index column
+        :param id_map: dictionary of {id: index}
+        :return: None
+        """
+        ds = self.datastore
+        self.logger.info('Storing %s IDs in table %s', len(id_map), name)
+        ds.store_columns(name, description, {
+            id_col: to_bytes(list(id_map.keys())),
+            idx_col: numpy.fromiter(id_map.values(), dtype=numpy.int64,
+                                    count=len(id_map)),
+        })
+        self.logger.info('Storing done!')
+
     def store_authors(self):
         """
         :return: None
@@ -229,8 +424,9 @@ class Hdf5Manager(object):
         authors_file = 'Authors.txt'
         authors_path = Config.get_path_to_data_file(authors_file)
         self.logger.info('Reading authors from %s', authors_file)
-        rows = Hdf5Datastore().store_table('authors_table', AuthorsHdf5,
-                                           authors_path, AuthorsCsv)
+        rows = self.datastore.store_table('authors_table',
+                                          self._description(AuthorsHdf5),
+                                          authors_path, AuthorsCsv)
         self.logger.info('Rows exported: %s', rows)
 
     def store_affiliations(self):
@@ -240,9 +436,10 @@ class Hdf5Manager(object):
         affiliations_file = 'Affiliations.txt'
         affiliations_path = Config.get_path_to_data_file(affiliations_file)
         self.logger.info('Reading affiliations from %s', affiliations_path)
-        rows = Hdf5Datastore().store_table('affiliations_table',
-                                           AffiliationsHdf5,
-                                           affiliations_path, AffiliationsCsv)
+        description = self._description(AffiliationsHdf5)
+        rows = self.datastore.store_table('affiliations_table',
+                                          description,
+                                          affiliations_path, AffiliationsCsv)
         self.logger.info('Rows exported: %s', rows)
 
     def store_journals(self):
@@ -252,9 +449,9 @@ class Hdf5Manager(object):
         journals_file = 'Journals.txt'
         journals_path = Config.get_path_to_data_file(journals_file)
         self.logger.info('Reading journals from %s', journals_path)
-        rows = Hdf5Datastore().store_table('journals_table',
-                                           JournalsHdf5,
-                                           journals_path, JournalsCsv)
+        rows = self.datastore.store_table('journals_table',
+                                          self._description(JournalsHdf5),
+                                          journals_path, JournalsCsv)
         self.logger.info('Rows exported: %s', rows)
 
     def store_conference_series(self):
@@ -264,10 +461,11 @@ class Hdf5Manager(object):
         conf_series_file = 'Conferences.txt'
         conf_series_path = Config.get_path_to_data_file(conf_series_file)
         self.logger.info('Reading conference series from %s', conf_series_path)
-        rows = Hdf5Datastore().store_table('conference_series_table',
-                                           ConferenceSeriesHdf5,
-                                           conf_series_path,
-                                           ConferenceSeriesCsv)
+        description = self._description(ConferenceSeriesHdf5)
+        rows = self.datastore.store_table('conference_series_table',
+                                          description,
+                                          conf_series_path,
+                                          ConferenceSeriesCsv)
         self.logger.info('Rows exported: %s', rows)
 
     def store_fields_of_study(self):
@@ -277,10 +475,11 @@ class Hdf5Manager(object):
         fos_file = 'FieldsOfStudy.txt'
         fos_path = Config.get_path_to_data_file(fos_file)
         self.logger.info('Reading fields of study from %s', fos_path)
-        rows = Hdf5Datastore().store_table('fields_of_study_table',
-                                           FieldsOfStudyHdf5,
-                                           fos_path,
-                                           FieldsOfStudyCsv)
+        description = self._description(FieldsOfStudyHdf5)
+        rows = self.datastore.store_table('fields_of_study_table',
+                                          description,
+                                          fos_path,
+                                          FieldsOfStudyCsv)
         self.logger.info('Rows exported: %s', rows)
         return
 
@@ -289,10 +488,11 @@ class Hdf5Manager(object):
         :param astats: pandas.DataFrame
         :return:
         """
-        ds = Hdf5Datastore()
+        ds = self.datastore
         self.logger.info('Storing author statistics in %s',
                          ds.get_datastore_path())
-        ds.store_dataframe(astats, 'author_statistics', AuthorStatisticsHdf5)
+        ds.store_dataframe(astats, 'author_statistics',
+                           self._description(AuthorStatisticsHdf5))
         self.logger.info('Storing done!')
 
     def store_author_h_index(self, h_i):
@@ -300,7 +500,7 @@ class Hdf5Manager(object):
         :param h_i:
         :return:
         """
-        ds = Hdf5Datastore()
+        ds = self.datastore
         self.logger.info('Storing author h-index values in %s',
                          ds.get_datastore_path())
         ds.store_array(h_i, 'author_h_index')
@@ -310,7 +510,7 @@ class Hdf5Manager(object):
         """
         :return:
         """
-        ds = Hdf5Datastore()
+        ds = self.datastore
         self.logger.info('Loading author h-index values from %s',
                          ds.get_datastore_path())
         h_i = ds.load_array('author_h_index')
@@ -318,13 +518,73 @@ class Hdf5Manager(object):
                          len(h_i))
         return h_i
 
-    def load_papers(self):
+    def store_paper_pagerank(self, scores):
+        """
+        :param scores: numpy.array with PageRank of each paper
+        :return: None
+        """
+        ds = self.datastore
+        self.logger.info('Storing PageRank of papers in %s',
+                         ds.get_datastore_path())
+        ds.store_array(scores, 'paper_pagerank')
+        self.logger.info('Storing done!')
+
+    def load_paper_pagerank(self):
+        """
+        :return: numpy.array with PageRank of each paper, None if it was not
+                 stored
         """
+        ds = self.datastore
+        if not ds.has_array('paper_pagerank'):
+            self.logger.info('No PageRank of papers in %s',
+                             ds.get_datastore_path())
+            return None
+        self.logger.info('Loading PageRank of papers from %s',
+                         ds.get_datastore_path())
+        scores = ds.load_array('paper_pagerank')
+        self.logger.info('Loading done! Got %s scores', len(scores))
+        return scores
+
+    def store_author_h_index_log(self, h_index_log):
+        """
+        :param h_index_log: wsdmcup.model.temporal_h_index.HIndexLog
+        :return: None
+        """
+        ds = self.datastore
+        self.logger.info('Storing %s changes of author h-index in %s',
+                         len(h_index_log), ds.get_datastore_path())
+        # the table has no MAG IDs, it is the same with packed IDs
+        ds.store_dataframe(h_index_log.to_dataframe('author_index'),
+                           'author_h_index_log', AuthorHIndexLogHdf5)
+        self.logger.info('Storing done!')
+
+    def load_author_h_index_log(self, num_authors=None):
+        """
+        :param num_authors: number of authors, None for the highest author
+                            index in the log + 1
+        :return: wsdmcup.model.temporal_h_index.HIndexLog
+        """
+        ds = self.datastore
+        self.logger.info('Loading changes of author h-index from %s',
+                         ds.get_datastore_path())
+        changes = ds.load_table('author_h_index_log')
+        h_index_log = HIndexLog(changes['author_index'].values,
+                                changes['year'].values,
+                                changes['h_index'].values, num_authors)
+        self.logger.info('Loading done! Got %s changes', len(h_index_log))
+        return h_index_log
+
+    def load_papers(self, columns=None, start=None, stop=None):
+        """
+        :param columns: list of column names to load, None for all columns
+        :param start: first row to load, None to start at the first row
+        :param stop: row at which to stop loading (not included), None to
+                     load until the last row
         :return: pandas.DataFrame
         """
-        ds = Hdf5Datastore()
+        ds = self.datastore
         self.logger.info('Loading papers from %s', ds.get_datastore_path())
-        papers = ds.load_table('papers_table')
+        papers = ds.load_table('papers_table', columns, start, stop)
         self.logger.info('Loading done! Got %s papers', len(papers))
 
         # self.logger.info('Setting index')
@@ -337,13 +597,17 @@ class Hdf5Manager(object):
         # self.logger.info('Indexing done')
         return papers
 
-    def load_authors(self):
+    def load_authors(self, columns=None, start=None, stop=None):
         """
+        :param columns: list of column names to load, None for all columns
+        :param start: first row to load, None to start at the first row
+        :param stop: row at which to stop loading (not included), None to
+                     load until the last row
         :return: pandas.DataFrame
         """
-        ds = Hdf5Datastore()
+        ds = self.datastore
         self.logger.info('Loading authors from %s', ds.get_datastore_path())
-        authors = ds.load_table('authors_table')
+        authors = ds.load_table('authors_table', columns, start, stop)
         self.logger.info('Loading done! Got %s authors', len(authors))
 
         # self.logger.info('Setting index')
@@ -356,58 +620,148 @@ class Hdf5Manager(object):
         # self.logger.info('Indexing done')
         return authors
 
-    def load_affiliations(self):
+    def load_affiliations(self, columns=None, start=None, stop=None):
         """
+        :param columns: list of column names to load, None for all columns
+        :param start: first row to load, None to start at the first row
+        :param stop: row at which to stop loading (not included), None to
+                     load until the last row
         :return: pandas.DataFrame
         """
-        ds = Hdf5Datastore()
+        ds = self.datastore
         self.logger.info('Loading affiliations from %s',
                          ds.get_datastore_path())
-        affiliations = ds.load_table('affiliations_table')
+        affiliations = ds.load_table('affiliations_table', columns,
+                                     start, stop)
         self.logger.info('Loading done! Got %s affiliations', len(affiliations))
         return affiliations
 
-    def load_journals(self):
+    def load_journals(self, columns=None, start=None, stop=None):
         """
+        :param columns: list of column names to load, None for all columns
+        :param start: first row to load, None to start at the first row
+        :param stop: row at which to stop loading (not included), None to
+                     load until the last row
         :return: pandas.DataFrame
         """
-        ds = Hdf5Datastore()
+        ds = self.datastore
         self.logger.info('Loading journals from %s', ds.get_datastore_path())
-        journals = ds.load_table('journals_table')
+        journals = ds.load_table('journals_table', columns, start, stop)
         self.logger.info('Loading done! Got %s journals', len(journals))
         return journals
 
-    def load_conference_series(self):
+    def load_conference_series(self, columns=None, start=None, stop=None):
         """
+        :param columns: list of column names to load, None for all columns
+        :param start: first row to load, None to start at the first row
+        :param stop: row at which to stop loading (not included), None to
+                     load until the last row
         :return: pandas.DataFrame
         """
-        ds = Hdf5Datastore()
+        ds = self.datastore
         self.logger.info('Loading conference series from %s',
                          ds.get_datastore_path())
-        conf_series = ds.load_table('conference_series_table')
+        conf_series = ds.load_table('conference_series_table', columns,
+                                    start, stop)
         self.logger.info('Loading done! Got %s conference series',
                          len(conf_series))
         return conf_series
 
-    def load_fields_of_study(self):
+    def load_fields_of_study(self, columns=None, start=None, stop=None):
         """
+        :param columns: list of column names to load, None for all columns
+        :param start: first row to load, None to start at the first row
+        :param stop: row at which to stop loading (not included), None to
+                     load until the last row
         :return: pandas.DataFrame
         """
-        ds = Hdf5Datastore()
+        ds = self.datastore
         self.logger.info('Loading fields of study from %s',
                          ds.get_datastore_path())
-        fos = ds.load_table('fields_of_study_table')
+        fos = ds.load_table('fields_of_study_table', columns, start, stop)
         self.logger.info('Loading done! Got %s fields of study',
                          len(fos))
         return fos
 
-    def load_author_stats(self):
+    def load_author_stats(self, columns=None, start=None, stop=None):
         """
+        :param columns: list of column names to load, None for all columns
+        :param start: first row to load, None to start at the first row
+        :param stop: row at which to stop loading (not included), None to
+                     load until the last row
         :return: pandas.DataFrame
         """
-        ds = Hdf5Datastore()
+        ds = self.datastore
         self.logger.info('Loading author statistics from %s',
                          ds.get_datastore_path())
-        author_stats = ds.load_table('author_statistics')
+        author_stats = ds.load_table('author_statistics', columns,
+                                     start, stop)
         self.logger.info('Loading done! Got %s rows', len(author_stats))
         return author_stats
+
+    def load_author_statistic(self, column):
+        """
+        Load one column of author statistics ordered by author index, e.g.
+        author g-index to be aggregated per paper like author h-index (see
+        AuthorshipNetwork.get_max_h_index_per_paper)
+        :param column: name of the column, e.g. 'g_index'
+        :return: numpy.array with value per author
+        """
+        author_stats = self.load_author_stats(['author_index', column])
+        return author_stats.sort('author_index')[column].values
+
+    def load_id_lookup(self, name, id_col, idx_col):
+        """
+        :param name: table name
+        :param id_col: name of the ID column
+        :param idx_col: name of the index column
+        :return: wsdmcup.data.id_lookup.IdLookup
+        """
+        ds = self.datastore
+        self.logger.info('Loading lookup of %s from %s', id_col,
+                         ds.get_id_lookup_path(name))
+        lookup = ds.load_id_lookup(name, id_col, idx_col)
+        self.logger.info('Loading done! Got %s IDs', len(lookup))
+        return lookup
+
+    def load_paper_lookup(self):
+        """
+        :return: wsdmcup.data.id_lookup.IdLookup
+        """
+        return self.load_id_lookup('papers_table', 'paper_id', 'paper_index')
+
+    def load_author_lookup(self):
+        """
+        :return: wsdmcup.data.id_lookup.IdLookup
+        """
+        return self.load_id_lookup('authors_table', 'author_id',
+                                   'author_index')
+
+    def load_affiliation_lookup(self):
+        """
+        :return: wsdmcup.data.id_lookup.IdLookup
+        """
+        return self.load_id_lookup('affiliations_table', 'affiliation_id',
+                                   'affiliation_index')
+
+    def load_journal_lookup(self):
+        """
+        :return: wsdmcup.data.id_lookup.IdLookup
+        """
+        return self.load_id_lookup('journals_table', 'journal_id',
+                                   'journal_index')
+
+    def load_conference_series_lookup(self):
+        """
+        :return: wsdmcup.data.id_lookup.IdLookup
+        """
+        return self.load_id_lookup('conference_series_table',
+                                   'conference_series_id',
+                                   'conference_series_index')
+
+    def load_field_of_study_lookup(self):
+        """
+        :return: wsdmcup.data.id_lookup.IdLookup
+        """
+        return self.load_id_lookup('fields_of_study_table', 'field_id',
+                                   'field_index')
@@ -44,6 +44,16 @@ class AuthorStatistics(tables.IsDescription):
     total_citations = tables.Int32Col()
     references_per_document = tables.Float64Col()
     citations_per_document = tables.Float64Col()
+    g_index = tables.Int32Col()
+    i10_index = tables.Int32Col()
+    e_index = tables.Float64Col()
+    m_quotient = tables.Float64Col()
+
+
+class AuthorHIndexLog(tables.IsDescription):
+    author_index = tables.Int32Col()
+    year = tables.Int16Col()
+    h_index = tables.Int32Col()
 
 
 class Journals(tables.IsDescription):
@@ -63,3 +73,49 @@ class FieldsOfStudy(tables.IsDescription):
     field_index = tables.Int32Col()
     field_id = tables.StringCol(8)
     # field_name = tables.StringCol(256)
+
+
+# variants of the descriptions with MAG IDs packed into uint32 numbers
+# (see wsdmcup.data.id_lookup.hex_to_uint32), used when Config.PACKED_IDS
+# is switched on
+
+
+class PapersPacked(Papers):
+    paper_id = tables.UInt32Col()
+    journal_id = tables.UInt32Col()
+    conference_series_id = tables.UInt32Col()
+
+
+class AuthorsPacked(Authors):
+    author_id = tables.UInt32Col()
+
+
+class AffiliationsPacked(Affiliations):
+    affiliation_id = tables.UInt32Col()
+
+
+class AuthorStatisticsPacked(AuthorStatistics):
+    author_id = tables.UInt32Col()
+
+
+class JournalsPacked(Journals):
+    journal_id = tables.UInt32Col()
+
+
+class ConferenceSeriesPacked(ConferenceSeries):
+    conference_series_id = tables.UInt32Col()
+
+
+class FieldsOfStudyPacked(FieldsOfStudy):
+    field_id = tables.UInt32Col()
+
+
+PACKED_ID_DESCRIPTIONS = {
+    Papers: PapersPacked,
+    Authors: AuthorsPacked,
+    Affiliations: AffiliationsPacked,
+    AuthorStatistics: AuthorStatisticsPacked,
+    Journals: JournalsPacked,
+    ConferenceSeries: ConferenceSeriesPacked,
+    FieldsOfStudy: FieldsOfStudyPacked,
+}
@@ -0,0 +1,108 @@
+"""
+Storage policies (compression and chunk shape) of nodes in HDF5 data store.
+"""
+
+import tables
+
+__author__ = 'damirah'
+__email__ = 'damirah@live.com'
+
+
+class StoragePolicy(object):
+    """
+    How a node (array or table) is laid out in the HDF5 file: compression
+    library, compression level, byte shuffling and chunk shape.
+    """
+
+    def __init__(self, complib=None, complevel=0, shuffle=False,
+                 chunkshape=None):
+        """
+        :param complib: compression library as understood by tables.Filters
+                        (e.g. 'zlib', 'blosc:lz4'), None for no compression
+        :param complevel: compression level 0-9, 0 for no compression
+        :param shuffle: whether to shuffle bytes of the values before
+                        compressing, helps a lot with integer arrays
+        :param chunkshape: tuple with shape of one chunk (number of rows for
+                           tables), None to let pytables decide
+        """
+        self.complib = complib
+        self.complevel = complevel
+        self.shuffle = shuffle
+        self.chunkshape = chunkshape
+
+    def __repr__(self):
+        return ('StoragePolicy(complib=%s, complevel=%s, shuffle=%s, '
+                'chunkshape=%s)' % (self.complib, self.complevel,
+                                    self.shuffle, self.chunkshape))
+
+    def is_compressed(self):
+        """
+        :return: True if nodes stored with this policy are compressed
+        """
+        return bool(self.complib and self.complevel)
+
+    def get_filters(self):
+        """
+        :return: tables.Filters, None for uncompressed nodes
+        """
+        if not self.is_compressed():
+            return None
+        return tables.Filters(complevel=self.complevel, complib=self.complib,
+                              shuffle=self.shuffle)
+
+    def get_chunkshape(self, shape):
+        """
+        Chunk shape for a node of given shape, chunk can not be bigger than
+        the node itself
+        :param shape: shape of the array (or (number of rows,) for tables)
+        :return: tuple, None to let pytables decide
+        """
+        if not self.chunkshape:
+            return None
+        return tuple(max(1, min(chunk, size))
+                     for chunk, size in zip(self.chunkshape, shape))
+
+
+# chunks of 128k values (512 kB of int32), big enough for fast sequential
+# loads of whole arrays, small enough for the compressors to work in cache
+ARRAY_CHUNKSHAPE = (1 << 17,)
+
+UNCOMPRESSED = StoragePolicy()
+# very fast decompression, shuffled index arrays compress well even
+# with the fast codec (most of the high bytes are the same)
+BLOSC_LZ4 = StoragePolicy('blosc:lz4', 5, True, ARRAY_CHUNKSHAPE)
+# smaller files, slower to write but about as fast to read as lz4
+BLOSC_LZ4HC = StoragePolicy('blosc:lz4hc', 9, True, ARRAY_CHUNKSHAPE)
+# the smallest files, but slow to decompress
+ZLIB = StoragePolicy('zlib', 5, True, ARRAY_CHUNKSHAPE)
+
+POLICIES = {
+    'uncompressed': UNCOMPRESSED,
+    'blosc_lz4': BLOSC_LZ4,
+    'blosc_lz4hc': BLOSC_LZ4HC,
+    'zlib': ZLIB,
+}
+
+# default policy for each kind of node, parts of sparse matrices are named
+# after the attributes of scipy.sparse.csr_matrix
+DEFAULT_NODE_POLICIES = {
+    'data': BLOSC_LZ4,
+    # column indices of CSR matrices and row pointers (increasing
+    # sequence) are the biggest nodes in the data store
+    'indices': BLOSC_LZ4,
+    'indptr': BLOSC_LZ4,
+    'shape': UNCOMPRESSED,
+    'array': BLOSC_LZ4,
+    # table chunkshape is left to pytables, it depends on the row size
+    'table': StoragePolicy('blosc:lz4', 5, True),
+}
+
+
+def get_policy(policy):
+    """
+    :param policy: StoragePolicy or name of one of POLICIES
+    :return: StoragePolicy
+    """
+    if isinstance(policy, StoragePolicy):
+        return policy
+    return POLICIES[policy]
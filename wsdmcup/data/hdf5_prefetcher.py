@@ -0,0 +1,91 @@
+"""
+Loading data in background threads, so that reads of the data store overlap
+with building of the models from data which is already loaded.
+"""
+
+import logging
+import threading
+from concurrent import futures
+
+from wsdmcup.config import Config
+from wsdmcup.data.hdf5_manager import Hdf5Manager
+
+__author__ = 'damirah'
+__email__ = 'damirah@live.com'
+
+
+class Hdf5Prefetcher(object):
+    """
+    Runs Hdf5Manager load methods in a thread pool and returns futures of
+    their results. Each thread loads through its own Hdf5Manager with a
+    session open until the prefetcher is closed:
+
+        with Hdf5Prefetcher() as prefetcher:
+            papers = prefetcher.load('load_papers')
+            cit_m = prefetcher.load('load_citation_matrix')
+            citation_network = CitationNetwork(papers.result(),
+                                               cit_m.result())
+
+    Reads of HDF5 files are serialized (see hdf5_datastore.HDF5_LOCK), what
+    runs in parallel are reads of memory-mapped files and everything done
+    with the data after it's read (building matrices and data frames).
+    """
+
+    def __init__(self, workers=Config.PREFETCH_WORKERS):
+        """
+        :param workers: number of threads
+        """
+        self.logger = logging.getLogger(__name__)
+        self.executor = futures.ThreadPoolExecutor(max_workers=workers)
+        self.local = threading.local()
+        self.managers = []
+        self.managers_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _get_manager(self):
+        """
+        :return: Hdf5Manager of the current thread
+        """
+        manager = getattr(self.local, 'manager', None)
+        if manager is None:
+            manager = Hdf5Manager().open('r')
+            self.local.manager = manager
+            with self.managers_lock:
+                self.managers.append(manager)
+        return manager
+
+    def _load(self, method, args, kwargs):
+        """
+        :param method: name of Hdf5Manager method
+        :param args: positional arguments of the method
+        :param kwargs: keyword arguments of the method
+        :return: what the method returns
+        """
+        self.logger.debug('Prefetching %s%s', method, args)
+        return getattr(self._get_manager(), method)(*args, **kwargs)
+
+    def load(self, method, *args, **kwargs):
+        """
+        Start loading data in background
+        :param method: name of Hdf5Manager load method, e.g. 'load_papers'
+        :param args: positional arguments of the method
+        :param kwargs: keyword arguments of the method
+        :return: concurrent.futures.Future with what the method returns
+        """
+        return self.executor.submit(self._load, method, args, kwargs)
+
+    def close(self):
+        """
+        Wait for all loads to finish and close sessions of the threads
+        :return: None
+        """
+        self.executor.shutdown(wait=True)
+        with self.managers_lock:
+            for manager in self.managers:
+                manager.close()
+            self.managers = []
@@ -0,0 +1,436 @@
+"""
+Vectorized mapping of MAG IDs to matrix indices.
+IDs are looked up in blocks (numpy arrays of byte strings) rather than one by
+one in a Python dictionary.
+"""
+
+import os
+import sys
+import json
+
+import numpy
+
+__author__ = 'damirah'
+__email__ = 'damirah@live.com'
+
+# Fibonacci hashing multiplier (2^64 / golden ratio)
+HASH_MULTIPLIER = numpy.uint64(0x9E3779B97F4A7C15)
+
+# marks an empty slot in the hash table
+EMPTY = -1
+
+# MAG IDs are 8 hex digits, so they can be stored as uint32 numbers,
+# 0 stands for an empty (missing) ID
+HEX_DIGITS = b'0123456789ABCDEF'
+MISSING_ID = 0
+
+# value of each hex digit character, 255 for invalid characters
+_HEX_VALUES = numpy.full(256, 255, dtype=numpy.uint8)
+_HEX_VALUES[numpy.frombuffer(HEX_DIGITS, dtype=numpy.uint8)] = \
+    numpy.arange(len(HEX_DIGITS))
+_HEX_SHIFTS = numpy.arange(28, -1, -4, dtype=numpy.uint32)
+
+# file with parameters of a persisted IdLookup, the arrays are stored in
+# .npy files next to it
+LOOKUP_META_FNAME = 'lookup.json'
+
+
+def to_bytes(ids):
+    """
+    Convert array of IDs to array of byte strings. Unicode arrays of ASCII
+    IDs are converted by narrowing the character codes, which is much faster
+    than encoding the strings one by one.
+    :param ids: numpy.array (or list) of str or bytes
+    :return: numpy.array of byte strings
+    """
+    ids = numpy.asarray(ids)
+    if ids.dtype.kind == 'S':
+        return ids
+    if not len(ids):
+        return numpy.zeros(0, dtype='S1')
+    if ids.dtype.kind == 'O':
+        ids = ids.astype(str)
+    if ids.dtype.kind == 'U':
+        width = ids.dtype.itemsize // 4
+        codes = ids.view(numpy.uint32).reshape(len(ids), width)
+        if codes.max() < 128:
+            return codes.astype(numpy.uint8).view('S%d' % width).ravel()
+    return numpy.char.encode(ids, 'utf-8')
+
+
+def pack_ids(ids):
+    """
+    Pack byte strings of at most 8 bytes into unsigned 64-bit integers, so
+    that IDs can be compared and hashed as numbers.
+    :param ids: numpy.array of byte strings
+    :return: numpy.array of numpy.uint64
+    """
+    if ids.dtype.itemsize != 8:
+        padded = numpy.zeros(len(ids), dtype='S8')
+        padded[:] = ids
+        ids = padded
+    return numpy.ascontiguousarray(ids).view(numpy.uint64)
+
+
+def _parse_hex_ids(ids):
+    """
+    :param ids: numpy.array of byte strings
+    :return: tuple (numpy.array of numpy.uint32, numpy.array of bools telling
+             which IDs are valid 8 digit (upper case) hex numbers)
+    """
+    values = numpy.full(len(ids), MISSING_ID, dtype=numpy.uint32)
+    if ids.dtype.itemsize > 8:
+        valid = numpy.char.str_len(ids) == 8
+        ids = ids[valid].astype('S8')
+    else:
+        valid = numpy.ones(len(ids), dtype=bool)
+    codes = numpy.zeros(len(ids), dtype='S8')
+    codes[:] = ids
+    digits = _HEX_VALUES[codes.view(numpy.uint8).reshape(len(ids), 8)]
+    valid_digits = (digits != 255).all(axis=1)
+    numbers = (digits.astype(numpy.uint32) << _HEX_SHIFTS).sum(
+        axis=1, dtype=numpy.uint32)
+    valid[valid] = valid_digits & (numbers != MISSING_ID)
+    values[valid] = numbers[valid_digits & (numbers != MISSING_ID)]
+    return values, valid
+
+
+def hex_to_uint32(ids):
+    """
+    Pack MAG IDs (8 upper case hex digits) into uint32 numbers, empty IDs
+    are packed as MISSING_ID
+    :param ids: numpy.array (or list) of str or bytes
+    :return: numpy.array of numpy.uint32
+    :raises ValueError: when some of the IDs is not a MAG hex ID
+    """
+    ids = to_bytes(ids)
+    if not len(ids):
+        return numpy.zeros(0, dtype=numpy.uint32)
+    values, valid = _parse_hex_ids(ids)
+    invalid = ~valid & (ids != b'')
+    if invalid.any():
+        raise ValueError('Can not pack ID %s, MAG IDs are 8 upper case hex '
+                         'digits' % ids[invalid][0])
+    return values
+
+
+def uint32_to_hex(ids):
+    """
+    Format packed IDs back to MAG hex IDs, inverse of hex_to_uint32
+    :param ids: numpy.array of numpy.uint32
+    :return: numpy.array of byte strings
+    """
+    ids = numpy.asarray(ids, dtype=numpy.uint32)
+    digits = (ids[:, numpy.newaxis] >> _HEX_SHIFTS) & 0xF
+    chars = numpy.frombuffer(HEX_DIGITS, dtype=numpy.uint8)[digits]
+    hex_ids = numpy.ascontiguousarray(chars).view('S8').ravel()
+    hex_ids[ids == MISSING_ID] = b''
+    return hex_ids
+
+
+def pack_hex_ids(ids):
+    """
+    Same as pack_ids(uint32_to_hex(ids)), but the hex digits are spread
+    into the bytes of the packed numbers with bit operations, without
+    building the strings
+    :param ids: numpy.array of IDs packed by hex_to_uint32
+    :return: numpy.array of numpy.uint64
+    """
+    ids = numpy.asarray(ids, dtype=numpy.uint32)
+    packed = ids.astype(numpy.uint64)
+    # move each hex digit (4 bits) into its own byte, the last digit into
+    # the lowest byte
+    for mask, shift in ((0x00000000FFFF0000, 16),
+                        (0x0000FF000000FF00, 8),
+                        (0x00F000F000F000F0, 4)):
+        high = packed & numpy.uint64(mask)
+        packed ^= high
+        packed |= high << numpy.uint64(shift)
+    if sys.byteorder == 'little':
+        # the first digit has to be in the first byte of the string
+        packed = packed.byteswap()
+    # 1 in each byte with a digit greater than 9
+    letters = (packed + numpy.uint64(0x0606060606060606)) >> numpy.uint64(4)
+    letters &= numpy.uint64(0x0101010101010101)
+    packed += numpy.uint64(0x3030303030303030)
+    packed += letters * numpy.uint64(ord('A') - ord('9') - 1)
+    packed[ids == MISSING_ID] = 0
+    return packed
+
+
+class IdLookup(object):
+    """
+    Replacement for {id: index} dictionaries when mapping whole columns of
+    IDs to indices. IDs of up to 8 bytes (all MAG IDs) are packed into
+    uint64 and stored in an open-addressing hash table (linear probing)
+    kept in flat numpy arrays, so one lookup of a block of IDs costs a few
+    vectorized probing rounds. Longer IDs fall back to binary search in
+    a sorted array of keys.
+    Keys can also be IDs packed by hex_to_uint32, then the looked up IDs
+    (byte strings) are packed the same way first.
+    The lookup can be saved to a directory of .npy files and loaded back
+    memory-mapped, so it does not have to be rebuilt by every task.
+    """
+
+    def __init__(self, keys, values):
+        """
+        :param keys: numpy.array of unique IDs (byte strings or numbers
+                     returned by hex_to_uint32)
+        :param values: numpy.array of indices belonging to the IDs
+        """
+        keys = numpy.asarray(keys)
+        self.values = numpy.asarray(values, dtype=numpy.int64)
+        self.numeric = keys.dtype.kind in 'iu'
+        if self.numeric:
+            self.packed = True
+            self._build_hash_table(keys.astype(numpy.uint64))
+            return
+        keys = to_bytes(keys)
+        self.packed = keys.dtype.itemsize <= 8
+        if self.packed:
+            self._build_hash_table(pack_ids(keys))
+        else:
+            order = numpy.argsort(keys, kind='mergesort')
+            self.keys = keys[order]
+            self.values = self.values[order]
+
+    @staticmethod
+    def from_dict(id_map):
+        """
+        :param id_map: dictionary of {id: index}, IDs can be str, bytes or
+                       packed IDs
+        :return: IdLookup
+        """
+        keys = list(id_map.keys())
+        if keys and isinstance(keys[0], (int, numpy.integer)):
+            keys = numpy.array(keys, dtype=numpy.uint32)
+        else:
+            keys = to_bytes(keys)
+        values = numpy.fromiter(id_map.values(), dtype=numpy.int64,
+                                count=len(id_map))
+        return IdLookup(keys, values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, key):
+        # single ID lookup, so that IdLookup can be used in place of
+        # {id: index} dictionary
+        index = self.find(numpy.array([key]))[0]
+        if index == EMPTY:
+            raise KeyError(key)
+        return int(index)
+
+    def __contains__(self, key):
+        return self.find(numpy.array([key]))[0] != EMPTY
+
+    def _get_arrays(self):
+        """
+        :return: dictionary of {name: numpy.array} of the arrays the lookup
+                 consists of
+        """
+        if self.packed:
+            return {'values': self.values, 'table_keys': self.table_keys,
+                    'table_positions': self.table_positions}
+        return {'values': self.values, 'keys': self.keys}
+
+    def save(self, path):
+        """
+        Store the lookup in a directory, each array in its own .npy file
+        :param path: path to the directory (created if it does not exist)
+        :return: None
+        """
+        if not os.path.exists(path):
+            os.makedirs(path)
+        meta_path = os.path.join(path, LOOKUP_META_FNAME)
+        # remove the parameters first, so that half written lookup is never
+        # loaded
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        arrays = self._get_arrays()
+        for name, arr in arrays.items():
+            numpy.save(os.path.join(path, '%s.npy' % name), arr)
+        meta = {'numeric': self.numeric, 'packed': self.packed,
+                'arrays': sorted(arrays)}
+        if self.packed:
+            meta['shift'] = int(self.shift)
+            meta['mask'] = self.mask
+        with open(meta_path, 'w') as meta_file:
+            json.dump(meta, meta_file)
+
+    @staticmethod
+    def exists(path):
+        """
+        :param path: path to the directory with stored lookup
+        :return: True if there is a complete lookup stored in the directory
+        """
+        return os.path.exists(os.path.join(path, LOOKUP_META_FNAME))
+
+    @staticmethod
+    def load(path, mmap_mode='r'):
+        """
+        Load lookup stored by save, the arrays are memory-mapped by default
+        so only the parts of the hash table touched by lookups are read
+        :param path: path to the directory with stored lookup
+        :param mmap_mode: passed to numpy.load, None reads the arrays
+                          into memory
+        :return: IdLookup
+        """
+        with open(os.path.join(path, LOOKUP_META_FNAME)) as meta_file:
+            meta = json.load(meta_file)
+        lookup = IdLookup.__new__(IdLookup)
+        lookup.numeric = meta['numeric']
+        lookup.packed = meta['packed']
+        if lookup.packed:
+            lookup.shift = numpy.uint64(meta['shift'])
+            lookup.mask = meta['mask']
+        for name in meta['arrays']:
+            setattr(lookup, name, numpy.load(
+                os.path.join(path, '%s.npy' % name), mmap_mode=mmap_mode))
+        return lookup
+
+    def _slots(self, packed_ids):
+        return ((packed_ids * HASH_MULTIPLIER) >> self.shift)\
+            .astype(numpy.int64)
+
+    def _build_hash_table(self, packed_keys):
+        """
+        Insert all keys into the hash table. Keys are inserted in rounds,
+        in each round every key not placed yet tries its current slot and
+        moves on to the next slot if it is taken.
+        :param packed_keys: numpy.array of numpy.uint64
+        :return: None
+        """
+        bits = max(int(2 * len(packed_keys) - 1).bit_length(), 4)
+        self.shift = numpy.uint64(64 - bits)
+        self.mask = (1 << bits) - 1
+        self.table_keys = numpy.zeros(1 << bits, dtype=numpy.uint64)
+        self.table_positions = numpy.full(1 << bits, EMPTY, dtype=numpy.int64)
+
+        pending = numpy.arange(len(packed_keys))
+        slots = self._slots(packed_keys)
+        while len(pending):
+            free = self.table_positions[slots] == EMPTY
+            candidates = pending[free]
+            candidate_slots = slots[free]
+            # when more keys compete for one slot, only one of them wins
+            self.table_positions[candidate_slots] = candidates
+            placed = numpy.zeros(len(pending), dtype=bool)
+            placed[free] = \
+                self.table_positions[candidate_slots] == candidates
+            self.table_keys[slots[placed]] = packed_keys[pending[placed]]
+            pending = pending[~placed]
+            slots = (slots[~placed] + 1) & self.mask
+
+    def find(self, ids):
+        """
+        :param ids: numpy.array of IDs (byte strings or IDs packed by
+                    hex_to_uint32)
+        :return: numpy.array with index of each ID, -1 for unknown IDs
+        """
+        ids = numpy.asarray(ids)
+        if self.numeric and ids.dtype.kind not in 'iu':
+            packed_ids, valid = _parse_hex_ids(to_bytes(ids))
+            result = numpy.full(len(ids), EMPTY, dtype=numpy.int64)
+            result[valid] = self.find(packed_ids[valid])
+            return result
+        if not self.numeric and ids.dtype.kind in 'iu':
+            # IDs packed by hex_to_uint32 looked up among byte strings
+            if not self.packed:
+                return self.find(uint32_to_hex(ids))
+            return self._find_packed(pack_hex_ids(ids))
+        if not self.numeric:
+            ids = to_bytes(ids)
+        result = numpy.full(len(ids), EMPTY, dtype=numpy.int64)
+        if not len(ids) or not len(self.values):
+            return result
+        if not self.packed:
+            pos = numpy.searchsorted(self.keys, ids)
+            pos[pos == len(self.keys)] = 0
+            found = self.keys[pos] == ids
+            result[found] = self.values[pos[found]]
+            return result
+        if ids.dtype.itemsize > 8:
+            # IDs longer than 8 bytes cannot be among the keys
+            short = numpy.char.str_len(ids) <= 8
+            result[short] = self.find(ids[short].astype('S8'))
+            return result
+
+        if self.numeric:
+            return self._find_packed(ids.astype(numpy.uint64))
+        return self._find_packed(pack_ids(ids))
+
+    def _find_packed(self, packed_ids):
+        """
+        :param packed_ids: numpy.array of numpy.uint64, IDs packed the same
+                           way as the keys of the hash table
+        :return: numpy.array with index of each ID, -1 for unknown IDs
+        """
+        result = numpy.full(len(packed_ids), EMPTY, dtype=numpy.int64)
+        if not len(packed_ids) or not len(self.values):
+            return result
+        active = numpy.arange(len(packed_ids))
+        slots = self._slots(packed_ids)
+        while len(active):
+            positions = self.table_positions[slots]
+            occupied = positions != EMPTY
+            hit = occupied & (self.table_keys[slots] == packed_ids[active])
+            result[active[hit]] = self.values[positions[hit]]
+            probe_next = occupied & ~hit
+            active = active[probe_next]
+            slots = (slots[probe_next] + 1) & self.mask
+        return result
+
+    def lookup(self, ids):
+        """
+        Same as find, but all IDs have to be known
+        :param ids: numpy.array of IDs (byte strings)
+        :return: numpy.array with index of each ID
+        :raises KeyError: when some of the IDs are not in the lookup
+        """
+        indices = self.find(ids)
+        missing = indices == EMPTY
+        if missing.any():
+            unknown = numpy.unique(numpy.asarray(ids)[missing])
+            raise KeyError('%s unknown IDs, e.g. %s'
+                           % (len(unknown), ', '.join(
+                               str(i) for i in unknown[:5])))
+        return indices
+
+
+class IdEnumerator(object):
+    """
+    Builds {id: index} dictionary on the fly, IDs get consecutive indices in
+    order of their first appearance. Each block of IDs is reduced to its
+    unique values first, so only those are looked up in the dictionary.
+    """
+
+    def __init__(self):
+        self.id_map = {}
+
+    def __len__(self):
+        return len(self.id_map)
+
+    def enumerate(self, ids):
+        """
+        :param ids: numpy.array of IDs (byte strings)
+        :return: numpy.array with index of each ID
+        """
+        ids = to_bytes(ids)
+        if not len(ids):
+            return numpy.zeros(0, dtype=numpy.int64)
+        unique_ids, first, inverse = numpy.unique(
+            ids, return_index=True, return_inverse=True)
+        indices = numpy.empty(len(unique_ids), dtype=numpy.int64)
+        for i in numpy.argsort(first, kind='mergesort'):
+            key = unique_ids[i].decode()
+            if key not in self.id_map:
+                self.id_map[key] = len(self.id_map)
+            indices[i] = self.id_map[key]
+        return indices[inverse.ravel()]
+
+    def get_dict(self):
+        """
+        :return: dictionary of {id: index}
+        """
+        return self.id_map
@@ -0,0 +1,432 @@
+"""
+Data store keeping each node in its own file(s) in a directory, with a JSON
+manifest listing the nodes. Arrays and sparse matrices are .npy files (which
+are memory-mapped when loaded), tables are small HDF5 files.
+
+Nodes are independent, so processes can store different nodes at the same
+time and a crash while storing a node can not damage any other node. Each
+stored node version gets new files, the manifest is switched to them only
+when they are complete (under a lock, so that concurrent writers do not lose
+each other's nodes), then files of the old version are removed.
+"""
+
+import os
+import json
+import uuid
+import fcntl
+import shutil
+import logging
+import contextlib
+
+import numpy
+from scipy import sparse
+
+from wsdmcup.config import Config
+from wsdmcup.data import npy_storage
+from wsdmcup.data.hdf5_datastore import Hdf5Datastore
+from wsdmcup.data.sparse_patterns import is_binary
+
+__author__ = 'damirah'
+__email__ = 'damirah@live.com'
+
+MANIFEST_FNAME = 'manifest.json'
+MANIFEST_LOCK_FNAME = 'manifest.lock'
+
+
+class NpyDatastore(object):
+    """
+    Directory-of-arrays data store with the same interface as
+    wsdmcup.data.hdf5_datastore.Hdf5Datastore (see Config.DATASTORE_BACKEND).
+    """
+
+    def __init__(self, datastore_dirname=Config.NPY_DATASTORE_DIRNAME,
+                 policies=None):
+        """
+        :param datastore_dirname: name of the data store directory
+        :param policies: storage policies of the tables, see Hdf5Datastore
+        """
+        self.datastore_path = Config.get_path_to_hdf5_file(datastore_dirname)
+        self.logger = logging.getLogger(__name__)
+        self.policies = policies
+        if not os.path.exists(self.datastore_path):
+            os.makedirs(self.datastore_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self, mode='a'):
+        """
+        Nodes are separate files which are opened by every load and store,
+        there is no session to open, exists for compatibility with
+        Hdf5Datastore
+        :param mode: ignored
+        :return: self
+        """
+        return self
+
+    def close(self):
+        """
+        :return: None
+        """
+        return
+
+    def get_datastore_path(self):
+        """
+        Get location of the data store directory.
+        :return: absolute path as string
+        """
+        return self.datastore_path
+
+    # MANIFEST ============================================================= #
+
+    def _get_manifest_path(self):
+        """
+        :return: absolute path to the manifest
+        """
+        return os.path.join(self.datastore_path, MANIFEST_FNAME)
+
+    def _read_manifest(self):
+        """
+        :return: dictionary of {node name: dictionary describing the node}
+        """
+        path = self._get_manifest_path()
+        if not os.path.exists(path):
+            return {}
+        with open(path) as fp:
+            return json.load(fp)['nodes']
+
+    @contextlib.contextmanager
+    def _lock_manifest(self):
+        """
+        Exclusive lock of the manifest, held while the manifest is changed
+        :return: None
+        """
+        lock_path = os.path.join(self.datastore_path, MANIFEST_LOCK_FNAME)
+        with open(lock_path, 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _write_manifest(self, nodes):
+        """
+        Replace the manifest, has to be called with the manifest locked
+        :param nodes: dictionary of {node name: dictionary describing the node}
+        :return: None
+        """
+        path = self._get_manifest_path()
+        with open(path + '.tmp', 'w') as fp:
+            json.dump({'nodes': nodes}, fp, indent=2, sort_keys=True)
+        os.rename(path + '.tmp', path)
+
+    def _get_node(self, name, kind):
+        """
+        :param name: node name
+        :param kind: 'array', 'sparse_matrix' or 'table'
+        :return: dictionary describing the node
+        """
+        node = self._read_manifest().get(name)
+        if node is None or node['kind'] != kind:
+            raise KeyError('No %s %s in %s' % (kind, name,
+                                                self.datastore_path))
+        return node
+
+    def _has_node(self, name, kind):
+        """
+        :param name: node name
+        :param kind: 'array', 'sparse_matrix' or 'table'
+        :return: True if the node is stored
+        """
+        node = self._read_manifest().get(name)
+        return node is not None and node['kind'] == kind
+
+    def _get_path(self, node):
+        """
+        :param node: dictionary describing the node
+        :return: absolute path to the file (or directory) of the node
+        """
+        return os.path.join(self.datastore_path, node['path'])
+
+    def _new_path(self, name, ext=''):
+        """
+        :param name: node name
+        :param ext: file extension
+        :return: new path (relative to the data store directory) for files
+                 of the next version of the node
+        """
+        return '%s.%s%s' % (name, uuid.uuid4().hex[:12], ext)
+
+    def _commit_node(self, name, node):
+        """
+        Switch the manifest to new version of the node (or remove the node
+        from the manifest), then remove files of the old version
+        :param name: node name
+        :param node: dictionary describing the node, None to remove the node
+        :return: None
+        """
+        with self._lock_manifest():
+            nodes = self._read_manifest()
+            old = nodes.pop(name, None)
+            if node is not None:
+                nodes[name] = node
+            self._write_manifest(nodes)
+        if old is not None:
+            self._remove_files(name, old)
+
+    def _remove_files(self, name, node):
+        """
+        :param name: node name
+        :param node: dictionary describing the node
+        :return: None
+        """
+        path = self._get_path(node)
+        self.logger.debug('Removing %s', path)
+        if node['kind'] == 'table':
+            # ID lookups built from the table are stored next to it
+            self._get_table_store(node)._remove_id_lookup(name)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+
+    def remove_node(self, name):
+        """
+        :param name: node name
+        :return: None
+        """
+        self._commit_node(name, None)
+
+    # ARRAYS =============================================================== #
+
+    def store_array(self, arr, name):
+        """
+        Store an array in .npy file
+        :param arr: numpy.array
+        :param name: array name
+        :return: None
+        """
+        arr = numpy.asarray(arr)
+        node = {'kind': 'array', 'path': self._new_path(name, '.npy'),
+                'shape': list(arr.shape), 'dtype': arr.dtype.str}
+        npy_storage.save_npy(self._get_path(node), arr)
+        self._commit_node(name, node)
+
+    def load_array(self, name, mmap_mode='c'):
+        """
+        :param name: array name
+        :param mmap_mode: passed to numpy.load, None to read the array into
+                          memory
+        :return: numpy.array
+        """
+        node = self._get_node(name, 'array')
+        return numpy.load(self._get_path(node), mmap_mode=mmap_mode)
+
+    def has_array(self, name):
+        """
+        :param name: array name
+        :return: True if the array is stored
+        """
+        return self._has_node(name, 'array')
+
+    # SPARSE MATRICES ====================================================== #
+
+    def get_csc_name(self, name):
+        """
+        :param name: matrix name
+        :return: name under which CSC copy of the matrix is stored
+        """
+        return '%s_csc' % name
+
+    def store_sparse_matrix(self, matrix, name):
+        """
+        Store CSR matrix as .npy files, with the CSC copy and pattern-only
+        storage of binary matrices as in Hdf5Datastore.store_sparse_matrix
+        :param matrix: scipy.sparse.csr_matrix
+        :param name: matrix name
+        :return: None
+        """
+        msg = "The matrix has to be in CSR format"
+        assert(sparse.isspmatrix_csr(matrix)), msg
+        self.store_sparse_matrix_mmap(matrix, name)
+        csc_name = self.get_csc_name(name)
+        if Config.CSC_SPARSE_MATRICES:
+            self.logger.debug('Storing CSC copy of matrix %s', name)
+            self.store_sparse_matrix_mmap(matrix.tocsc().transpose(),
+                                          csc_name)
+        else:
+            self.remove_sparse_matrix(csc_name)
+
+    def store_sparse_matrix_mmap(self, matrix, name):
+        """
+        Store CSR matrix as .npy files (without the CSC copy), all matrices
+        of this data store are memory-mapped
+        :param matrix: scipy.sparse.csr_matrix
+        :param name: matrix name
+        :return: None
+        """
+        pattern = Config.PATTERN_SPARSE_MATRICES and is_binary(matrix)
+        node = {'kind': 'sparse_matrix', 'path': self._new_path(name),
+                'shape': [int(x) for x in matrix.shape],
+                'nnz': int(matrix.nnz), 'pattern': bool(pattern)}
+        path = self._get_path(node)
+        self.logger.debug('Storing matrix %s in %s', name, path)
+        npy_storage.save_sparse_matrix(path, matrix, pattern)
+        self._commit_node(name, node)
+
+    def get_sparse_matrix_mmap_path(self, name):
+        """
+        :param name: matrix name
+        :return: absolute path to directory with files of the matrix
+        """
+        return self._get_path(self._get_node(name, 'sparse_matrix'))
+
+    def has_sparse_matrix(self, name):
+        """
+        :param name: matrix name
+        :return: True if the matrix is stored
+        """
+        return self._has_node(name, 'sparse_matrix')
+
+    def has_sparse_matrix_mmap(self, name):
+        """
+        :param name: matrix name
+        :return: True if the matrix is stored, all matrices are memory-mapped
+        """
+        return self.has_sparse_matrix(name)
+
+    def remove_sparse_matrix(self, name):
+        """
+        :param name: matrix name
+        :return: None
+        """
+        if self.has_sparse_matrix(name):
+            self.remove_node(name)
+
+    def load_sparse_matrix_mmap(self, name, mmap_mode='c'):
+        """
+        :param name: matrix name
+        :param mmap_mode: see npy_storage.load_sparse_matrix
+        :return: scipy.sparse.csr_matrix
+        """
+        path = self.get_sparse_matrix_mmap_path(name)
+        self.logger.debug('Memory-mapping matrix %s', path)
+        return npy_storage.load_sparse_matrix(path, mmap_mode)
+
+    def load_sparse_matrix(self, name):
+        """
+        :param name: matrix name
+        :return: scipy.sparse.csr_matrix, values of binary matrices are
+                 read-only, see Hdf5Datastore.load_sparse_matrix
+        """
+        return self.load_sparse_matrix_mmap(name)
+
+    def load_sparse_matrix_rows(self, name, start=None, stop=None):
+        """
+        Rows [start, stop) of sparse matrix, see
+        Hdf5Datastore.load_sparse_matrix_rows
+        :param name: matrix name
+        :param start: first row, None for the first row of the matrix
+        :param stop: row at which to stop (not included), None for the number
+                     of rows of the matrix
+        :return: scipy.sparse.csr_matrix
+        """
+        return npy_storage.row_block(self.load_sparse_matrix_mmap(name),
+                                     start, stop)
+
+    def load_sparse_matrix_csc(self, name):
+        """
+        Sparse matrix in CSC format, see Hdf5Datastore.load_sparse_matrix_csc
+        :param name: matrix name
+        :return: scipy.sparse.csc_matrix
+        """
+        csc_name = self.get_csc_name(name)
+        if self.has_sparse_matrix(csc_name):
+            return self.load_sparse_matrix(csc_name).transpose()
+        self.logger.debug('No CSC copy of matrix %s, converting', name)
+        return self.load_sparse_matrix(name).tocsc()
+
+    # TABLES =============================================================== #
+
+    def _get_table_store(self, node):
+        """
+        :param node: dictionary describing the table
+        :return: Hdf5Datastore of the file with the table
+        """
+        return Hdf5Datastore(self._get_path(node), self.policies)
+
+    def _store_table(self, name, store):
+        """
+        Store a new version of table
+        :param name: table name
+        :param store: function which stores the table in given Hdf5Datastore
+                      and returns what the store method should return
+        :return: what store returns
+        """
+        node = {'kind': 'table', 'path': self._new_path(name, '.h5')}
+        self.logger.debug('Storing table %s in %s', name,
+                          self._get_path(node))
+        result = store(self._get_table_store(node))
+        self._commit_node(name, node)
+        return result
+
+    def store_dataframe(self, df, name, description,
+                        chunk_size=Config.CSV_CHUNK_SIZE):
+        """
+        See Hdf5Datastore.store_dataframe
+        """
+        return self._store_table(
+            name, lambda ds: ds.store_dataframe(df, name, description,
+                                                chunk_size))
+
+    def store_table(self, name, description, csv_path, csv_mapping,
+                    chunk_size=Config.CSV_CHUNK_SIZE):
+        """
+        See Hdf5Datastore.store_table
+        """
+        return self._store_table(
+            name, lambda ds: ds.store_table(name, description, csv_path,
+                                            csv_mapping, chunk_size))
+
+    def store_table_with_relations(self, name, description, csv_path,
+                                   csv_mapping, relations, chunk_size):
+        """
+        See Hdf5Datastore.store_table_with_relations
+        """
+        return self._store_table(
+            name, lambda ds: ds.store_table_with_relations(
+                name, description, csv_path, csv_mapping, relations,
+                chunk_size))
+
+    def store_columns(self, name, description, columns):
+        """
+        See Hdf5Datastore.store_columns
+        """
+        return self._store_table(
+            name, lambda ds: ds.store_columns(name, description, columns))
+
+    def load_table(self, name, columns=None, start=None, stop=None):
+        """
+        See Hdf5Datastore.load_table
+        """
+        ds = self._get_table_store(self._get_node(name, 'table'))
+        return ds.load_table(name, columns, start, stop)
+
+    def get_id_lookup_path(self, name):
+        """
+        :param name: table name
+        :return: absolute path to the ID lookup of the table
+        """
+        ds = self._get_table_store(self._get_node(name, 'table'))
+        return ds.get_id_lookup_path(name)
+
+    def load_id_lookup(self, name, id_col, idx_col):
+        """
+        See Hdf5Datastore.load_id_lookup, the lookup belongs to the current
+        version of the table
+        """
+        ds = self._get_table_store(self._get_node(name, 'table'))
+        return ds.load_id_lookup(name, id_col, idx_col)
@@ -0,0 +1,110 @@
+"""
+Arrays and sparse matrices stored as uncompressed .npy files, which can be
+memory-mapped when loading.
+"""
+
+import os
+
+import numpy
+from scipy import sparse
+
+from wsdmcup.data.sparse_patterns import implicit_ones
+
+__author__ = 'damirah'
+__email__ = 'damirah@live.com'
+
+
+def save_npy(fpath, arr):
+    """
+    Store array in .npy file. The array is written to a temporary file which
+    then replaces the old file, so the array might be memory-mapped from the
+    old file while storing.
+    :param fpath: path to the .npy file
+    :param arr: numpy.array
+    :return: None
+    """
+    with open(fpath + '.tmp', 'wb') as fp:
+        numpy.save(fp, arr)
+    os.rename(fpath + '.tmp', fpath)
+
+
+def save_sparse_matrix(path, matrix, pattern=False):
+    """
+    Store CSR matrix as data, indices, indptr and shape .npy files in a
+    directory. Shape is written last, a matrix without it is incomplete.
+    :param path: path to the directory
+    :param matrix: scipy.sparse.csr_matrix
+    :param pattern: True to store only indices, indptr and shape of the
+                    matrix, its values are then all ones when loaded
+    :return: None
+    """
+    if not os.path.exists(path):
+        os.makedirs(path)
+    shape_path = os.path.join(path, 'shape.npy')
+    if os.path.exists(shape_path):
+        os.remove(shape_path)
+    data_path = os.path.join(path, 'data.npy')
+    if pattern:
+        if os.path.exists(data_path):
+            os.remove(data_path)
+    else:
+        # stored as uint32 (the dtype of loaded matrices), so that loading
+        # does not need to convert (copy) anything
+        save_npy(data_path, matrix.data.astype(numpy.uint32, copy=False))
+    save_npy(os.path.join(path, 'indices.npy'), matrix.indices)
+    save_npy(os.path.join(path, 'indptr.npy'), matrix.indptr)
+    save_npy(shape_path, numpy.array(matrix.shape))
+
+
+def load_sparse_matrix(path, mmap_mode='c'):
+    """
+    Load CSR matrix stored by save_sparse_matrix, the arrays are
+    memory-mapped and used by the matrix without copying. Matrices stored
+    without values get implicit ones (see sparse_patterns), which are
+    read-only whatever the mmap_mode.
+    :param path: path to the directory
+    :param mmap_mode: passed to numpy.load, 'c' (copy-on-write) allows
+                      in-place changes of the stored arrays without touching
+                      the files, 'r' makes them read-only
+    :return: scipy.sparse.csr_matrix
+    """
+    indices, indptr = [numpy.load(os.path.join(path, '%s.npy' % par),
+                                  mmap_mode=mmap_mode)
+                       for par in ('indices', 'indptr')]
+    data_path = os.path.join(path, 'data.npy')
+    if os.path.exists(data_path):
+        data = numpy.load(data_path, mmap_mode=mmap_mode)
+    else:
+        data = implicit_ones(len(indices))
+    shape = tuple(numpy.load(os.path.join(path, 'shape.npy')))
+    return sparse.csr_matrix((data, indices, indptr), shape=shape,
+                             copy=False)
+
+
+def has_sparse_matrix(path):
+    """
+    :param path: path to the directory
+    :return: True if complete matrix is stored in the directory
+    """
+    return os.path.exists(os.path.join(path, 'shape.npy'))
+
+
+def row_block(matrix, start, stop):
+    """
+    Rows [start, stop) of CSR matrix, the block shares data and indices with
+    the matrix (only indptr is copied)
+    :param matrix: scipy.sparse.csr_matrix
+    :param start: first row, None for the first row of the matrix
+    :param stop: row at which to stop (not included), None for the number
+                 of rows of the matrix
+    :return: scipy.sparse.csr_matrix with stop - start rows
+    """
+    start, stop, _ = slice(start, stop).indices(matrix.shape[0])
+    stop = max(start, stop)
+    indptr = matrix.indptr[start:stop + 1]
+    data = matrix.data[indptr[0]:indptr[-1]]
+    indices = matrix.indices[indptr[0]:indptr[-1]]
+    # row pointers of the block have to start at 0
+    return sparse.csr_matrix((data, indices, indptr - indptr[0]),
+                             shape=(stop - start, matrix.shape[1]),
+                             dtype=numpy.uint32)
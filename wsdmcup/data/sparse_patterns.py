@@ -0,0 +1,68 @@
+"""
+Pattern-only sparse matrices. Most matrices in the data store are binary
+(incidence) matrices, all their values are ones, so only indices, indptr and
+shape are stored and the values are an implicit array of ones.
+"""
+
+import numpy
+
+__author__ = 'damirah'
+__email__ = 'damirah@live.com'
+
+
+def implicit_ones(size, dtype=numpy.uint32):
+    """
+    Array of ones which takes no memory (all items are views of one value).
+    The array is read-only, data of matrices using it has to be replaced
+    (matrix.data = ...), not changed in place.
+    :param size: number of items
+    :param dtype: numpy dtype
+    :return: read-only numpy.array
+    """
+    return numpy.broadcast_to(numpy.ones(1, dtype=dtype), (size,))
+
+
+def is_binary(matrix):
+    """
+    :param matrix: scipy.sparse matrix
+    :return: True if all stored values of the matrix are ones, i.e. the
+             matrix can be stored without values
+    """
+    return is_pattern(matrix) or bool(numpy.all(matrix.data == 1))
+
+
+def is_pattern(matrix):
+    """
+    Cheap check whether matrix uses implicit ones as its values (was loaded
+    from pattern-only storage), does not look at the values themselves.
+    :param matrix: scipy.sparse matrix
+    :return: True if values of the matrix are implicit ones
+    """
+    data = matrix.data
+    return (data.ndim == 1 and data.strides[0] == 0 and
+            (not data.size or data[0] == 1))
+
+
+def row_degrees(matrix):
+    """
+    Sum of each row of matrix (CSR or CSC). For pattern-only matrices the
+    sums are the numbers of values in each row, counted from indices or
+    indptr without touching the values.
+    :param matrix: scipy.sparse.csr_matrix or scipy.sparse.csc_matrix
+    :return: numpy.array
+    """
+    if not is_pattern(matrix):
+        return numpy.asarray(matrix.sum(axis=1)).ravel()
+    if matrix.format == 'csr':
+        # int64 like the counts from bincount, indptr might be int32
+        return numpy.diff(matrix.indptr).astype(numpy.int64)
+    return numpy.bincount(matrix.indices, minlength=matrix.shape[0])
+
+
+def col_degrees(matrix):
+    """
+    Sum of each column of matrix (CSR or CSC), see row_degrees
+    :param matrix: scipy.sparse.csr_matrix or scipy.sparse.csc_matrix
+    :return: numpy.array
+    """
+    return row_degrees(matrix.transpose())
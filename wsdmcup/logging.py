@@ -5,6 +5,8 @@ Utilities for logging
 import os
 import json
 import math
+import time
+import datetime
 import logging
 import logging.config
 
@@ -33,25 +35,88 @@ def setup_logging(default_path='logging.json', default_level=logging.DEBUG):
     return
 
 
-def get_total(file_path):
+def estimate_total(file_path, sample_size=1024 * 1024):
     """
-    Count number of lines in file, useful when processing very large files
-    (to be able to report on progress)
+    Estimate number of lines in file from the size of the file and the
+    average length of lines at the beginning of the file (reads at most
+    'sample_size' bytes instead of the whole file)
     :param file_path: path to file
-    :return: number of lines in the file
+    :param sample_size: how many bytes to read for the estimate
+    :return: estimated number of lines in the file
     """
-    with open(file_path, 'r') as f:
-        num_lines = sum(1 for line in f)
-    return num_lines
+    file_size = os.stat(file_path).st_size
+    with open(file_path, 'rb') as f:
+        sample = f.read(sample_size)
+    num_lines = sample.count(b'\n')
+    if not num_lines or len(sample) == file_size:
+        return max(num_lines, 1)
+    return int(file_size * num_lines / len(sample))
 
 
-def how_often(total, update_freq=100):
+class FileProgress(object):
     """
-    :param total: how many items in total have to be processed
-    :param update_freq: default is 100, that is -- update every 1%
-    :return: number denoting after how many items should progress be updated
+    Progress of processing a file based on the position (byte offset)
+    of the reader in the file, total size of the file is taken from os.stat,
+    so the file doesn't have to be read twice (as with get_total).
+    Besides the percentage, throughput (MB/s and rows/s) and estimated time
+    of arrival are reported.
     """
-    return math.ceil(total / update_freq)
+
+    def __init__(self, file_path, logger, update_freq=100):
+        """
+        :param file_path: path to the file being processed
+        :param logger: logger to report the progress to
+        :param update_freq: default is 100, that is -- update every 1%
+        """
+        self.logger = logger
+        self.total_bytes = os.stat(file_path).st_size
+        self.step = max(1, math.ceil(self.total_bytes / update_freq))
+        self.next_update = self.step
+        self.position = 0
+        self.rows = 0
+        self.start_time = time.time()
+
+    def update(self, position, rows):
+        """
+        Report that reader got to 'position' in the file after processing
+        'rows' more rows. Meant to be called once per block of rows, progress
+        is logged only when another 1/update_freq of the file was processed.
+        :param position: current byte offset in the file
+        :param rows: number of rows processed since the last update
+        :return: None
+        """
+        self.position = position
+        self.rows += rows
+        if position >= self.next_update:
+            self.logger.debug(self.get_progress())
+            self.next_update = (position // self.step + 1) * self.step
+
+    def finish(self):
+        """
+        Log final statistics
+        :return: None
+        """
+        self.position = self.total_bytes
+        self.logger.debug(self.get_progress())
+
+    def get_progress(self):
+        """
+        :return: string with current progress, e.g.
+                 "Progress: 54.00%, 85.3 MB/s, 1520311 rows/s, ETA 0:01:12"
+        """
+        elapsed = max(time.time() - self.start_time, 1e-6)
+        bytes_per_second = self.position / elapsed
+        if self.total_bytes:
+            progress = self.position / self.total_bytes * 100
+        else:
+            progress = 100.0
+        if bytes_per_second:
+            eta = (self.total_bytes - self.position) / bytes_per_second
+        else:
+            eta = 0
+        return "Progress: %.2f%%, %.1f MB/s, %d rows/s, ETA %s" % (
+            round(progress, 2), bytes_per_second / (1024 * 1024),
+            self.rows / elapsed, datetime.timedelta(seconds=int(eta)))
 
 
 def get_progress(processed, total):
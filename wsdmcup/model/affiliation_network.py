@@ -2,6 +2,11 @@
 import logging
 
 import numpy as np
+from scipy import sparse
+
+from wsdmcup.config import Config
+from wsdmcup.data.sparse_patterns import row_degrees, col_degrees
+from wsdmcup.model.h_index import h_index
 
 
 __author__ = 'damirah'
@@ -10,29 +15,59 @@ __email__ = 'damirah@live.com'
 
 class AffiliationNetwork(object):
 
-    def __init__(self, aff_m, paper_aff_m, cit_net):
+    def __init__(self, aff_m, paper_aff_m, cit_net, paper_aff_m_csc=None):
+        """
+        :param aff_m: scipy.sparse.csr_matrix
+        :param paper_aff_m: scipy.sparse.csr_matrix
+        :param cit_net: wsdmcup.model.CitationNetwork
+        :param paper_aff_m_csc: paper_aff_m in CSC format (e.g. CSC copy
+                                stored in the datastore), None to convert
+                                paper_aff_m when it's first needed
+        """
         self.logger = logging.getLogger(__name__)
         self.aff_m = aff_m
         self.paper_aff_m = paper_aff_m
+        self.paper_aff_m_csc = paper_aff_m_csc
         self.cit_net = cit_net
 
+    def get_paper_aff_m_csc(self):
+        """
+        :return: paper-affiliation matrix in CSC format, the matrix must not
+                 be changed
+        """
+        if self.paper_aff_m_csc is None:
+            self.logger.debug('Converting paper-affiliation matrix to CSC')
+            self.paper_aff_m_csc = self.paper_aff_m.tocsc()
+        return self.paper_aff_m_csc
+
     def get_citations_per_affiliation(self):
         """
         :return: numpy.array
         """
         self.logger.info('Finding sum of citations per affiliation')
         self.logger.debug('Counting citations per paper')
-        cit_per_paper = np.array(self.cit_net.get_total_citations())
-        self.logger.debug('Copying paper-affiliation matrix')
-        aff_cit_m = self.paper_aff_m.tocsc()
+        cit_per_paper = np.asarray(self.cit_net.get_total_citations())
+        paper_aff_m = self.get_paper_aff_m_csc()
         self.logger.debug('Replacing matrix with citation data and summing')
-        aff_cit_m.data = cit_per_paper[aff_cit_m.indices]
+        aff_cit_m = sparse.csc_matrix(
+            (cit_per_paper[paper_aff_m.indices], paper_aff_m.indices,
+             paper_aff_m.indptr), shape=paper_aff_m.shape)
         cit_per_aff = aff_cit_m.sum(axis=0).ravel().tolist()[0]
         self.logger.debug('Least and most cited affiliation: %s, %s',
                           min(cit_per_aff), max(cit_per_aff))
         self.logger.debug('Done counting citations per affiliation, returning')
         return np.array(cit_per_aff)
 
+    def get_affiliation_h_index(self, workers=Config.H_INDEX_WORKERS):
+        """
+        :param workers: number of processes, see wsdmcup.model.h_index
+        :return: numpy.array with h-index of each affiliation (h papers of
+                 the affiliation have at least h citations each)
+        """
+        self.logger.info('Counting affiliation h-index')
+        return h_index(self.get_paper_aff_m_csc(),
+                       self.cit_net.get_total_citations(), workers)
+
     def get_mean_citations_per_affiliation(self):
         """
         :return: numpy.array
@@ -72,8 +107,7 @@ class AffiliationNetwork(object):
         :return:
         """
         self.logger.info('Finding number of affiliations per paper')
-        pap_aff_m = self.paper_aff_m.copy()
-        num_aff = pap_aff_m.sum(axis=1).ravel().tolist()[0]
+        num_aff = row_degrees(self.paper_aff_m)
         self.logger.debug('Least and most affiliations on paper %s, %s',
                           min(num_aff), max(num_aff))
         self.logger.info('Done counting number of aff per paper, returning')
@@ -84,8 +118,9 @@ class AffiliationNetwork(object):
         :return:
         """
         self.logger.info('Finding number of papers per affiliation')
-        pap_aff_m = self.paper_aff_m.copy()
-        num_pub = pap_aff_m.sum(axis=0).ravel().tolist()[0]
+        paper_aff_m = self.paper_aff_m if self.paper_aff_m_csc is None \
+            else self.paper_aff_m_csc
+        num_pub = col_degrees(paper_aff_m)
         self.logger.debug('Least and most papers per affiliation %s, %s',
                           min(num_pub), max(num_pub))
         self.logger.info('Done counting number of papers per aff, returning')
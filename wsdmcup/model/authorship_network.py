@@ -4,54 +4,69 @@ and citation information)
 """
 
 import logging
+import datetime
 
 import numpy as np
+import pandas as pd
+from scipy import sparse
 
-import wsdmcup.logging as wsdmlog
+from wsdmcup.config import Config
+from wsdmcup.data.sparse_patterns import row_degrees, col_degrees
+from wsdmcup.model.h_index import h_index, bibliometric_indices
+from wsdmcup.model.temporal_h_index import temporal_h_index
 
 __author__ = 'damirah'
 __email__ = 'damirah@live.com'
 
 
-def h_index_fast(citations):
-    """
-    :param citations: numpy.array
-    :return:
-    """
-    if not citations.size:
-        return 0
-    num_items = len(citations)
-    counts = np.zeros(shape=num_items + 1, dtype=np.int32)
-    for i in range(0, num_items):
-        counts[min(num_items, citations[i])] += 1
-    total = 0
-    for i in range(num_items, 0, -1):
-        total += counts[i]
-        if total >= i:
-            return i
-    return 0
-
-
 class AuthorshipNetwork(object):
 
-    def __init__(self, authors, auth_net, cit_net):
+    def __init__(self, authors, auth_net, cit_net, auth_net_csc=None):
         """
         :param authors: pandas.DataFrame
         :param auth_net: scipy.sparse.csr_matrix
         :param cit_net: wsdmcup.model.CitationNetwork
+        :param auth_net_csc: the same matrix in CSC format (e.g. CSC copy
+                             stored in the datastore), None to convert
+                             auth_net when it's first needed
         :return:
         """
         self.authors = authors
         self.auth_net = auth_net
+        self.auth_net_csc = auth_net_csc
         self.cit_net = cit_net
         self.logger = logging.getLogger(__name__)
 
+    def get_auth_net_csc(self):
+        """
+        :return: authorship matrix in CSC format, the matrix must not be
+                 changed
+        """
+        if self.auth_net_csc is None:
+            self.logger.debug('Converting authorship matrix to CSC format')
+            self.auth_net_csc = self.auth_net.tocsc()
+        return self.auth_net_csc
+
+    def _get_author_paper_values(self, paper_values):
+        """
+        :param paper_values: numpy.array with a value for each paper
+        :return: scipy.sparse.csc_matrix with the structure of authorship
+                 matrix and value of the paper in each row, the matrix shares
+                 indices with the authorship matrix so it must not be changed
+        """
+        auth_net_csc = self.get_auth_net_csc()
+        return sparse.csc_matrix(
+            (paper_values[auth_net_csc.indices], auth_net_csc.indices,
+             auth_net_csc.indptr), shape=auth_net_csc.shape)
+
     def get_num_docs_per_author(self):
         """
         :return:
         """
         self.logger.info('Counting total documents per author')
-        total_docs = np.array(self.auth_net.sum(axis=0).ravel().tolist()[0])
+        auth_net = self.auth_net if self.auth_net_csc is None \
+            else self.auth_net_csc
+        total_docs = col_degrees(auth_net)
         self.logger.debug('Authors with least and most documents: %s, %s',
                           min(total_docs), max(total_docs))
         self.logger.info('Done counting author documents, returning data')
@@ -64,11 +79,8 @@ class AuthorshipNetwork(object):
         self.logger.info('Counting total references per document')
         ref_per_doc = self.cit_net.get_total_references()
         self.logger.info('Counting total references per author')
-        self.logger.debug('Copying authorship matrix')
-        auth_ref = self.auth_net.tocoo(copy=True).tocsc()
-        self.logger.debug('Updating authorship matrix data')
-        auth_ref.data = ref_per_doc[auth_ref.indices]
-        auth_ref.eliminate_zeros()
+        self.logger.debug('Replacing authorship matrix data')
+        auth_ref = self._get_author_paper_values(ref_per_doc)
         self.logger.debug('Summing references per author')
         total_ref = auth_ref.sum(axis=0).ravel().tolist()[0]
         self.logger.debug('Authors with least and most references: %s, %s',
@@ -89,10 +101,8 @@ class AuthorshipNetwork(object):
         if limit is not None:
             cit_per_doc[cit_per_doc > limit] = 0
         self.logger.info('Counting total citations per author')
-        self.logger.debug('Copying authorship matrix')
-        auth_cit = self.auth_net.tocoo(copy=True).tocsc()
-        auth_cit.data = cit_per_doc[auth_cit.indices]
-        auth_cit.eliminate_zeros()
+        self.logger.debug('Replacing authorship matrix data')
+        auth_cit = self._get_author_paper_values(cit_per_doc)
         self.logger.debug('Summing citations per author')
         total_cit = auth_cit.sum(axis=0).ravel().tolist()[0]
         self.logger.debug('Least and most cited authors: %s, %s',
@@ -123,7 +133,7 @@ class AuthorshipNetwork(object):
         :return: number of authors per paper
         """
         self.logger.info('Counting number of authors per paper')
-        num_authors = self.auth_net.sum(axis=1).ravel().tolist()[0]
+        num_authors = row_degrees(self.auth_net).tolist()
         self.logger.debug('Least and most authors on a paper: %s, %s',
                           min(num_authors), max(num_authors))
         self.logger.info('Done counting, returning data')
@@ -186,29 +196,85 @@ class AuthorshipNetwork(object):
         self.logger.info('Done couting, returning data')
         return mean_citations
 
-    def get_h_index(self):
+    def get_h_index(self, workers=Config.H_INDEX_WORKERS):
         """
+        :param workers: number of processes, see wsdmcup.model.h_index
         :return: numpy.array with h_index value per author
         """
         self.logger.info('Counting author h-index')
-        self.logger.debug('Copying the paper-author matrix as CSC matrix')
-        paper_author_m = self.auth_net.copy().tocsc()
-        paper_author_m.sort_indices()
-        self.logger.debug('Replacing matrix data with paper citation data')
-        cit_per_doc = np.array(self.cit_net.get_total_citations())
-        paper_author_m.data = cit_per_doc[paper_author_m.indices]
-        paper_author_m.eliminate_zeros()
-        self.logger.debug('Iterating over columns and calculating h-index')
-        total = paper_author_m.shape[1]
-        how_often = wsdmlog.how_often(total)
-        author_h_index = np.zeros(total)
-        for i in range(0, paper_author_m.shape[1]):
-            author_citations = paper_author_m.getcol(i).data
-            author_h_index[i] = h_index_fast(author_citations)
-            if i % how_often == 0:
-                self.logger.debug(wsdmlog.get_progress(i, total))
+        cit_per_doc = self.cit_net.get_total_citations()
+        author_h_index = h_index(self.get_auth_net_csc(), cit_per_doc, workers)
+        self.logger.debug('Highest author h-index: %s', author_h_index.max()
+                          if len(author_h_index) else 0)
         return author_h_index
 
+    def get_temporal_h_index(self):
+        """
+        h-index of each author as it was in every year, see
+        wsdmcup.model.temporal_h_index. Citations from or to papers with
+        erroneous (missing or future) years are not counted.
+        :return: wsdmcup.model.temporal_h_index.HIndexLog
+        """
+        self.logger.info('Counting author h-index over years')
+        publish_years = np.array(self.cit_net.get_nodes()['publish_year'])
+        publish_years[self.cit_net.get_erroneous_years()] = 0
+        return temporal_h_index(self.auth_net, self.cit_net.edges,
+                                publish_years.astype(np.int64),
+                                self.get_auth_net_csc())
+
+    def get_bibliometric_indices(self, workers=Config.H_INDEX_WORKERS):
+        """
+        h-index, g-index, i10-index, e-index and m-quotient of each author,
+        all counted in one pass over sorted citations of author papers, see
+        wsdmcup.model.h_index.bibliometric_segments. Years for m-quotient
+        are counted from the first (valid) publish year of author papers
+        to the current year.
+        :param workers: number of processes, see wsdmcup.model.h_index
+        :return: dictionary of {name: numpy.array with value per author}
+        """
+        self.logger.info('Counting author bibliometric indices')
+        cit_per_doc = self.cit_net.get_total_citations()
+        self.logger.debug('Getting publish years of papers')
+        publish_years = np.array(self.cit_net.get_nodes()['publish_year'])
+        publish_years[self.cit_net.get_erroneous_years()] = 0
+        indices = bibliometric_indices(
+            self.get_auth_net_csc(), cit_per_doc,
+            publish_years.astype(np.int64), datetime.date.today().year,
+            workers)
+        self.logger.debug('Highest author h-index and g-index: %s, %s',
+                          indices['h_index'].max(), indices['g_index'].max())
+        return indices
+
+    def get_author_statistics(self, workers=Config.H_INDEX_WORKERS):
+        """
+        Statistics of each author in the layout of author_statistics table
+        (see wsdmcup.data.hdf5_mappings.AuthorStatistics)
+        :param workers: number of processes counting bibliometric indices
+        :return: pandas.DataFrame with a row per author, in order of author
+                 index
+        """
+        self.logger.info('Collecting author statistics')
+        num_authors = self.auth_net.shape[1]
+        total_docs = np.asarray(self.get_num_docs_per_author())
+        total_ref = np.asarray(self.get_total_references_per_author())
+        total_cit = np.asarray(self.get_total_citations_per_author())
+        # authors without documents have no references nor citations
+        docs = np.maximum(total_docs, 1)
+        astats = pd.DataFrame({
+            'author_index': np.arange(num_authors),
+            'total_documents': total_docs,
+            'total_references': total_ref,
+            'total_citations': total_cit,
+            'references_per_document': total_ref / docs,
+            'citations_per_document': total_cit / docs,
+        })
+        if 'author_id' in self.authors.columns:
+            astats['author_id'] = np.asarray(self.authors['author_id'])
+        for name, values in self.get_bibliometric_indices(workers).items():
+            astats[name] = values
+        self.logger.info('Done collecting author statistics, returning data')
+        return astats
+
     def _get_author_h_index_matrix(self, author_h_index):
         """
         :param author_h_index: numpy.array with author h-index values
@@ -11,20 +11,70 @@ import pandas
 from scipy import sparse
 from scipy.sparse import csgraph
 
+from wsdmcup.data.sparse_patterns import row_degrees, col_degrees
+from wsdmcup.model.metric_cache import MetricCache, cached_metric
+from wsdmcup.model.pagerank import pagerank
+
 __author__ = 'damirah'
 __email__ = 'damirah@live.com'
 
 
 class CitationNetwork(object):
+    """
+    Per-paper metrics of the network are cached (see metric_cache), the
+    cache is dropped when nodes or edges are replaced. After changing nodes
+    or edges in place call invalidate_metrics.
+    """
 
-    def __init__(self, nodes, edges):
+    def __init__(self, nodes, edges, edges_csc=None):
         """
         :param edges: scipy.sparse.csr_matrix
+        :param edges_csc: the same matrix in CSC format (e.g. CSC copy stored
+                          in the datastore), None to convert edges when it's
+                          first needed
         :return: None
         """
+        self.logger = logging.getLogger(__name__)
+        self.metric_cache = MetricCache()
         self.nodes = nodes
         self.edges = edges
-        self.logger = logging.getLogger(__name__)
+        self.edges_csc = edges_csc
+
+    @property
+    def nodes(self):
+        return self._nodes
+
+    @nodes.setter
+    def nodes(self, nodes):
+        self._nodes = nodes
+        self.invalidate_metrics()
+
+    @property
+    def edges(self):
+        return self._edges
+
+    @edges.setter
+    def edges(self, edges):
+        # CSC copy of the old edges is not valid anymore
+        self._edges = edges
+        self._edges_csc = None
+        self.invalidate_metrics()
+
+    @property
+    def edges_csc(self):
+        return self._edges_csc
+
+    @edges_csc.setter
+    def edges_csc(self, edges_csc):
+        self._edges_csc = edges_csc
+        self.invalidate_metrics()
+
+    def invalidate_metrics(self):
+        """
+        Drop cached metrics, e.g. after nodes or edges were changed in place
+        :return: None
+        """
+        self.metric_cache.invalidate()
 
     def get_nodes(self):
         return self.nodes
@@ -32,6 +82,16 @@ class CitationNetwork(object):
     def get_edges(self):
         return self.edges
 
+    def get_edges_csc(self):
+        """
+        :return: citation matrix in CSC format, the matrix must not be changed
+        """
+        if self._edges_csc is None:
+            self.logger.debug('Converting citation matrix to CSC format')
+            # the same edges, cached metrics stay valid
+            self._edges_csc = self.edges.tocsc()
+        return self._edges_csc
+
     def _delete_rows_csr(self, mat, indices):
         """
         Return a copy or matrix 'mat' with rows denoted by 'indices' removed.
@@ -47,12 +107,11 @@ class CitationNetwork(object):
         mask[indices] = False
         return mat[mask]
 
-    def _remove_erroneous_years(self, arr):
+    @cached_metric
+    def get_erroneous_years(self):
         """
-        Check which nodes have a missing or future year of publication and
-        remove data of these nodes from 'arr'.
-        :param arr: numpy.array from which to remove data from erroneous years
-        :return: numpy.array 'arr' with erroneous years removed
+        :return: numpy.array of bools, True for nodes with a missing or future
+                 year of publication
         """
         year = datetime.date.today().year
         self.logger.info('Finding erroneous (missing or future) publish years')
@@ -61,23 +120,34 @@ class CitationNetwork(object):
         self.logger.debug('Found %s papers with missing year of publication '
                           'and %s papers with future year of publication',
                           np.sum(missing_year), np.sum(future_year))
+        return missing_year | future_year
+
+    def _remove_erroneous_years(self, arr):
+        """
+        Check which nodes have a missing or future year of publication and
+        remove data of these nodes from 'arr'.
+        :param arr: numpy.array from which to remove data from erroneous years
+        :return: numpy.array 'arr' with erroneous years removed
+        """
+        erroneous_years = self.get_erroneous_years()
         self.logger.debug('Removing data for erroneous years')
-        arr[missing_year] = 0
-        arr[future_year] = 0
+        arr[erroneous_years] = 0
         self.logger.info('Done removing erroneous data from array, returning')
         return arr
 
+    @cached_metric
     def get_total_references(self):
         """
         :return: numpy.array with list of total reference counts per paper
         """
         self.logger.info('Counting total references per paper')
         total_references = self._remove_erroneous_years(
-            np.array(self.edges.sum(axis=1).ravel().tolist()[0]))
+            row_degrees(self.edges))
         self.logger.debug('Least and most references: %s, %s',
                           min(total_references), max(total_references))
         return total_references
 
+    @cached_metric
     def get_total_citations(self, limit=None, mult=None):
         """
         :param mult:
@@ -85,19 +155,16 @@ class CitationNetwork(object):
         :return: list of total citation counts per paper
         """
         year = datetime.date.today().year
-        self.logger.info('Counting total citations per paper until %s', year)
-        total_citations = np.array(
-            self.edges.sum(axis=0).ravel().tolist()[0])
-
-        self.logger.info('Finding erroneous (missing or future) publish years')
-        missing_year = np.array(self.nodes['publish_year'].isnull())
-        future_year = np.array(self.nodes['publish_year'] > year)
-        self.logger.debug('Found %s papers with missing year of publication '
-                          'and %s papers with future year of publication',
-                          np.sum(missing_year), np.sum(future_year))
-        self.logger.debug('Removing citation data for erroneous years')
-        total_citations[missing_year] = 0
-        total_citations[future_year] = 0
+        if limit:
+            # limited copy of the (cached) counts without limit
+            total_citations = np.array(self.get_total_citations())
+        else:
+            self.logger.info('Counting total citations per paper until %s',
+                             year)
+            # counted from indptr of CSC copy when there is one
+            edges = self.edges if self.edges_csc is None else self.edges_csc
+            total_citations = self._remove_erroneous_years(
+                col_degrees(edges))
         self.logger.debug('Most citations received: %s', max(total_citations))
         if limit:
             self.logger.info('Limiting total citations to <= %s', limit)
@@ -118,6 +185,7 @@ class CitationNetwork(object):
         self.logger.info('Done, returning data')
         return total_citations
 
+    @cached_metric
     def get_total_citations_with_time_decay(self):
         """
         :return:
@@ -129,14 +197,14 @@ class CitationNetwork(object):
         publish_years = np.array(self.nodes['publish_year'])
         self.logger.debug('Correcting papers with future publish year')
         publish_years[publish_years > year] = year
-        self.logger.debug('Converting citation matrix to CSC format')
-        # this makes a copy
-        citation_matrix = self.edges.tocsc()
+        edges_csc = self.get_edges_csc()
         self.logger.debug('Finding paper age')
-        citation_matrix.data = publish_years[citation_matrix.indices]
-        citation_matrix.data = year - citation_matrix.data
+        age = year - publish_years[edges_csc.indices]
         self.logger.debug('Applying exponential decay function to paper age')
-        citation_matrix.data = np.exp(-alpha * citation_matrix.data)
+        # new matrix with the same structure, shares indices with edges_csc
+        citation_matrix = sparse.csc_matrix(
+            (np.exp(-alpha * age), edges_csc.indices, edges_csc.indptr),
+            shape=edges_csc.shape)
         self.logger.debug('Summing citations per paper')
         total_citations = np.array(
             citation_matrix.sum(axis=0).ravel().tolist()[0])
@@ -145,19 +213,16 @@ class CitationNetwork(object):
         self.logger.info('Done counting total citations, returning data')
         return total_citations
 
+    @cached_metric
     def get_paper_age(self):
         """
         :return:
         """
         year = datetime.date.today().year
         self.logger.info('Counting paper age in %s', year)
-        self.logger.debug('Finding erroneous (missing or future) publish years')
-        missing_year = np.array(self.nodes['publish_year'].isnull())
-        future_year = np.array(self.nodes['publish_year'] > year)
         self.logger.debug('Fixing erroneous years in DataFrame')
         publish_year = np.array(self.nodes['publish_year'])
-        publish_year[missing_year] = year
-        publish_year[future_year] = year
+        publish_year[self.get_erroneous_years()] = year
         self.logger.debug('Counting paper age')
         age = year - publish_year + 1
         self.logger.debug('Min paper age: %s, max paper age: %s',
@@ -165,6 +230,7 @@ class CitationNetwork(object):
         self.logger.info('Done counting, returning data')
         return age
 
+    @cached_metric
     def get_citation_per_year(self, time_decay=True):
         """
         :param time_decay:
@@ -183,6 +249,17 @@ class CitationNetwork(object):
         self.logger.info('Done counting, returning data')
         return mean_citation
 
+    @cached_metric
+    def get_pagerank(self, start=None):
+        """
+        :param start: numpy.array with scores to start from, e.g. PageRank
+                      stored before the network changed, None to start from
+                      uniform scores (see wsdmcup.model.pagerank)
+        :return: float32 numpy.array with PageRank of each paper
+        """
+        self.logger.info('Counting PageRank of papers')
+        return pagerank(self.edges, self.get_edges_csc(), start)
+
     def get_cc(self):
         """
         :return:
@@ -2,6 +2,11 @@
 import logging
 
 import numpy as np
+from scipy import sparse
+
+from wsdmcup.config import Config
+from wsdmcup.data.sparse_patterns import row_degrees, col_degrees
+from wsdmcup.model.h_index import h_index
 
 
 __author__ = 'damirah'
@@ -10,17 +15,36 @@ __email__ = 'damirah@live.com'
 
 class FoSNetwork(object):
 
-    def __init__(self, citation_network, fos_m):
+    def __init__(self, citation_network, fos_m, fos_m_csc=None):
+        """
+        :param citation_network: instance of wsdmcup.model.CitationNetwork
+        :param fos_m: scipy.sparse.csr_matrix, papers x fields of study
+        :param fos_m_csc: fos_m in CSC format (e.g. CSC copy stored in the
+                          datastore), None to convert fos_m when it's first
+                          needed
+        """
         self.logger = logging.getLogger(__name__)
         self.cit_net = citation_network
         self.fos_m = fos_m
+        self.fos_m_csc = fos_m_csc
+
+    def get_fos_m_csc(self):
+        """
+        :return: paper-field of study matrix in CSC format, the matrix must not
+                 be changed
+        """
+        if self.fos_m_csc is None:
+            self.logger.debug('Converting paper-field of study matrix to CSC')
+            self.fos_m_csc = self.fos_m.tocsc()
+        return self.fos_m_csc
 
     def get_fos_publications(self):
         """
         :return: numpy.array with number of publications per field of study
         """
         self.logger.info('Counting number of papers per field of study')
-        num_pub = self.fos_m.sum(axis=0).ravel().tolist()[0]
+        fos_m = self.fos_m if self.fos_m_csc is None else self.fos_m_csc
+        num_pub = col_degrees(fos_m)
         self.logger.info('Least and most papers per field of study: %s, %s',
                          min(num_pub), max(num_pub))
         return np.array(num_pub)
@@ -30,7 +54,7 @@ class FoSNetwork(object):
         :return: numpy.array with number of publications per field of study
         """
         self.logger.info('Counting number of fields of study per paper')
-        num_fos = self.fos_m.sum(axis=1).ravel().tolist()[0]
+        num_fos = row_degrees(self.fos_m)
         self.logger.info('Least and most fields of study per paper: %s, %s',
                          min(num_fos), max(num_fos))
         return np.array(num_fos)
@@ -55,16 +79,27 @@ class FoSNetwork(object):
         """
         self.logger.info('Counting sum of citations per field of study')
         self.logger.debug('Counting citations per paper')
-        cit_per_paper = np.array(self.cit_net.get_total_citations())
-        self.logger.debug('Copying paper-field of study matrix as CSC matrix')
-        fos_cit_m = self.fos_m.tocsc().copy()
+        cit_per_paper = np.asarray(self.cit_net.get_total_citations())
+        fos_m = self.get_fos_m_csc()
         self.logger.debug('Replacing matrix with citation data and summing')
-        fos_cit_m.data = cit_per_paper[fos_cit_m.indices]
+        fos_cit_m = sparse.csc_matrix(
+            (cit_per_paper[fos_m.indices], fos_m.indices, fos_m.indptr),
+            shape=fos_m.shape)
         fos_cit = fos_cit_m.sum(axis=0).ravel().tolist()[0]
         self.logger.info('Least and most cited fields of study: %s, %s',
                          min(fos_cit), max(fos_cit))
         return fos_cit
 
+    def get_fos_h_index(self, workers=Config.H_INDEX_WORKERS):
+        """
+        :param workers: number of processes, see wsdmcup.model.h_index
+        :return: numpy.array with h-index of each field of study (h papers
+                 of the field have at least h citations each)
+        """
+        self.logger.info('Counting field of study h-index')
+        return h_index(self.get_fos_m_csc(),
+                       self.cit_net.get_total_citations(), workers)
+
     def get_paper_fos_citations(self, subtract=False, mean_per_field=False,
                                 mean_per_paper=False):
         """
@@ -90,16 +125,12 @@ class FoSNetwork(object):
         if subtract:
             self.logger.info('Subtracting paper citations from field citation')
             self.logger.debug('Loading total citations per paper')
-            paper_citations = np.array(self.cit_net.get_total_citations())
-            self.logger.debug('Copying paper-fields matrix as CSC matrix')
-            paper_cit_m = self.fos_m.tocsc().copy()
-            self.logger.debug('Replacing paper-field matrix with paper '
-                              'citation data')
-            paper_cit_m.data = paper_citations[paper_cit_m.indices]
-            self.logger.debug('Converting the matrix to CSR format')
-            paper_cit_m = paper_cit_m.tocsr()
+            paper_citations = np.asarray(self.cit_net.get_total_citations())
+            # citations of the paper for each value in row of the paper,
+            # in the same order as data of fos_cit_m
+            paper_cit = np.repeat(paper_citations, np.diff(fos_cit_m.indptr))
             self.logger.info('Subtracting paper citations from field citations')
-            fos_cit_m.data = fos_cit_m.data - paper_cit_m.data
+            fos_cit_m.data = fos_cit_m.data - paper_cit
             fos_cit_m.data[fos_cit_m.data < 0] = 0
             self.logger.info('After subtracting paper citations min and max is '
                              '%s, %s', fos_cit_m.min(), fos_cit_m.max())
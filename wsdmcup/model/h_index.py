@@ -0,0 +1,303 @@
+"""
+h-index and other bibliometric indices (g-index, i10-index, e-index,
+m-quotient) of groups of papers (authors, venues, affiliations, fields of
+study) computed on column segments of CSC paper-by-group matrices, vectorized
+over all groups at once.
+"""
+
+import logging
+import multiprocessing
+
+import numpy as np
+
+import wsdmcup.logging as wsdmlog
+from wsdmcup.config import Config
+
+__author__ = 'damirah'
+__email__ = 'damirah@live.com'
+
+
+# approximate number of values processed at once by h_index
+H_INDEX_BLOCK_SIZE = 16 * 1024 * 1024
+
+
+def h_index_segments(values, indptr):
+    """
+    h-index of each segment values[indptr[i]:indptr[i + 1]]. Values are
+    floored and clipped to [0, length of their segment] (h-index can not be
+    higher), then sorted in descending order within the segments by a
+    single sort of combined (segment, value) keys. h-index of a segment is
+    the number of its values which are >= their rank in the segment.
+    :param values: numpy.array (e.g. citations of papers of each author)
+    :param indptr: numpy.array with boundaries of the segments, may start
+                   at other value than 0 (e.g. part of indptr of a matrix)
+    :return: numpy.array with h-index of each segment
+    """
+    indptr = np.asarray(indptr, dtype=np.int64)
+    indptr = indptr - indptr[0]
+    num_segments = len(indptr) - 1
+    if not indptr[-1]:
+        return np.zeros(num_segments, dtype=np.int64)
+    lengths = np.diff(indptr)
+    segments = np.repeat(np.arange(num_segments, dtype=np.int64), lengths)
+    values = np.asarray(values)
+    if values.dtype.kind == 'f':
+        values = np.floor(np.nan_to_num(values))
+    capped = np.clip(values, 0, lengths[segments]).astype(np.int64)
+    max_length = int(lengths.max())
+    # sorting the keys keeps the segments in place and sorts values within
+    # each segment in descending order
+    keys = segments * (max_length + 1) + (max_length - capped)
+    keys.sort()
+    capped = max_length - keys % (max_length + 1)
+    ranks = np.arange(1, len(keys) + 1) - np.repeat(indptr[:-1], lengths)
+    return np.bincount(segments[capped >= ranks], minlength=num_segments)
+
+
+def bibliometric_segments(values, indptr, years=None, current_year=None):
+    """
+    h-index, g-index, i10-index, e-index and m-quotient of each segment
+    values[indptr[i]:indptr[i + 1]], all from one sort of the values in
+    descending order within the segments:
+    - h-index: the number of values which are >= their rank
+    - g-index: the number of values for which the sum of the values up to
+      them is >= square of their rank (at most the length of the segment)
+    - i10-index: the number of values >= 10
+    - e-index: square root of the excess of the h highest values over h^2
+    - m-quotient: h-index divided by the number of years since the first
+      year of the segment (including both years), 0 without any year
+    :param values: numpy.array (e.g. citations of papers of each author)
+    :param indptr: numpy.array with boundaries of the segments, may start
+                   at other value than 0
+    :param years: numpy.array with a year for each value (e.g. publish year
+                  of the paper), values <= 0 are missing years, None to skip
+                  m-quotient
+    :param current_year: year up to which the years are counted for
+                         m-quotient, by default the highest year
+    :return: dictionary of {'h_index', 'g_index', 'i10_index', 'e_index',
+             'm_quotient': numpy.array with value of each segment}
+    """
+    indptr = np.asarray(indptr, dtype=np.int64)
+    indptr = indptr - indptr[0]
+    num_segments = len(indptr) - 1
+    lengths = np.diff(indptr)
+    segments = np.repeat(np.arange(num_segments, dtype=np.int64), lengths)
+    values = np.nan_to_num(np.asarray(values))
+    if values.dtype.kind == 'u':
+        values = values.astype(np.int64)
+    max_value = int(values.max()) if len(values) else 0
+    min_value = int(values.min()) if len(values) else 0
+    if values.dtype.kind == 'i' and min_value >= 0 and \
+            num_segments * (max_value + 1) < 2 ** 62:
+        # the same as the lexsort, but one sort of numbers is much faster
+        keys = segments * (max_value + 1) + (max_value - values)
+        keys.sort()
+        values = max_value - keys % (max_value + 1)
+        del keys
+    else:
+        values = values[np.lexsort((-values, segments))]
+    ranks = np.arange(1, len(values) + 1) - np.repeat(indptr[:-1], lengths)
+
+    h_index = np.bincount(segments[values >= ranks], minlength=num_segments)
+    sums = np.concatenate(([0], np.cumsum(values)))
+    # sums of the values in the segments up to each value
+    sums = sums[1:] - np.repeat(sums[indptr[:-1]], lengths)
+    g_index = np.bincount(segments[sums >= ranks ** 2],
+                          minlength=num_segments)
+    i10_index = np.bincount(segments[values >= 10], minlength=num_segments)
+    h_core = ranks <= h_index[segments]
+    h_core_sum = np.bincount(segments[h_core], weights=values[h_core],
+                             minlength=num_segments)
+    e_index = np.sqrt(np.maximum(h_core_sum - h_index ** 2, 0))
+    indices = {'h_index': h_index, 'g_index': g_index,
+               'i10_index': i10_index, 'e_index': e_index}
+    if years is not None:
+        indices['m_quotient'] = _m_quotient(h_index, years, indptr,
+                                            current_year)
+    return indices
+
+
+def _m_quotient(h_index, years, indptr, current_year):
+    """
+    :param h_index: numpy.array with h-index of each segment
+    :param years: numpy.array with a year for each value, <= 0 for missing
+    :param indptr: numpy.array with boundaries of the segments, starting at 0
+    :param current_year: year up to which years are counted, None for the
+                         highest year
+    :return: numpy.array with m-quotient of each segment
+    """
+    years = np.asarray(years, dtype=np.int64)
+    present = years > 0
+    if current_year is None:
+        current_year = int(years.max()) if present.any() else 0
+    # missing years never are the first year
+    years = np.where(present, years, np.iinfo(np.int64).max)
+    first_year = np.full(len(h_index), np.iinfo(np.int64).max,
+                         dtype=np.int64)
+    non_empty = np.flatnonzero(np.diff(indptr))
+    if len(non_empty):
+        first_year[non_empty] = np.minimum.reduceat(years,
+                                                    indptr[non_empty])
+    m_quotient = np.zeros(len(h_index))
+    has_year = first_year <= current_year
+    m_quotient[has_year] = h_index[has_year] / (
+        current_year - first_year[has_year] + 1)
+    return m_quotient
+
+
+def _h_index_task(task):
+    """
+    :param task: tuple (values, indptr) of a block of columns
+    :return: numpy.array with h-index of each column of the block
+    """
+    return h_index_segments(*task)
+
+
+def _bibliometric_task(task):
+    """
+    :param task: tuple (values, years, indptr, current year) of a block of
+                 columns
+    :return: dictionary of {name: numpy.array} of the block
+    """
+    values, years, indptr, current_year = task
+    return bibliometric_segments(values, indptr, years, current_year)
+
+
+def get_column_blocks(indptr, block_size):
+    """
+    Split columns into blocks of consecutive columns with about
+    'block_size' values each (a column is never split)
+    :param indptr: indptr of CSC matrix
+    :param block_size: number of values per block
+    :return: list of (first column, column after the last one)
+    """
+    num_cols = len(indptr) - 1
+    nnz = int(indptr[-1])
+    bounds = np.searchsorted(indptr, np.arange(block_size, nnz, block_size),
+                             side='right') - 1
+    bounds = np.unique(np.concatenate(([0], bounds, [num_cols])))
+    return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+
+def _map_column_blocks(csc, get_task, task_func, workers, block_size):
+    """
+    Run task_func on blocks of columns of the matrix, in a pool of
+    processes when there are more workers
+    :param csc: scipy.sparse.csc_matrix
+    :param get_task: function making task of block (start, end) of columns
+    :param task_func: module level function processing a task
+    :param workers: number of processes
+    :param block_size: number of values per block
+    :return: list of results of the blocks, in order of the columns
+    """
+    logger = logging.getLogger(__name__)
+    blocks = get_column_blocks(csc.indptr, block_size)
+    logger.debug('Processing %s columns in %s blocks', csc.shape[1],
+                 len(blocks))
+    results = []
+    if workers <= 1:
+        for block in blocks:
+            results.append(task_func(get_task(*block)))
+            logger.debug(wsdmlog.get_progress(block[1], csc.shape[1]))
+        return results
+    pool = multiprocessing.Pool(workers)
+    try:
+        # a few blocks per worker at once, so that values of all blocks
+        # are never copied at the same time
+        for i in range(0, len(blocks), 2 * workers):
+            wave = blocks[i:i + 2 * workers]
+            results.extend(pool.map(task_func,
+                                    [get_task(*block) for block in wave]))
+            logger.debug(wsdmlog.get_progress(wave[-1][1], csc.shape[1]))
+    finally:
+        pool.terminate()
+    return results
+
+
+def _get_column_values(csc, values, start, end):
+    """
+    :param csc: scipy.sparse.csc_matrix
+    :param values: numpy.array with a value for each row, None for values
+                   of the matrix
+    :param start: first column
+    :param end: column after the last one
+    :return: numpy.array with values of columns [start, end)
+    """
+    first, last = csc.indptr[start], csc.indptr[end]
+    if values is None:
+        return csc.data[first:last]
+    return values[csc.indices[first:last]]
+
+
+def h_index(matrix, values=None, workers=Config.H_INDEX_WORKERS,
+            block_size=H_INDEX_BLOCK_SIZE):
+    """
+    h-index of each group (column) of paper-by-group matrix, e.g. of each
+    author of authorship matrix: the highest h such that h papers of the
+    group have value (citations) at least h each.
+    Columns are processed in blocks of about 'block_size' values, with more
+    workers the blocks are split across a pool of processes.
+    :param matrix: scipy.sparse matrix, rows are papers and columns groups,
+                   CSC matrix (e.g. CSC copy from the datastore) is used as
+                   it is, other formats are converted
+    :param values: numpy.array with a value for each paper (e.g. total
+                   citations), None to use values of the matrix
+    :param workers: number of processes
+    :param block_size: number of values per block
+    :return: numpy.array with h-index of each column
+    """
+    logger = logging.getLogger(__name__)
+    csc = matrix if matrix.format == 'csc' else matrix.tocsc()
+    logger.info('Counting h-index of %s columns', csc.shape[1])
+
+    def get_task(start, end):
+        return (_get_column_values(csc, values, start, end),
+                csc.indptr[start:end + 1])
+
+    results = _map_column_blocks(csc, get_task, _h_index_task, workers,
+                                 block_size)
+    if not results:
+        return np.zeros(csc.shape[1], dtype=np.int64)
+    return np.concatenate(results)
+
+
+def bibliometric_indices(matrix, values=None, years=None, current_year=None,
+                         workers=Config.H_INDEX_WORKERS,
+                         block_size=H_INDEX_BLOCK_SIZE):
+    """
+    h-index, g-index, i10-index, e-index and m-quotient of each group
+    (column) of paper-by-group matrix, see bibliometric_segments and h_index
+    :param matrix: scipy.sparse matrix, rows are papers and columns groups
+    :param values: numpy.array with a value for each paper (e.g. total
+                   citations), None to use values of the matrix
+    :param years: numpy.array with publish year of each paper (<= 0 for
+                  missing years), None to skip m-quotient
+    :param current_year: year up to which the years are counted for
+                         m-quotient, None for the highest year
+    :param workers: number of processes
+    :param block_size: number of values per block
+    :return: dictionary of {name: numpy.array with value of each column}
+    """
+    logger = logging.getLogger(__name__)
+    csc = matrix if matrix.format == 'csc' else matrix.tocsc()
+    logger.info('Counting bibliometric indices of %s columns', csc.shape[1])
+    if years is not None and current_year is None and len(years):
+        current_year = int(np.max(years))
+
+    def get_task(start, end):
+        block_years = None if years is None else \
+            _get_column_values(csc, years, start, end)
+        return (_get_column_values(csc, values, start, end), block_years,
+                csc.indptr[start:end + 1], current_year)
+
+    results = _map_column_blocks(csc, get_task, _bibliometric_task, workers,
+                                 block_size)
+    if not results:
+        results = [bibliometric_segments(np.zeros(0, dtype=np.int64),
+                                         np.zeros(csc.shape[1] + 1,
+                                                  dtype=np.int64),
+                                         None if years is None
+                                         else np.zeros(0, dtype=np.int64),
+                                         current_year)]
+    return {name: np.concatenate([result[name] for result in results])
+            for name in results[0]}
@@ -0,0 +1,110 @@
+"""
+Memoization of metrics computed by the network classes, so that metrics used
+by several features (e.g. total citations per paper) are computed only once.
+"""
+
+import inspect
+import logging
+import functools
+from collections import Counter
+
+import numpy as np
+
+__author__ = 'damirah'
+__email__ = 'damirah@live.com'
+
+
+class MetricCache(object):
+    """
+    Results of metric methods keyed by (method name, arguments). Cached
+    arrays are made read-only, as they are returned to every caller.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.values = {}
+        self.hits = Counter()
+        self.misses = Counter()
+
+    def get(self, key, compute):
+        """
+        :param key: tuple (method name, (argument name, value), ...)
+        :param compute: function computing the value when it's not cached
+        :return: cached or computed value
+        """
+        if key in self.values:
+            self.hits[key] += 1
+            self.logger.debug('Using cached %s', self.format_key(key))
+            return self.values[key]
+        self.misses[key] += 1
+        value = compute()
+        if isinstance(value, np.ndarray):
+            value.setflags(write=False)
+        self.values[key] = value
+        return value
+
+    def invalidate(self):
+        """
+        Drop all cached values (hit and miss counts are kept)
+        :return: None
+        """
+        if self.values:
+            self.logger.debug('Dropping %s cached metrics', len(self.values))
+        self.values = {}
+
+    def get_stats(self):
+        """
+        :return: dictionary of {key: (hits, misses)}
+        """
+        return {key: (self.hits[key], self.misses[key])
+                for key in set(self.hits) | set(self.misses)}
+
+    def log_stats(self):
+        """
+        Log number of hits and misses of each metric
+        :return: None
+        """
+        stats = self.get_stats()
+        self.logger.info('Metric cache: %s hits, %s misses',
+                         sum(self.hits.values()), sum(self.misses.values()))
+        for key in sorted(stats, key=self.format_key):
+            self.logger.info('%s: %s hits, %s misses', self.format_key(key),
+                             *stats[key])
+
+    @staticmethod
+    def format_key(key):
+        """
+        :param key: tuple (method name, (argument name, value), ...)
+        :return: e.g. 'get_total_citations(limit=None, mult=None)'
+        """
+        return '%s(%s)' % (key[0], ', '.join('%s=%s' % arg
+                                             for arg in key[1:]))
+
+
+def cached_metric(method):
+    """
+    Decorator of metric methods of classes with 'metric_cache' attribute
+    (MetricCache). The result is cached by name of the method and values of
+    its arguments, with defaults filled in, so get_total_citations() and
+    get_total_citations(limit=None) share one value. Arrays are returned
+    read-only, numpy.array(...) makes a copy which can be changed.
+    :param method: method returning the metric
+    :return: decorated method
+    """
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        arguments = signature.bind(self, *args, **kwargs)
+        arguments.apply_defaults()
+        key = (method.__name__,) + tuple(
+            (name, value) for name, value in arguments.arguments.items()
+            if name != 'self')
+        try:
+            hash(key)
+        except TypeError:
+            # e.g. array arguments, computed every time
+            return method(self, *args, **kwargs)
+        return self.metric_cache.get(
+            key, lambda: method(self, *args, **kwargs))
+    return wrapper
@@ -0,0 +1,125 @@
+"""
+PageRank of papers in the citation network computed by power iteration on
+float32 vectors, with the transposed and normalized citation matrix in CSR
+format, so that each iteration is one sparse matrix-vector product.
+"""
+
+import time
+import logging
+
+import numpy as np
+from scipy import sparse
+
+from wsdmcup.config import Config
+from wsdmcup.data.sparse_patterns import row_degrees, is_pattern
+
+__author__ = 'damirah'
+__email__ = 'damirah@live.com'
+
+
+def get_transition_matrix(edges, edges_csc=None):
+    """
+    Transposed citation matrix with values of each citing paper divided by
+    its number of references: row j holds 1 / references(i) for each paper
+    i citing paper j. The matrix shares indices and indptr with the CSC
+    matrix, only the float32 values are new.
+    :param edges: scipy.sparse.csr_matrix, rows cite columns
+    :param edges_csc: the same matrix in CSC format, None to convert edges
+    :return: tuple (scipy.sparse.csr_matrix, numpy.array with indexes of
+             dangling papers, i.e. papers without references)
+    """
+    num_papers = edges.shape[0]
+    out_degrees = row_degrees(edges)
+    weights = np.zeros(num_papers, dtype=np.float32)
+    citing = out_degrees > 0
+    weights[citing] = 1.0 / out_degrees[citing]
+    edges_csc = edges.tocsc() if edges_csc is None else edges_csc
+    data = weights[edges_csc.indices]
+    if not is_pattern(edges_csc):
+        data *= edges_csc.data
+    transition = sparse.csr_matrix(
+        (data, edges_csc.indices, edges_csc.indptr),
+        shape=(edges_csc.shape[1], edges_csc.shape[0]))
+    return transition, np.flatnonzero(~citing)
+
+
+def get_start_vector(num_papers, start=None):
+    """
+    :param num_papers: number of papers
+    :param start: numpy.array with previous scores (e.g. stored PageRank),
+                  None to start from uniform scores
+    :return: float32 numpy.array with scores summing to 1
+    """
+    logger = logging.getLogger(__name__)
+    if start is not None:
+        if len(start) == num_papers:
+            scores = np.array(start, dtype=np.float32)
+            total = scores.sum(dtype=np.float64)
+            if total > 0 and np.all(scores >= 0):
+                scores /= np.float32(total)
+                logger.info('Warm start from given scores')
+                return scores
+        logger.warning('Scores to start from do not fit the network (%s '
+                       'scores of %s papers), starting from uniform scores',
+                       len(start), num_papers)
+    return np.full(num_papers, 1.0 / max(num_papers, 1), dtype=np.float32)
+
+
+def pagerank(edges, edges_csc=None, start=None,
+             damping=Config.PAGERANK_DAMPING,
+             tolerance=Config.PAGERANK_TOLERANCE,
+             max_iterations=Config.PAGERANK_MAX_ITERATIONS):
+    """
+    PageRank of each paper: a paper passes share 'damping' of its score
+    evenly to papers it cites, the rest of the scores (including all scores
+    of dangling papers, which cite nothing) is spread evenly over all
+    papers. Iterates until L1 norm of the change of the scores drops below
+    'tolerance'.
+    :param edges: scipy.sparse.csr_matrix, citation matrix (rows cite
+                  columns)
+    :param edges_csc: the same matrix in CSC format, None to convert edges
+    :param start: numpy.array with scores to start from (warm start), None
+                  to start from uniform scores
+    :param damping: probability of following a citation
+    :param tolerance: L1 residual at which the iteration stops
+    :param max_iterations: maximum number of iterations
+    :return: float32 numpy.array with score of each paper, scores sum to 1
+    """
+    logger = logging.getLogger(__name__)
+    num_papers = edges.shape[0]
+    logger.info('Building transition matrix of %s papers and %s citations',
+                num_papers, edges.nnz)
+    transition, dangling = get_transition_matrix(edges, edges_csc)
+    logger.debug('Found %s dangling papers', len(dangling))
+    scores = get_start_vector(num_papers, start)
+    if not num_papers:
+        return scores
+    teleport = (1.0 - damping) / num_papers
+
+    logger.info('Running PageRank, damping %s, tolerance %s', damping,
+                tolerance)
+    for iteration in range(1, max_iterations + 1):
+        started = time.time()
+        dangling_score = scores[dangling].sum(dtype=np.float64)
+        new_scores = transition.dot(scores)
+        new_scores *= np.float32(damping)
+        new_scores += np.float32(
+            teleport + damping * dangling_score / num_papers)
+        # sums over many citations of a paper are rounded to float32, the
+        # scores are scaled back to sum 1 so that the error does not build
+        # up over iterations
+        new_scores /= np.float32(new_scores.sum(dtype=np.float64))
+        # residual computed in place of the old scores
+        scores -= new_scores
+        np.abs(scores, out=scores)
+        residual = scores.sum(dtype=np.float64)
+        scores = new_scores
+        logger.info('PageRank iteration %s: residual %.3e, %.2f s',
+                    iteration, residual, time.time() - started)
+        if residual < tolerance:
+            logger.info('PageRank converged after %s iterations', iteration)
+            break
+    else:
+        logger.warning('PageRank did not converge in %s iterations, last '
+                       'residual %.3e', max_iterations, residual)
+    return scores
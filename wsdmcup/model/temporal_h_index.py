@@ -0,0 +1,199 @@
+"""
+h-index of groups of papers (e.g. authors) as it was in every year, counted
+incrementally by walking the citations in order of the year in which they
+were made, and a log of its changes in which the h-index of a group in any
+year is looked up by binary search.
+"""
+
+import logging
+
+import numpy as np
+import pandas
+
+from wsdmcup.model.h_index import h_index_segments
+
+__author__ = 'damirah'
+__email__ = 'damirah@live.com'
+
+
+# years are below this number, (group, year) pairs are combined into single
+# keys group * LOG_KEY_YEARS + year
+LOG_KEY_YEARS = 10000
+
+
+class HIndexLog(object):
+    """
+    Changes of h-index of groups over years, rows (group, year, h-index)
+    sorted by group and year. h-index of a group in a year is the value of
+    its last change up to the year, 0 before the first change.
+    """
+
+    def __init__(self, groups, years, values, num_groups=None):
+        """
+        :param groups: numpy.array with index of group of each change
+        :param years: numpy.array with year of each change
+        :param values: numpy.array with h-index after each change
+        :param num_groups: number of groups, None for the highest group
+                           in the log + 1
+        """
+        self.groups = np.asarray(groups, dtype=np.int64)
+        self.years = np.asarray(years, dtype=np.int64)
+        self.values = np.asarray(values, dtype=np.int64)
+        self.keys = self.groups * LOG_KEY_YEARS + self.years
+        if len(self.keys) and np.any(np.diff(self.keys) <= 0):
+            raise ValueError('Changes must be sorted by group and year')
+        if num_groups is None:
+            num_groups = int(self.groups.max()) + 1 if len(groups) else 0
+        self.num_groups = num_groups
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lookup(self, groups, year):
+        """
+        :param groups: index of a group or numpy.array of indexes
+        :param year: year as of which to look up the h-index
+        :return: h-index of the group(s) in the year (including citations
+                 made in the year)
+        """
+        groups = np.asarray(groups, dtype=np.int64)
+        if not len(self.keys):
+            return np.zeros_like(groups)
+        positions = np.searchsorted(self.keys, groups * LOG_KEY_YEARS + year,
+                                    side='right') - 1
+        # the last change up to the year may belong to the previous group
+        last = np.maximum(positions, 0)
+        found = (positions >= 0) & (self.groups[last] == groups)
+        return np.where(found, self.values[last], 0)
+
+    def get_h_index(self, year):
+        """
+        :param year: year as of which to get the h-index
+        :return: numpy.array with h-index of each group in the year
+        """
+        return self.lookup(np.arange(self.num_groups), year)
+
+    def to_dataframe(self, group_col='author_index'):
+        """
+        :param group_col: name of the column with group indexes
+        :return: pandas.DataFrame with columns group_col, 'year', 'h_index'
+        """
+        return pandas.DataFrame({group_col: self.groups, 'year': self.years,
+                                 'h_index': self.values},
+                                columns=[group_col, 'year', 'h_index'])
+
+
+def _gather_segments(indptr, indices, selected):
+    """
+    :param indptr: indptr of CSR/CSC matrix
+    :param indices: indices of the matrix
+    :param selected: numpy.array with rows/columns to gather
+    :return: tuple (indices of the selected rows/columns one after another,
+             indptr of the gathered segments)
+    """
+    starts = indptr[selected]
+    lengths = indptr[selected + 1] - starts
+    seg_indptr = np.zeros(len(selected) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=seg_indptr[1:])
+    positions = np.arange(seg_indptr[-1]) + np.repeat(
+        starts - seg_indptr[:-1], lengths)
+    return indices[positions], seg_indptr
+
+
+def _citation_events(edges, years):
+    """
+    Count citations of each paper made in each year. A citation counts from
+    the later of the years of the citing and the cited paper (a paper is not
+    counted before it's published), citations from or to papers without a
+    year are skipped.
+    :param edges: scipy.sparse.csr_matrix, rows cite columns
+    :param years: numpy.array with publish year of each paper, <= 0 for
+                  missing years
+    :return: tuple of numpy.arrays (year, cited paper, number of citations)
+             sorted by year and paper
+    """
+    num_papers = edges.shape[1]
+    citing_years = np.repeat(years, np.diff(edges.indptr))
+    cited_years = years[edges.indices]
+    valid = (citing_years > 0) & (cited_years > 0)
+    event_years = np.maximum(citing_years[valid], cited_years[valid])
+    del citing_years, cited_years
+    keys = event_years.astype(np.int64) * num_papers + edges.indices[valid]
+    del event_years
+    keys.sort()
+    if not len(keys):
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    counts = np.diff(np.append(starts, len(keys)))
+    keys = keys[starts]
+    return keys // num_papers, keys % num_papers, counts
+
+
+def temporal_h_index(matrix, edges, years, matrix_csc=None):
+    """
+    h-index of each group (column) of paper-by-group matrix in every year,
+    counted from citations made up to the year. Citations are added year by
+    year, h-index can only grow and only when a paper of the group gets over
+    the current h-index, only such groups are recounted (from their
+    citations so far) in each year.
+    :param matrix: scipy.sparse.csr_matrix, rows are papers and columns
+                   groups (e.g. authorship matrix)
+    :param edges: scipy.sparse.csr_matrix, citation matrix (rows cite
+                  columns)
+    :param years: numpy.array with publish year of each paper, <= 0 for
+                  missing (or erroneous) years
+    :param matrix_csc: the same matrix in CSC format, None to convert it
+    :return: HIndexLog
+    """
+    logger = logging.getLogger(__name__)
+    matrix = matrix.tocsr()
+    matrix_csc = matrix.tocsc() if matrix_csc is None else matrix_csc
+    edges = edges.tocsr()
+    years = np.asarray(years, dtype=np.int64)
+    logger.info('Ordering citations by year')
+    event_years, event_papers, event_counts = _citation_events(edges, years)
+    year_list, year_starts = np.unique(event_years, return_index=True)
+    year_ends = np.append(year_starts[1:], len(event_years))
+
+    num_groups = matrix.shape[1]
+    citations = np.zeros(edges.shape[1], dtype=np.int64)
+    h_index = np.zeros(num_groups, dtype=np.int64)
+    log_groups, log_years, log_values = [], [], []
+    logger.info('Counting h-index of %s columns in %s years', num_groups,
+                len(year_list))
+    for year, start, end in zip(year_list, year_starts, year_ends):
+        papers = event_papers[start:end]
+        old_citations = citations[papers]
+        citations[papers] += event_counts[start:end]
+        groups, pair_indptr = _gather_segments(matrix.indptr,
+                                               matrix.indices, papers)
+        lengths = np.diff(pair_indptr)
+        group_h = h_index[groups]
+        # h-index grows only when a paper gets from <= h to > h citations
+        crossed = (np.repeat(citations[papers], lengths) > group_h) & \
+            (np.repeat(old_citations, lengths) <= group_h)
+        groups = np.unique(groups[crossed])
+        if not len(groups):
+            continue
+        rows, seg_indptr = _gather_segments(matrix_csc.indptr,
+                                            matrix_csc.indices, groups)
+        new_h = h_index_segments(citations[rows], seg_indptr)
+        changed = new_h > h_index[groups]
+        h_index[groups[changed]] = new_h[changed]
+        log_groups.append(groups[changed])
+        log_years.append(np.full(np.count_nonzero(changed), year,
+                                 dtype=np.int64))
+        log_values.append(new_h[changed])
+        logger.debug('%s: h-index of %s columns changed', year,
+                     np.count_nonzero(changed))
+
+    if not log_groups:
+        return HIndexLog([], [], [], num_groups)
+    groups = np.concatenate(log_groups)
+    # changes are added in order of years, stable sort keeps it per group
+    order = np.argsort(groups, kind='mergesort')
+    log = HIndexLog(groups[order], np.concatenate(log_years)[order],
+                    np.concatenate(log_values)[order], num_groups)
+    logger.info('Done counting, got %s changes of h-index', len(log))
+    return log
@@ -2,6 +2,11 @@
 import logging
 
 import numpy as np
+from scipy import sparse
+
+from wsdmcup.config import Config
+from wsdmcup.data.sparse_patterns import col_degrees
+from wsdmcup.model.h_index import h_index
 
 
 __author__ = 'damirah'
@@ -10,25 +15,41 @@ __email__ = 'damirah@live.com'
 
 class VenueNetwork(object):
 
-    def __init__(self, citation_network, paper_venue_m):
+    def __init__(self, citation_network, paper_venue_m, paper_venue_m_csc=None):
         """
         :param citation_network: instance of wsdmcup.model.CitationNetwork
         :param paper_venue_m: binary incidence matrix, where rows represent
                               papers, cols represent venues and fields (values 0
                               and 1) represent whether a paper was published
                               at a venue
+        :param paper_venue_m_csc: paper_venue_m in CSC format (e.g. CSC copy
+                                  stored in the datastore), None to convert
+                                  paper_venue_m when it's first needed
         :return: None
         """
         self.logger = logging.getLogger(__name__)
         self.cit_net = citation_network
         self.paper_venue_m = paper_venue_m
+        self.paper_venue_m_csc = paper_venue_m_csc
+
+    def get_paper_venue_m_csc(self):
+        """
+        :return: paper-venue matrix in CSC format, the matrix must not be
+                 changed
+        """
+        if self.paper_venue_m_csc is None:
+            self.logger.debug('Converting paper-venue matrix to CSC format')
+            self.paper_venue_m_csc = self.paper_venue_m.tocsc()
+        return self.paper_venue_m_csc
 
     def get_venue_publications(self):
         """
         :return: numpy.array with number of publications per venue
         """
         self.logger.info('Counting number of papers per venue')
-        num_pub = self.paper_venue_m.sum(axis=0).ravel().tolist()[0]
+        paper_venue_m = self.paper_venue_m \
+            if self.paper_venue_m_csc is None else self.paper_venue_m_csc
+        num_pub = col_degrees(paper_venue_m).tolist()
         self.logger.info('Least and most papers per venue: %s, %s',
                          min(num_pub), max(num_pub))
         return num_pub
@@ -54,16 +75,27 @@ class VenueNetwork(object):
         """
         self.logger.info('Counting sum of citations per venue')
         self.logger.debug('Counting citations per paper')
-        cit_per_paper = np.array(self.cit_net.get_total_citations())
-        self.logger.debug('Copying paper-venue matrix as CSC matrix')
-        venue_cit_m = self.paper_venue_m.tocsc().copy()
+        cit_per_paper = np.asarray(self.cit_net.get_total_citations())
+        paper_venue_m = self.get_paper_venue_m_csc()
         self.logger.debug('Replacing matrix with citation data and summing')
-        venue_cit_m.data = cit_per_paper[venue_cit_m.indices]
+        venue_cit_m = sparse.csc_matrix(
+            (cit_per_paper[paper_venue_m.indices], paper_venue_m.indices,
+             paper_venue_m.indptr), shape=paper_venue_m.shape)
         venue_cit = venue_cit_m.sum(axis=0).ravel().tolist()[0]
         self.logger.info('Least and most cited venues: %s, %s',
                          min(venue_cit), max(venue_cit))
         return venue_cit
 
+    def get_venue_h_index(self, workers=Config.H_INDEX_WORKERS):
+        """
+        :param workers: number of processes, see wsdmcup.model.h_index
+        :return: numpy.array with h-index of each venue (h papers published
+                 at the venue have at least h citations each)
+        """
+        self.logger.info('Counting venue h-index')
+        return h_index(self.get_paper_venue_m_csc(),
+                       self.cit_net.get_total_citations(), workers)
+
     def get_paper_venue_citations(self, subtract=False, mean=False):
         """
         :param subtract: whether to subtract citations received by a paper
@@ -88,7 +120,7 @@ class VenueNetwork(object):
         self.logger.info('Least and most citations: %s, %s',
                          min(venue_cit_per_paper), max(venue_cit_per_paper))
         if subtract:
-            paper_citations = np.array(self.cit_net.get_total_citations())
+            paper_citations = np.asarray(self.cit_net.get_total_citations())
             self.logger.info('Subtracting paper citations from venue citations')
             venue_cit_per_paper = venue_cit_per_paper - paper_citations
             venue_cit_per_paper[venue_cit_per_paper < 0] = 0
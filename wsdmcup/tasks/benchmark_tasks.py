@@ -0,0 +1,73 @@
+
+import os
+import time
+import logging
+
+from wsdmcup.timing import timeit
+from wsdmcup.data.hdf5_datastore import Hdf5Datastore
+from wsdmcup.data.hdf5_manager import Hdf5Manager
+from wsdmcup.data.hdf5_policies import POLICIES
+
+__author__ = 'damirah'
+__email__ = 'damirah@live.com'
+
+
+def matrix_nbytes(matrix):
+    """
+    :param matrix: scipy.sparse.csr_matrix
+    :return: number of bytes of the data, indices and indptr arrays
+    """
+    return matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+
+
+@timeit
+def storage_policies_benchmark():
+    """
+    Store citation and authorship matrices with each of the storage
+    policies in hdf5_policies.POLICIES (in separate temporary HDF5 files)
+    and compare file sizes and load throughput. Loads read from the page
+    cache, so the throughput measures decompression cost; the file size
+    tells how much less has to be read on a cold load.
+    :return: None
+    """
+    logger = logging.getLogger(__name__)
+    h5 = Hdf5Manager()
+    matrices = {
+        'citation_matrix': h5.load_citation_matrix(),
+        'authorship_matrix': h5.load_authorship_matrix(),
+    }
+    results = []
+    for matrix_name, matrix in sorted(matrices.items()):
+        nbytes = matrix_nbytes(matrix)
+        megabytes = nbytes / 1024.0 / 1024.0
+        for policy_name, policy in sorted(POLICIES.items()):
+            fname = 'benchmark_%s_%s.h5' % (matrix_name, policy_name)
+            ds = Hdf5Datastore(fname, policies={
+                kind: policy for kind in ('data', 'indices', 'indptr')})
+            fpath = ds.get_datastore_path()
+            if os.path.exists(fpath):
+                os.remove(fpath)
+
+            start_time = time.time()
+            ds.store_sparse_matrix(matrix, matrix_name)
+            store_time = time.time() - start_time
+            size = os.path.getsize(fpath)
+
+            start_time = time.time()
+            loaded = ds.load_sparse_matrix(matrix_name)
+            load_time = time.time() - start_time
+            assert loaded.nnz == matrix.nnz
+            os.remove(fpath)
+
+            results.append((matrix_name, policy_name, size / float(nbytes),
+                            megabytes / max(store_time, 1e-6),
+                            megabytes / max(load_time, 1e-6)))
+            logger.info('%s, %s: %.1f MB in memory, %.1f MB on disk',
+                        matrix_name, policy_name, megabytes,
+                        size / 1024.0 / 1024.0)
+
+    logger.info('%-20s %-14s %10s %12s %12s', 'matrix', 'policy',
+                'size ratio', 'store MB/s', 'load MB/s')
+    for result in results:
+        logger.info('%-20s %-14s %10.3f %12.1f %12.1f', *result)
+    return
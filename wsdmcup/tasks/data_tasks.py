@@ -24,8 +24,12 @@ def df2dict(df, id_col, idx_col):
     logger = logging.getLogger(__name__)
     logger.info('Creating dictionary of {0}: {1}'
                 .format(id_col, idx_col))
-    logger.debug('Converting ID column from byte to string')
-    df[id_col] = df[id_col].str.decode(encoding='utf-8')
+    if df[id_col].dtype.kind == 'O':
+        logger.debug('Converting ID column from byte to string')
+        df[id_col] = df[id_col].str.decode(encoding='utf-8')
+    else:
+        # IDs stored as packed numbers (Config.PACKED_IDS) are kept numeric
+        logger.debug('Using packed IDs as keys')
     logger.debug('Creating the dictionary')
     return df.set_index(id_col)[idx_col].to_dict()
 
@@ -47,6 +51,26 @@ def papers_to_hdf5():
     return
 
 
+@timeit
+def papers_and_venues_to_hdf5():
+    """
+    Store papers, journals and conference series tables together with
+    paper-journal and paper-conference series matrices, all from a single
+    pass over Papers.txt
+    :return: None
+    """
+    logger = logging.getLogger(__name__)
+    print('Are you sure? This will rewrite existing data. '
+          'Please select (y/N)')
+    char = sys.stdin.read(1)
+    if char == 'y':
+        hdf5_manager = Hdf5Manager()
+        hdf5_manager.store_papers_and_venues()
+    else:
+        logger.info('Selected no --> exiting')
+    return
+
+
 @timeit
 def citation_matrix_to_hdf5():
     """
@@ -58,11 +82,8 @@ def citation_matrix_to_hdf5():
     char = sys.stdin.read(1)
     if char == 'y':
         hdf5_manager = Hdf5Manager()
-        papers = hdf5_manager.load_papers()
-        papers_dict = df2dict(papers, 'paper_id', 'paper_index')
-        # for saving memory
-        del papers
-        cit_m = CsvManager().load_citation_matrix(papers_dict)
+        papers = hdf5_manager.load_paper_lookup()
+        cit_m = CsvManager().load_citation_matrix(papers)
         hdf5_manager.store_citation_matrix(cit_m)
     else:
         logger.info('Selected no --> exiting')
@@ -97,14 +118,10 @@ def authorship_matrix_to_hdf5():
     char = sys.stdin.read(1)
     if char == 'y':
         hdf5_manager = Hdf5Manager()
-        papers = hdf5_manager.load_papers()
-        authors = hdf5_manager.load_authors()
-        papers_dict = df2dict(papers, 'paper_id', 'paper_index')
-        authors_dict = df2dict(authors, 'author_id', 'author_index')
-        # for saving memory
-        del papers, authors
+        papers = hdf5_manager.load_paper_lookup()
+        authors = hdf5_manager.load_author_lookup()
         logger.info('Creating authorship matrix')
-        auth_m = CsvManager().load_authorship_matrix(papers_dict, authors_dict)
+        auth_m = CsvManager().load_authorship_matrix(papers, authors)
         logger.info('Storing authorship matrix')
         hdf5_manager.store_authorship_matrix(auth_m)
     else:
@@ -125,26 +142,19 @@ def affiliations_to_hdf5():
         hdf5_manager = Hdf5Manager()
         hdf5_manager.store_affiliations()
 
-        papers = hdf5_manager.load_papers()
-        authors = hdf5_manager.load_authors()
-        affiliations = hdf5_manager.load_affiliations()
-        papers_dict = df2dict(papers, 'paper_id', 'paper_index')
-        authors_dict = df2dict(authors, 'author_id', 'author_index')
-        affiliations_dict = df2dict(affiliations, 'affiliation_id',
-                                    'affiliation_index')
-
-        # for saving memory
-        del papers, authors, affiliations
+        papers = hdf5_manager.load_paper_lookup()
+        authors = hdf5_manager.load_author_lookup()
+        affiliations = hdf5_manager.load_affiliation_lookup()
 
-        logger.info('Creating paper-author-affiliation matrix')
-        aff_m = CsvManager().load_affiliation_matrix(
-            papers_dict, authors_dict, affiliations_dict)
+        logger.info('Creating paper-author-affiliation and paper-affiliation '
+                    'matrices')
+        matrices = CsvManager().load_paper_author_affiliation_matrices(
+            papers, authors, affiliations,
+            matrices=['affiliation_matrix', 'paper_affiliation_matrix'])
         logger.info('Storing paper-author-affiliation matrix')
-        hdf5_manager.store_affiliation_matrix(aff_m)
+        hdf5_manager.store_affiliation_matrix(matrices['affiliation_matrix'])
 
-        logger.info('Creating paper-affiliation matrix')
-        paper_aff_m = CsvManager().load_paper_affiliation_matrix(
-            papers_dict, affiliations_dict)
+        paper_aff_m = matrices['paper_affiliation_matrix']
         # there might be duplicate entries in the matrix, remove them
         logger.info('Removing duplicate entries')
         paper_aff_m.data = numpy.ones(len(paper_aff_m.data),
@@ -167,16 +177,10 @@ def author_sequence_matrix_to_hdf5():
     char = sys.stdin.read(1)
     if char == 'y':
         hdf5_manager = Hdf5Manager()
-        papers = hdf5_manager.load_papers()
-        authors = hdf5_manager.load_authors()
-        papers_dict = df2dict(papers, 'paper_id', 'paper_index')
-        authors_dict = df2dict(authors, 'author_id', 'author_index')
-
-        # for saving memory
-        del papers, authors
+        papers = hdf5_manager.load_paper_lookup()
+        authors = hdf5_manager.load_author_lookup()
         logger.info('Creating author sequence number matrix')
-        auth_seq_m = CsvManager().load_author_sequence_matrix(
-            papers_dict, authors_dict)
+        auth_seq_m = CsvManager().load_author_sequence_matrix(papers, authors)
         logger.info('Storing paper-author-affiliation matrix')
         hdf5_manager.store_author_sequence_matrix(auth_seq_m)
     else:
@@ -185,8 +189,10 @@ def author_sequence_matrix_to_hdf5():
 
 
 @timeit
-def journals_to_hdf5():
+def paper_author_affiliations_to_hdf5():
     """
+    Create authorship, paper-author-affiliation, paper-affiliation and author
+    sequence number matrices in a single pass over PaperAuthorAffiliations.txt
     :return: None
     """
     logger = logging.getLogger(__name__)
@@ -195,19 +201,45 @@ def journals_to_hdf5():
     char = sys.stdin.read(1)
     if char == 'y':
         hdf5_manager = Hdf5Manager()
-        hdf5_manager.store_journals()
+        hdf5_manager.store_affiliations()
+
+        papers = hdf5_manager.load_paper_lookup()
+        authors = hdf5_manager.load_author_lookup()
+        affiliations = hdf5_manager.load_affiliation_lookup()
+
+        logger.info('Creating all paper-author-affiliation matrices')
+        matrices = CsvManager().load_paper_author_affiliation_matrices(
+            papers, authors, affiliations)
+
+        paper_aff_m = matrices['paper_affiliation_matrix']
+        # there might be duplicate entries in the matrix, remove them
+        logger.info('Removing duplicate entries')
+        paper_aff_m.data = numpy.ones(len(paper_aff_m.data),
+                                      dtype=paper_aff_m.dtype)
+        logger.info('Storing all paper-author-affiliation matrices')
+        hdf5_manager.store_matrices(matrices)
+    else:
+        logger.info('Selected no --> exiting')
+    return
 
-        papers = hdf5_manager.load_papers()
-        journals = hdf5_manager.load_journals()
 
-        papers_dict = df2dict(papers, 'paper_id', 'paper_index')
-        journals_dict = df2dict(journals, 'journal_id', 'journal_index')
+@timeit
+def journals_to_hdf5():
+    """
+    :return: None
+    """
+    logger = logging.getLogger(__name__)
+    print('Are you sure? This will rewrite existing data. '
+          'Please select (y/N)')
+    char = sys.stdin.read(1)
+    if char == 'y':
+        hdf5_manager = Hdf5Manager()
+        hdf5_manager.store_journals()
 
-        # for saving memory
-        del papers, journals
+        papers = hdf5_manager.load_paper_lookup()
+        journals = hdf5_manager.load_journal_lookup()
         logger.info('Creating papers-journals matrix')
-        journal_m = CsvManager().load_paper_journal_matrix(
-            papers_dict, journals_dict)
+        journal_m = CsvManager().load_paper_journal_matrix(papers, journals)
         logger.info('Storing paper-journal matrix')
         hdf5_manager.store_paper_journal_matrix(journal_m)
     else:
@@ -228,18 +260,11 @@ def conference_series_to_hdf5():
         hdf5_manager = Hdf5Manager()
         hdf5_manager.store_conference_series()
 
-        papers = hdf5_manager.load_papers()
-        conf_series = hdf5_manager.load_conference_series()
-
-        papers_dict = df2dict(papers, 'paper_id', 'paper_index')
-        conf_dict = df2dict(conf_series, 'conference_series_id',
-                            'conference_series_index')
-
-        # for saving memory
-        del papers, conf_series
+        papers = hdf5_manager.load_paper_lookup()
+        conf_series = hdf5_manager.load_conference_series_lookup()
         logger.info('Creating papers-conference series matrix')
         conf_series_m = CsvManager().load_paper_conf_series_matrix(
-            papers_dict, conf_dict)
+            papers, conf_series)
         logger.info('Storing paper-conference series matrix')
         hdf5_manager.store_paper_conf_series_matrix(conf_series_m)
     else:
@@ -260,18 +285,10 @@ def fields_of_study_to_hdf5():
         hdf5_manager = Hdf5Manager()
         hdf5_manager.store_fields_of_study()
 
-        papers = hdf5_manager.load_papers()
-        fos = hdf5_manager.load_fields_of_study()
-
-        papers_dict = df2dict(papers, 'paper_id', 'paper_index')
-        fos_dict = df2dict(fos, 'field_id', 'field_index')
-
-        # for saving memory
-        del papers, fos
-
+        papers = hdf5_manager.load_paper_lookup()
+        fos = hdf5_manager.load_field_of_study_lookup()
         logger.info('Creating papers-fields of study matrix')
-        fos_m = CsvManager().load_paper_field_of_study_matrix(
-            papers_dict, fos_dict)
+        fos_m = CsvManager().load_paper_field_of_study_matrix(papers, fos)
         logger.info('Storing paper-fields of study matrix')
         hdf5_manager.store_paper_field_of_study_matrix(fos_m)
     else:
@@ -279,17 +296,117 @@ def fields_of_study_to_hdf5():
     return
 
 
+@timeit
+def sparse_matrices_to_mmap():
+    """
+    Move sparse matrices from the HDF5 file to the memory-mapped format
+    :return: None
+    """
+    logger = logging.getLogger(__name__)
+    print('Are you sure? This will rewrite existing data. '
+          'Please select (y/N)')
+    char = sys.stdin.read(1)
+    if char == 'y':
+        Hdf5Manager().sparse_matrices_to_mmap()
+    else:
+        logger.info('Selected no --> exiting')
+    return
+
+
+@timeit
+def relation_files_to_edge_cache():
+    """
+    Parse MAG relation files into the binary edge cache, so that the
+    matrices built later do not have to parse them
+    :return: None
+    """
+    CsvManager().cache_relation_files()
+    return
+
+
 @timeit
 def h_index_to_hdf5():
     logger = logging.getLogger(__name__)
     h5 = Hdf5Manager()
-    papers = h5.load_papers().sort('paper_index')
-    authors = h5.load_authors().sort('author_index')
-    citation_network = CitationNetwork(
-        papers, h5.load_citation_matrix())
-    authorship_network = AuthorshipNetwork(
-        authors, h5.load_authorship_matrix(), citation_network)
+    with h5.open('r'):
+        papers = h5.load_papers(
+            ['paper_index', 'publish_year']).sort('paper_index')
+        authors = h5.load_authors(['author_index']).sort('author_index')
+        citation_network = CitationNetwork(
+            papers, h5.load_citation_matrix())
+        authorship_network = AuthorshipNetwork(
+            authors, h5.load_authorship_matrix(), citation_network,
+            h5.load_matrix_csc('authorship_matrix'))
     h_indices = authorship_network.get_h_index()
     logger.info('Got h-indices, storing them in hdf5')
     h5.store_author_h_index(h_indices)
     return
+
+
+@timeit
+def author_statistics_to_hdf5():
+    """
+    Count author statistics (documents, references, citations and
+    bibliometric indices) and store them in author_statistics table
+    :return: None
+    """
+    logger = logging.getLogger(__name__)
+    h5 = Hdf5Manager()
+    with h5.open('r'):
+        papers = h5.load_papers(
+            ['paper_index', 'publish_year']).sort('paper_index')
+        authors = h5.load_authors(
+            ['author_id', 'author_index']).sort('author_index')
+        citation_network = CitationNetwork(
+            papers, h5.load_citation_matrix())
+        authorship_network = AuthorshipNetwork(
+            authors, h5.load_authorship_matrix(), citation_network,
+            h5.load_matrix_csc('authorship_matrix'))
+    astats = authorship_network.get_author_statistics()
+    logger.info('Got author statistics, storing them in hdf5')
+    h5.store_author_stats(astats)
+    return
+
+
+@timeit
+def author_h_index_log_to_hdf5():
+    """
+    Count h-index of authors over years and store the log of its changes
+    :return: None
+    """
+    logger = logging.getLogger(__name__)
+    h5 = Hdf5Manager()
+    with h5.open('r'):
+        papers = h5.load_papers(
+            ['paper_index', 'publish_year']).sort('paper_index')
+        authors = h5.load_authors(['author_index']).sort('author_index')
+        citation_network = CitationNetwork(
+            papers, h5.load_citation_matrix())
+        authorship_network = AuthorshipNetwork(
+            authors, h5.load_authorship_matrix(), citation_network,
+            h5.load_matrix_csc('authorship_matrix'))
+    h_index_log = authorship_network.get_temporal_h_index()
+    logger.info('Got h-index changes, storing them in hdf5')
+    h5.store_author_h_index_log(h_index_log)
+    return
+
+
+@timeit
+def pagerank_to_hdf5():
+    """
+    Count PageRank of papers and store it, PageRank stored before is used
+    as the starting point of the iteration
+    :return: None
+    """
+    logger = logging.getLogger(__name__)
+    h5 = Hdf5Manager()
+    with h5.open('r'):
+        papers = h5.load_papers(['paper_index']).sort('paper_index')
+        citation_network = CitationNetwork(
+            papers, h5.load_citation_matrix(),
+            h5.load_matrix_csc('citation_matrix'))
+        previous = h5.load_paper_pagerank()
+    scores = citation_network.get_pagerank(previous)
+    logger.info('Got PageRank, storing it in hdf5')
+    h5.store_paper_pagerank(scores)
+    return
@@ -17,7 +17,8 @@ from wsdmcup.model.citation_network import CitationNetwork
 from wsdmcup.model.venue_network import VenueNetwork
 from wsdmcup.model.fos_network import FoSNetwork
 from wsdmcup.data.csv_datastore import CsvDatastore, Mag
-from wsdmcup.data.hdf5_manager import Hdf5Manager
+from wsdmcup.data.hdf5_prefetcher import Hdf5Prefetcher
+from wsdmcup.data.id_lookup import uint32_to_hex
 from wsdmcup.ranking.ranker import Ranker
 from wsdmcup.tasks.other_tasks import upload_results
 
@@ -46,7 +47,11 @@ def decode_column(df, column):
     """
     logger = logging.getLogger(__name__)
     logger.info('Decoding column %s', column)
-    df[column] = df[column].str.decode(encoding='utf-8')
+    if df[column].dtype.kind == 'u':
+        # packed IDs (Config.PACKED_IDS) are formatted back to hex IDs
+        df[column] = uint32_to_hex(df[column].values).astype(str)
+    else:
+        df[column] = df[column].str.decode(encoding='utf-8')
     logger.info('Done decoding, returning DataFrame')
     return df
 
@@ -75,23 +80,46 @@ def rank():
     """
     logger = logging.getLogger(__name__)
     logger.info('Loading data')
-    h5 = Hdf5Manager()
-    # author_h_index = h5.load_author_h_index()
-    papers = h5.load_papers().sort('paper_index')
-    authors = h5.load_authors().sort('author_index')
-    citation_network = CitationNetwork(
-        papers, h5.load_citation_matrix())
-    paper_journal_net = VenueNetwork(
-        citation_network, h5.load_paper_journal_matrix())
-    paper_conf_net = VenueNetwork(
-        citation_network, h5.load_paper_conf_series_matrix())
-    authorship_network = AuthorshipNetwork(
-        authors, h5.load_authorship_matrix(), citation_network)
-    affiliation_network = AffiliationNetwork(
-        h5.load_affiliation_matrix(), h5.load_paper_affiliation_matrix(),
-        citation_network)
-    # fos_network = FoSNetwork(
-    #     citation_network, h5.load_paper_field_of_study_matrix())
+    # all loads are started at once, each network is built as soon as its
+    # data is loaded
+    with Hdf5Prefetcher() as prefetcher:
+        # only the columns used for ranking, doi is never read
+        papers = prefetcher.load(
+            'load_papers', ['paper_id', 'paper_index', 'publish_year'])
+        cit_m = prefetcher.load('load_citation_matrix')
+        authors = prefetcher.load('load_authors', ['author_index'])
+        auth_m = prefetcher.load('load_authorship_matrix')
+        journal_m = prefetcher.load('load_paper_journal_matrix')
+        conf_m = prefetcher.load('load_paper_conf_series_matrix')
+        aff_m = prefetcher.load('load_affiliation_matrix')
+        paper_aff_m = prefetcher.load('load_paper_affiliation_matrix')
+        # CSC copies are None if they were not stored, networks then
+        # convert the matrices themselves
+        csc = {name: prefetcher.load('load_matrix_csc', name)
+               for name in ('authorship_matrix', 'paper_journal_matrix',
+                            'paper_conf_series_matrix',
+                            'paper_affiliation_matrix')}
+        # author_h_index = prefetcher.load('load_author_h_index')
+        # None if PageRank was not stored (see pagerank_to_hdf5)
+        pagerank = prefetcher.load('load_paper_pagerank')
+
+        papers = papers.result().sort('paper_index')
+        citation_network = CitationNetwork(papers, cit_m.result())
+        paper_journal_net = VenueNetwork(
+            citation_network, journal_m.result(),
+            csc['paper_journal_matrix'].result())
+        paper_conf_net = VenueNetwork(
+            citation_network, conf_m.result(),
+            csc['paper_conf_series_matrix'].result())
+        authors = authors.result().sort('author_index')
+        authorship_network = AuthorshipNetwork(
+            authors, auth_m.result(), citation_network,
+            csc['authorship_matrix'].result())
+        affiliation_network = AffiliationNetwork(
+            aff_m.result(), paper_aff_m.result(), citation_network,
+            csc['paper_affiliation_matrix'].result())
+        # fos_m = prefetcher.load('load_paper_field_of_study_matrix')
+        # fos_network = FoSNetwork(citation_network, fos_m.result())
 
     papers = decode_column(papers, 'paper_id')
 
@@ -132,10 +160,16 @@ def rank():
 
     conf_cit_sub = paper_conf_net.get_paper_venue_citations(subtract=True)
 
+    # PAGERANK =============================================================== #
+
+    pagerank = pagerank.result()
+
     # FIELDS OF STUDY ======================================================== #
 
     # fos_cit_total = fos_network.get_paper_fos_citations()
 
+    citation_network.metric_cache.log_stats()
+
     # OUTPUT ================================================================= #
 
     papers['pub_threshold'] = mean_citations_threshold
@@ -160,6 +194,10 @@ def rank():
         'conf': 0.1,
         'year': 0.1,
     }
+    if pagerank is not None and Config.PAGERANK_RANK_WEIGHT:
+        papers['pagerank'] = pagerank
+        log_data_statistics(papers['pagerank'], 'pagerank')
+        col_weights['pagerank'] = Config.PAGERANK_RANK_WEIGHT
     papers['rank'] = Ranker().rank_with_weighting_values(papers, col_weights)
 
     log_data_statistics(papers['rank'], 'rank')